@@ -6,6 +6,7 @@
 #define tempoDeSono 5 * 1000000
 #define variacaoMinDaTemperatura 0
 #define variacaoMinDaUmidade 0
+#define NODE_ID "N01" // Identificador único de cada transmissor
 
 DHT dht(DHTPIN, DHTTYPE);
 
@@ -68,7 +69,7 @@ void setup() {
 
   if (enviar) {
     contadorDePacotes++;
-    String mensagem = String(contadorDePacotes) + "," + String(temperaturaAtual, 1) + "," + String(umidadeAtual, 1);
+    String mensagem = String(NODE_ID) + "," + String(contadorDePacotes) + "," + String(temperaturaAtual, 1) + "," + String(umidadeAtual, 1);
 
     int stateTransmit = radio.transmit(mensagem);
 
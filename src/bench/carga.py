@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga para o servidor (ingestão + dashboard).
+
+Sobe servidor.py em outro processo com um banco temporário e, durante
+--duracao segundos:
+- N nós postam leituras em /ingest, cada um a --taxa leituras/s (carga aberta)
+- M clientes consultam /dashboard e /api/last alternadamente, como um navegador
+  (reaproveitando o ETag)
+- a profundidade da fila de ingestão é amostrada em /health a cada --amostragem s
+
+Ao final relata, por rota, vazão e latência (p50/p95/p99), os códigos de
+status, a fila ao longo do tempo, o tempo para a fila esvaziar e quantas
+leituras chegaram ao banco.
+
+Execução:
+  python3 src/bench/carga.py --nos 50 --taxa 10 --clientes 4 --duracao 30
+  python3 src/bench/carga.py --modo async --json resultado.json
+  python3 src/bench/carga.py --processos 4 --intervalo 0   # processos HTTP + escritor
+  python3 src/bench/carga.py --baseline resultado.json --tolerancia 0.2   # sai com 1 se piorou
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import comum  # noqa: E402
+
+HOST = "127.0.0.1"
+PORTA = 0  # definida em executar()
+
+
+class Coletor:
+    """Latências e status de uma thread cliente (sem lock; juntados ao final)."""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.status: Counter = Counter()
+
+    def registrar(self, rota: str, duracao: float, status: int):
+        self.latencias[rota].append(duracao)
+        self.status[(rota, status)] += 1
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def _requisicao(conn: http.client.HTTPConnection, method: str, path: str,
+                body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None
+                ) -> Tuple[int, Dict[str, str], bytes]:
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        resp = conn.getresponse()
+        dados = resp.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        return 0, {}, b""
+    if resp.will_close:
+        conn.close()
+    return resp.status, dict(resp.getheaders()), dados
+
+
+def _no(indice: int, taxa: float, fim: float, coletor: Coletor):
+    conn = http.client.HTTPConnection(HOST, PORTA, timeout=30)
+    intervalo = 1.0 / taxa
+    proximo = time.monotonic() + random.random() * intervalo  # espalha os nós
+    pacote = 0
+    while True:
+        agora = time.monotonic()
+        if proximo >= fim:
+            break
+        if proximo > agora:
+            time.sleep(proximo - agora)
+        corpo = json.dumps({
+            "node_id": f"bench_{indice}",
+            "packet_number": pacote,
+            "ts": int(time.time()),
+            "t": round(20 + random.random() * 5, 1),
+            "rh": float(random.randint(40, 70)),
+        }).encode("utf-8")
+        t0 = time.perf_counter()
+        status, _, _ = _requisicao(conn, "POST", "/ingest", corpo,
+                                   {"Content-Type": "application/json"})
+        coletor.registrar("/ingest", time.perf_counter() - t0, status)
+        pacote += 1
+        proximo += intervalo
+    conn.close()
+
+
+def _cliente(intervalo: float, fim: float, coletor: Coletor):
+    conn = http.client.HTTPConnection(HOST, PORTA, timeout=30)
+    etags: Dict[str, str] = {}
+    rotas = ("/dashboard", "/api/last")
+    i = 0
+    while time.monotonic() < fim:
+        rota = rotas[i % len(rotas)]
+        headers = {"Accept-Encoding": "gzip"}
+        if rota in etags:
+            headers["If-None-Match"] = etags[rota]
+        t0 = time.perf_counter()
+        status, resp_headers, _ = _requisicao(conn, "GET", rota, headers=headers)
+        coletor.registrar(rota, time.perf_counter() - t0, status)
+        if "ETag" in resp_headers:
+            etags[rota] = resp_headers["ETag"]
+        i += 1
+        if intervalo > 0:
+            time.sleep(intervalo)
+    conn.close()
+
+
+def _fila() -> Optional[int]:
+    conn = http.client.HTTPConnection(HOST, PORTA, timeout=5)
+    status, _, dados = _requisicao(conn, "GET", "/health")
+    conn.close()
+    if status != 200:
+        return None
+    return json.loads(dados)["queue"]
+
+
+def _amostrador(periodo: float, fim: float, inicio: float, amostras: List[Tuple[float, int]]):
+    while time.monotonic() < fim:
+        fila = _fila()
+        if fila is not None:
+            amostras.append((round(time.monotonic() - inicio, 1), fila))
+        time.sleep(periodo)
+
+
+def _subir_servidor(db_path: str, modo: str, processos: int) -> subprocess.Popen:
+    env = dict(os.environ, LORA_SERVER_MODE=modo, LORA_HTTP_PROCESSES=str(processos),
+               LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--servir", db_path, str(PORTA)], env=env
+    )
+    limite = time.monotonic() + 15
+    while time.monotonic() < limite:
+        if proc.poll() is not None:
+            raise RuntimeError("servidor encerrou durante a inicialização")
+        if _fila() is not None:
+            return proc
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("servidor não respondeu a /health")
+
+
+def _servir(db_path: str, porta: int):
+    """Modo interno: roda servidor.main() com o banco temporário."""
+    comum.usar_servidor()
+    import storage
+    storage.DB_PATH = db_path
+    import servidor
+    servidor.HOST, servidor.PORT = HOST, porta
+    servidor.main()
+
+
+def executar(args) -> Dict[str, Any]:
+    global PORTA
+    PORTA = _porta_livre()
+    tmp = tempfile.mkdtemp(prefix="lora-bench-")
+    db_path = os.path.join(tmp, "bench.db")
+    proc = _subir_servidor(db_path, args.modo, args.processos)
+    try:
+        coletores: List[Coletor] = []
+        threads = []
+        amostras: List[Tuple[float, int]] = []
+        inicio = time.monotonic()
+        fim = inicio + args.duracao
+        for i in range(args.nos):
+            c = Coletor()
+            coletores.append(c)
+            threads.append(threading.Thread(target=_no, args=(i, args.taxa, fim, c), daemon=True))
+        for _ in range(args.clientes):
+            c = Coletor()
+            coletores.append(c)
+            threads.append(threading.Thread(target=_cliente, args=(args.intervalo, fim, c),
+                                            daemon=True))
+        threads.append(threading.Thread(target=_amostrador,
+                                        args=(args.amostragem, fim, inicio, amostras),
+                                        daemon=True))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        decorrido = time.monotonic() - inicio
+
+        # Tempo até o worker de persistência alcançar a carga
+        t0 = time.monotonic()
+        while (_fila() or 0) > 0 and time.monotonic() - t0 < 60:
+            time.sleep(0.05)
+        drenagem = time.monotonic() - t0
+        time.sleep(0.5)  # último lote retirado da fila ainda pode estar em commit
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    comum.usar_servidor()
+    import storage
+    storage.DB_PATH = db_path
+    persistidas = storage.count_rows()
+    storage.close_connections()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    latencias: Dict[str, List[float]] = defaultdict(list)
+    status: Counter = Counter()
+    for c in coletores:
+        for rota, valores in c.latencias.items():
+            latencias[rota].extend(valores)
+        status.update(c.status)
+
+    rotas = {}
+    for rota, valores in sorted(latencias.items()):
+        medida = comum.percentis(valores)
+        medida["rps"] = medida["count"] / decorrido
+        medida["status"] = {str(s): n for (r, s), n in sorted(status.items()) if r == rota}
+        rotas[rota] = medida
+
+    filas = [f for _, f in amostras]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline", "servir")},
+        "duracao_s": decorrido,
+        "rotas": rotas,
+        "fila": {
+            "amostras": amostras,
+            "max": max(filas, default=0),
+            "media": sum(filas) / len(filas) if filas else 0,
+        },
+        "drenagem_s": drenagem,
+        "persistidas": persistidas,
+        "persistidas_por_s": persistidas / (decorrido + drenagem),
+    }
+
+
+def relatorio(r: Dict[str, Any]) -> str:
+    linhas = [comum.tabela(r["rotas"], extras=("rps",)), ""]
+    for rota, m in r["rotas"].items():
+        linhas.append(f"{rota}: status {m['status']}")
+    fila = r["fila"]
+    linhas.append("")
+    linhas.append(f"fila: máx {fila['max']}, média {fila['media']:.1f}; "
+                  f"esvaziou {r['drenagem_s']:.2f}s após o fim da carga")
+    linhas.append("fila ao longo do tempo: " +
+                  " ".join(f"{t:g}s={f}" for t, f in fila["amostras"]))
+    linhas.append(f"persistidas: {r['persistidas']} ({r['persistidas_por_s']:.0f}/s)")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Gerador de carga para servidor.py")
+    p.add_argument("--nos", type=int, default=20, help="nós postando em /ingest")
+    p.add_argument("--taxa", type=float, default=5.0, help="leituras/s por nó")
+    p.add_argument("--clientes", type=int, default=2, help="clientes do dashboard")
+    p.add_argument("--intervalo", type=float, default=0.5,
+                   help="pausa entre consultas de cada cliente (0 = sem pausa)")
+    p.add_argument("--duracao", type=float, default=30.0, help="segundos de carga")
+    p.add_argument("--amostragem", type=float, default=1.0, help="período de amostragem da fila")
+    p.add_argument("--modo", choices=("threads", "async"), default="threads")
+    p.add_argument("--processos", type=int, default=1,
+                   help="processos HTTP do servidor (LORA_HTTP_PROCESSES)")
+    p.add_argument("--json", help="grava os resultados neste arquivo")
+    p.add_argument("--baseline", help="resultados anteriores para comparar (p95 por rota)")
+    p.add_argument("--tolerancia", type=float, default=0.25, help="piora aceitável (0.25 = 25%%)")
+    p.add_argument("--servir", nargs=2, metavar=("DB", "PORTA"), help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.servir:
+        _servir(args.servir[0], int(args.servir[1]))
+        return 0
+
+    resultado = executar(args)
+    print(relatorio(resultado))
+    if args.json:
+        comum.salvar(resultado, args.json)
+    if args.baseline:
+        regressoes = comum.comparar(resultado["rotas"], comum.carregar(args.baseline)["rotas"],
+                                    args.tolerancia)
+        for r in regressoes:
+            print("REGRESSÃO", r)
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Utilidades compartilhadas pelos benchmarks.
+- usar_servidor()           : deixa os módulos de src/servidor importáveis
+- percentis(amostras)       : resumo de latências (em ms)
+- salvar / carregar         : resultados em JSON, para guardar uma baseline
+- comparar(atual, baseline) : lista as medidas que pioraram além da tolerância
+"""
+
+import json
+import math
+import os
+import sys
+from typing import Any, Dict, List, Sequence
+
+SERVIDOR_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "servidor"))
+COMPARTILHADO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "compartilhado"))
+
+
+def usar_servidor():
+    for diretorio in (COMPARTILHADO_DIR, SERVIDOR_DIR):
+        if diretorio not in sys.path:
+            sys.path.insert(0, diretorio)
+
+
+def percentis(amostras: Sequence[float]) -> Dict[str, float]:
+    """count, mean, p50, p95, p99 e max (amostras em segundos, resultado em ms)."""
+    if not amostras:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordenadas = sorted(amostras)
+    n = len(ordenadas)
+
+    def p(q: float) -> float:
+        return ordenadas[max(0, math.ceil(q * n) - 1)] * 1000  # nearest-rank
+
+    return {
+        "count": n,
+        "mean": sum(ordenadas) / n * 1000,
+        "p50": p(0.50),
+        "p95": p(0.95),
+        "p99": p(0.99),
+        "max": ordenadas[-1] * 1000,
+    }
+
+
+def salvar(resultados: Dict[str, Any], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+
+def carregar(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar(
+    atual: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+    tolerancia: float, metrica: str = "p95",
+) -> List[str]:
+    """Medidas presentes nas duas execuções cuja `metrica` cresceu mais que `tolerancia`."""
+    regressoes = []
+    for nome, medida in atual.items():
+        base = baseline.get(nome)
+        if not base or not base.get(metrica) or not medida.get("count"):
+            continue
+        razao = medida[metrica] / base[metrica]
+        if razao > 1 + tolerancia:
+            regressoes.append(
+                f"{nome}: {metrica} {base[metrica]:.2f}ms -> {medida[metrica]:.2f}ms "
+                f"(+{(razao - 1) * 100:.0f}%)"
+            )
+    return regressoes
+
+
+def tabela(medidas: Dict[str, Dict[str, float]], extras: Sequence[str] = ()) -> str:
+    colunas = ["count", "mean", "p50", "p95", "p99", "max", *extras]
+    largura = max([len(n) for n in medidas] + [8])
+    linhas = [f"{'':<{largura}} " + " ".join(f"{c:>9}" for c in colunas)]
+    for nome, m in medidas.items():
+        valores = []
+        for c in colunas:
+            v = m.get(c, "")
+            valores.append(f"{v:>9}" if isinstance(v, (int, str)) else f"{v:>9.2f}")
+        linhas.append(f"{nome:<{largura}} " + " ".join(valores))
+    return "\n".join(linhas)
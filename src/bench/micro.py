@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks das funções de armazenamento e renderização.
+
+Para cada tamanho de banco (--tamanhos), preenche um banco temporário com
+leituras sintéticas de --nos nós e mede:
+- storage.insert_reading      : inserção de uma leitura nova por chamada
+- storage.get_last_readings   : últimas 50 leituras (usada no boot do cache)
+- storage.get_latest_by_node  : última leitura de cada nó (usada no boot do cache)
+- storage.get_series          : rollups de um nó, 1m em 24 h e 1h em 30 dias
+- dashboard.render_html       : página sem série e com a série de 30 dias
+
+Bancos grandes demoram para preencher; --dir guarda os arquivos entre execuções
+e reaproveita os que já têm linhas suficientes.
+
+Execução:
+  python3 src/bench/micro.py                                   # 10k, 1M e 10M linhas
+  python3 src/bench/micro.py --tamanhos 10000,1000000 --json micro.json
+  python3 src/bench/micro.py --baseline micro.json --tolerancia 0.2   # sai com 1 se piorou
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import comum  # noqa: E402
+
+comum.usar_servidor()
+import dashboard  # noqa: E402
+import storage  # noqa: E402
+
+LOTE_PREENCHIMENTO = 10_000
+
+
+def _medir(fn: Callable[[], Any], repeticoes: int, orcamento_s: float) -> List[float]:
+    """Roda fn até `repeticoes` vezes ou até estourar o orçamento de tempo."""
+    amostras = []
+    limite = time.perf_counter() + orcamento_s
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        amostras.append(time.perf_counter() - t0)
+        if time.perf_counter() > limite:
+            break
+    return amostras
+
+
+def _preencher(total: int, nos: int, passo: int):
+    """Leituras sintéticas terminando agora, `passo` segundos entre leituras de um nó."""
+    existentes = storage.count_rows()
+    if existentes >= total:
+        return
+    por_no = (total + nos - 1) // nos
+    inicio = int(time.time()) - por_no * passo
+    t0 = time.perf_counter()
+    lote: List[Dict[str, Any]] = []
+    for i in range(existentes // nos, por_no):
+        for n in range(nos):
+            lote.append({
+                "ts": inicio + i * passo,
+                "node_id": f"bench_{n}",
+                "packet_number": i,
+                "temp": round(20 + random.random() * 5, 1),
+                "rh": float(random.randint(40, 70)),
+            })
+        if len(lote) >= LOTE_PREENCHIMENTO:
+            storage.insert_many(lote)
+            lote = []
+            print(f"\r  preenchendo: {storage.count_rows()}/{total}", end="", flush=True)
+    storage.insert_many(lote)
+    print(f"\r  preenchido: {storage.count_rows()} linhas em {time.perf_counter() - t0:.1f}s")
+
+
+def _medir_tamanho(tamanho: int, args) -> Dict[str, Dict[str, float]]:
+    _preencher(tamanho, args.nos, args.passo)
+
+    medidas = {}
+    proximo = [int(time.time()) + 1, 10**9]
+
+    def inserir():
+        proximo[0] += 1
+        proximo[1] += 1
+        storage.insert_reading(proximo[0], proximo[1], "bench_insert", 21.5, 55.0)
+
+    medidas["insert_reading"] = _medir(inserir, args.insercoes, args.orcamento)
+    medidas["get_last_readings"] = _medir(
+        lambda: storage.get_last_readings(limit=50), 200, args.orcamento
+    )
+    medidas["get_latest_by_node"] = _medir(storage.get_latest_by_node, 50, args.orcamento)
+
+    # Mesmos dados que o dashboard monta a partir do cache
+    recent = storage.get_last_readings(limit=50)
+    last = recent[0] if recent else None
+    ts_to = int(time.time())
+    for resolucao, janela in (("1m", 86400), ("1h", 30 * 86400)):
+        medidas[f"get_series[{resolucao}]"] = _medir(
+            lambda r=resolucao, j=janela: storage.get_series(last["node_id"], ts_to - j, ts_to, r),
+            200, args.orcamento,
+        )
+    stats = {"queued": 0, "nodes": args.nos, "total_rows": tamanho, "updated_at": time.time()}
+    medidas["render_html"] = _medir(
+        lambda: dashboard.render_html(last_packet=last, recent=recent, stats=stats),
+        200, args.orcamento,
+    )
+    ts_from = ts_to - 30 * 86400
+    resolucao = storage.choose_resolution(last["node_id"], ts_from, ts_to, 2000)
+    series = storage.get_series(last["node_id"], ts_from, ts_to, resolucao)
+    medidas["render_html[30d]"] = _medir(
+        lambda: dashboard.render_html(last_packet=last, recent=recent, stats=stats,
+                                      series=series, janela="30d"),
+        200, args.orcamento,
+    )
+    return {f"{nome}@{tamanho}": comum.percentis(a) for nome, a in medidas.items()}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Microbenchmarks de storage e dashboard")
+    p.add_argument("--tamanhos", default="10000,1000000,10000000",
+                   help="linhas no banco, separadas por vírgula")
+    p.add_argument("--nos", type=int, default=4, help="nós nas leituras sintéticas")
+    p.add_argument("--passo", type=int, default=10, help="segundos entre leituras de um nó")
+    p.add_argument("--insercoes", type=int, default=1000, help="chamadas de insert_reading")
+    p.add_argument("--orcamento", type=float, default=10.0, help="segundos máximos por medida")
+    p.add_argument("--dir", help="guarda e reaproveita os bancos preenchidos neste diretório")
+    p.add_argument("--json", help="grava os resultados neste arquivo")
+    p.add_argument("--baseline", help="resultados anteriores para comparar (p95)")
+    p.add_argument("--tolerancia", type=float, default=0.25, help="piora aceitável (0.25 = 25%%)")
+    args = p.parse_args(argv)
+
+    diretorio = args.dir or tempfile.mkdtemp(prefix="lora-micro-")
+    os.makedirs(diretorio, exist_ok=True)
+    resultado: Dict[str, Dict[str, float]] = {}
+    try:
+        for tamanho in (int(t) for t in args.tamanhos.split(",")):
+            print(f"{tamanho} linhas:")
+            storage.close_connections()
+            storage.DB_PATH = os.path.join(diretorio, f"bench_{tamanho}.db")
+            storage.init_db()
+            storage.migrate_db()
+            resultado.update(_medir_tamanho(tamanho, args))
+    finally:
+        storage.close_connections()
+        if not args.dir:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    print(comum.tabela(resultado))
+    if args.json:
+        comum.salvar(resultado, args.json)
+    if args.baseline:
+        regressoes = comum.comparar(resultado, comum.carregar(args.baseline), args.tolerancia)
+        for r in regressoes:
+            print("REGRESSÃO", r)
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Formato binário compacto de leituras entre o gateway e o servidor.
+
+Negociado pelo Content-Type (TIPO) em /ingest e /ingest/batch; sem ele o
+servidor continua aceitando JSON/NDJSON. Um corpo é um lote:
+
+  cabeçalho  <2sBBHI : b"LR", versão, flags (0), nº de nós, nº de registros
+  nós        para cada nó: [tamanho u8][node_id em UTF-8]
+  registros  <HIIhh  : índice do nó, ts, packet_number, temp×100, rh×100
+
+Cada registro ocupa 14 bytes (contra ~80 em JSON). Temperatura e umidade vão
+em centésimos; NULO (-32768) representa um valor ausente.
+- codificar(leituras) : [(node_id, packet_number, ts, temp, rh), ...] -> bytes
+- decodificar(corpo)  : bytes -> [(ts, node_id, packet_number, temp, rh), ...]
+
+decodificar() lê direto do buffer da requisição (memoryview + iter_unpack) e
+devolve tuplas na ordem das colunas do banco, sem montar dicionários.
+Usado pelos dois lados: o gateway codifica e o servidor decodifica.
+"""
+
+import struct
+from typing import Any, Iterable, List, Optional, Tuple
+
+TIPO = "application/x-lora-readings"
+VERSAO = 1
+MAX_NODE_ID = 64
+NULO = -32768
+
+_CABECALHO = struct.Struct("<2sBBHI")
+_REGISTRO = struct.Struct("<HIIhh")
+_MAGICO = b"LR"
+
+
+def _centesimos(valor: Optional[float]) -> int:
+    if valor is None:
+        return NULO
+    c = round(valor * 100)
+    if not NULO < c <= 32767:
+        raise ValueError(f"valor fora da faixa do formato binário: {valor}")
+    return c
+
+
+def codificar(leituras: Iterable[Tuple[str, int, int, Optional[float], Optional[float]]]) -> bytes:
+    """Empacota leituras (node_id, packet_number, ts, temp, rh) em um lote.
+
+    Levanta ValueError se algum campo não couber no formato (quem chama pode
+    mandar o lote em JSON).
+    """
+    indices = {}
+    nos = bytearray()
+    registros = bytearray()
+    n = 0
+    for node_id, pacote, ts, temp, rh in leituras:
+        i = indices.get(node_id)
+        if i is None:
+            nome = node_id.encode("utf-8")
+            if not 0 < len(nome) <= MAX_NODE_ID:
+                raise ValueError(f"node_id inválido para o formato binário: {node_id!r}")
+            i = indices[node_id] = len(indices)
+            nos.append(len(nome))
+            nos += nome
+        try:
+            registros += _REGISTRO.pack(i, ts, pacote, _centesimos(temp), _centesimos(rh))
+        except struct.error as e:
+            raise ValueError(str(e)) from e
+        n += 1
+    return _CABECALHO.pack(_MAGICO, VERSAO, 0, len(indices), n) + bytes(nos) + bytes(registros)
+
+
+def decodificar(corpo: bytes) -> List[Tuple[int, str, int, Optional[float], Optional[float]]]:
+    """Lê um lote; levanta ValueError se o corpo estiver malformado."""
+    buf = memoryview(corpo)
+    if len(buf) < _CABECALHO.size:
+        raise ValueError("corpo menor que o cabeçalho")
+    magico, versao, _, n_nos, n_registros = _CABECALHO.unpack_from(buf)
+    if magico != _MAGICO or versao != VERSAO:
+        raise ValueError("cabeçalho desconhecido")
+
+    pos = _CABECALHO.size
+    nos: List[str] = []
+    for _ in range(n_nos):
+        if pos >= len(buf):
+            raise ValueError("tabela de nós truncada")
+        tamanho = buf[pos]
+        if not 0 < tamanho <= MAX_NODE_ID or pos + 1 + tamanho > len(buf):
+            raise ValueError("node_id inválido")
+        nos.append(str(buf[pos + 1:pos + 1 + tamanho], "utf-8"))
+        pos += 1 + tamanho
+
+    corpo_registros = buf[pos:]
+    if len(corpo_registros) != n_registros * _REGISTRO.size:
+        raise ValueError("número de registros não confere com o tamanho do corpo")
+
+    leituras: List[Tuple[int, str, int, Any, Any]] = []
+    try:
+        for i, ts, pacote, temp, rh in _REGISTRO.iter_unpack(corpo_registros):
+            leituras.append((
+                ts, nos[i], pacote,
+                None if temp == NULO else temp / 100,
+                None if rh == NULO else rh / 100,
+            ))
+    except IndexError:
+        raise ValueError("registro aponta para um nó inexistente") from None
+    return leituras
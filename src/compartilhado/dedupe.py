@@ -0,0 +1,126 @@
+"""
+Deduplicação de pacotes por nó com janela deslizante (bitmap).
+
+Para cada nó guarda o maior número de pacote visto, o ts mais recente e um mapa de
+bits dos TAMANHO_JANELA números anteriores, como a janela anti-replay do IPsec:
+- pacote novo (maior que o maior visto) : aceito, a janela anda
+- dentro da janela e ainda não visto    : aceito (chegou fora de ordem)
+- dentro da janela e já visto           : duplicado
+- atrás da janela                       : aceito sem alterar a janela (atraso
+                                          grande; o UNIQUE do banco é a última
+                                          barreira)
+
+Reinício do contador: o transmissor guarda contadorDePacotes na memória RTC e
+volta a contar de 1 quando perde a alimentação. Um número já visto (ou atrás
+da janela) que chega com ts posterior a todos os já vistos não é uma cópia
+atrasada (a cópia traz o ts da recepção original, ou chega no mesmo segundo
+quando ouvida por outro receptor) e indica que o contador reiniciou: a janela
+recomeça a partir dele (ver contador_reiniciou). Sem ts, LIMIAR_REINICIO
+pacotes seguidos atrás da janela têm o mesmo efeito.
+
+Memória limitada: no máximo MAX_NOS nós, descartando o menos recente.
+Módulo compartilhado pelo gateway e pelo servidor (src/compartilhado).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+TAMANHO_JANELA = int(os.environ.get("LORA_DEDUPE_JANELA", "1024"))
+MAX_NOS = int(os.environ.get("LORA_DEDUPE_MAX_NOS", "10000"))
+LIMIAR_REINICIO = 3
+
+
+def contador_reiniciou(maior: int, ts_ultimo: Optional[float], pacote: int,
+                       ts: Optional[float]) -> bool:
+    """O pacote é mais novo que tudo o que foi visto, mas tem número menor: o contador reiniciou.
+
+    Só vale para um número que já foi visto; um número novo menor que o maior é
+    apenas um pacote fora de ordem.
+    """
+    return ts is not None and ts_ultimo is not None and pacote < maior and ts > ts_ultimo
+
+
+def _mais_recente(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    return b if a is None else a if b is None else max(a, b)
+
+
+class JanelaDedupe:
+    def __init__(self, tamanho: int = TAMANHO_JANELA, max_nos: int = MAX_NOS):
+        self.tamanho = tamanho
+        self.max_nos = max_nos
+        self._mascara_cheia = (1 << tamanho) - 1
+        self._lock = threading.Lock()
+        # node_id -> (maior pacote visto, bitmap com bit i = pacote maior - i,
+        #             pacotes seguidos que chegaram atrás da janela, ts mais recente)
+        self._nos: OrderedDict[str, Tuple[int, int, int, Optional[float]]] = OrderedDict()
+
+    def _duplicado(self, estado, pacote: int, ts: Optional[float]) -> bool:
+        if estado is None:
+            return False
+        maior, bits, _, ts_ultimo = estado
+        atraso = maior - pacote
+        visto = 0 <= atraso < self.tamanho and bool(bits >> atraso & 1)
+        return visto and not contador_reiniciou(maior, ts_ultimo, pacote, ts)
+
+    def _marcar(self, node_id: str, pacote: int, ts: Optional[float]):
+        estado = self._nos.get(node_id)
+        if estado is None:
+            novo = (pacote, 1, 0, ts)
+        else:
+            maior, bits, atrasados, ts_ultimo = estado
+            atraso = maior - pacote
+            visto = atraso >= self.tamanho or (atraso >= 0 and bool(bits >> atraso & 1))
+            if visto and contador_reiniciou(maior, ts_ultimo, pacote, ts):
+                novo = (pacote, 1, 0, ts)
+            elif atraso < 0:
+                novo = (pacote, ((bits << -atraso) | 1) & self._mascara_cheia, 0,
+                        _mais_recente(ts_ultimo, ts))
+            elif atraso < self.tamanho:
+                novo = (maior, bits | 1 << atraso, 0, _mais_recente(ts_ultimo, ts))
+            elif atrasados + 1 >= LIMIAR_REINICIO:
+                novo = (pacote, 1, 0, ts)  # contador do transmissor reiniciou
+            else:
+                novo = (maior, bits, atrasados + 1, ts_ultimo)
+        self._nos[node_id] = novo
+        self._nos.move_to_end(node_id)
+        if len(self._nos) > self.max_nos:
+            self._nos.popitem(last=False)
+
+    def duplicado(self, node_id: str, pacote: int, ts: Optional[float] = None) -> bool:
+        """Só consulta; use marcar() depois que a leitura for aceita."""
+        with self._lock:
+            return self._duplicado(self._nos.get(node_id), pacote, ts)
+
+    def marcar(self, node_id: str, pacote: int, ts: Optional[float] = None):
+        with self._lock:
+            self._marcar(node_id, pacote, ts)
+
+    def desmarcar(self, node_id: str, pacote: int):
+        """Desfaz marcar() de uma leitura que não chegou ao banco."""
+        with self._lock:
+            estado = self._nos.get(node_id)
+            if estado is None:
+                return
+            maior, bits, atrasados, ts_ultimo = estado
+            atraso = maior - pacote
+            if 0 <= atraso < self.tamanho:
+                self._nos[node_id] = (maior, bits & ~(1 << atraso), atrasados, ts_ultimo)
+
+    def registrar(self, node_id: str, pacote: int, ts: Optional[float] = None) -> bool:
+        """Consulta e marca atomicamente. Retorna True se o pacote é novo."""
+        with self._lock:
+            if self._duplicado(self._nos.get(node_id), pacote, ts):
+                return False
+            self._marcar(node_id, pacote, ts)
+            return True
+
+    def limpar(self):
+        with self._lock:
+            self._nos.clear()
+
+    def estado(self) -> Dict[str, int]:
+        """Maior pacote visto por nó (para depuração)."""
+        with self._lock:
+            return {n: estado[0] for n, estado in self._nos.items()}
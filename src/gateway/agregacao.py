@@ -0,0 +1,274 @@
+"""
+Agregação no gateway: banda morta por nó e resumos por janela de tempo.
+
+Em vez de cada leitura, o gateway encaminha registros que resumem as leituras
+de um nó desde o último envio. Um registro tem o formato normal de leitura
+("ts", "node_id", "packet_number", "t", "rh") mais "summary":
+  n              : leituras representadas pelo registro
+  first_packet   : menor número de pacote entre elas (packet_number é o maior)
+  t_min/t_max/t_sum, rh_min/rh_max/rh_sum : extremos e somas das grandezas
+  parts          : só quando as leituras caem em mais de um minuto: um resumo
+                   por minuto ({"ts", "n", t_*/rh_*}), com o ts da última
+                   leitura do minuto, para o rollup de 1 min do servidor
+                   atribuir cada parte ao próprio intervalo
+O servidor usa o resumo nos rollups e nas estatísticas de enlace, então as
+leituras agregadas não aparecem como pacotes perdidos.
+
+- JANELA_S > 0 : as leituras de cada nó são resumidas por janela alinhada de
+                 JANELA_S segundos ("t"/"rh" = média); 0 = cada leitura é a
+                 própria janela ("t"/"rh" = valor lido)
+- DEADBAND     : (temp, rh). Uma janela cujo valor não se afastou mais que isso
+                 do último enviado é segurada e somada à seguinte, até que o
+                 valor mude ou passem HEARTBEAT_S desde o último envio.
+                 DEADBAND_POR_NO sobrepõe os limites de nós específicos.
+Um registro nunca cobre mais de uma hora (SEGURAR_MAX_S, o intervalo do
+rollup_1h e das estatísticas de enlace): na virada da hora o que está aberto
+ou segurado é enviado, qualquer que seja HEARTBEAT_S, o que também limita por
+quanto tempo as leituras ficam na memória do gateway.
+
+Agregador(emitir).adicionar(leitura) recebe as leituras já deduplicadas;
+vencer(agora) fecha janelas e heartbeats vencidos (chamado periodicamente) e
+esvaziar() envia tudo o que estiver pendente.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _limite(nome: str) -> Optional[float]:
+    valor = os.environ.get(nome, "").strip()
+    return float(valor) if valor else None
+
+
+def _por_no(texto: str) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """Lê "N001=0.5:2,N002=1:5" como {"N001": (0.5, 2.0), "N002": (1.0, 5.0)}."""
+    limites = {}
+    for item in filter(None, (p.strip() for p in texto.split(","))):
+        node_id, valores = item.split("=", 1)
+        temp, rh = (v.strip() for v in valores.split(":", 1))
+        limites[node_id.strip()] = (float(temp) if temp else None, float(rh) if rh else None)
+    return limites
+
+
+JANELA_S = int(os.environ.get("LORA_AGREGAR_JANELA_S", "0"))
+DEADBAND = (_limite("LORA_DEADBAND_TEMP"), _limite("LORA_DEADBAND_RH"))  # vazio = desligado
+DEADBAND_POR_NO = _por_no(os.environ.get("LORA_DEADBAND_POR_NO", ""))
+HEARTBEAT_S = int(os.environ.get("LORA_HEARTBEAT_S", "300"))
+PARTE_S = 60  # rollup_1m do servidor
+SEGURAR_MAX_S = 3600  # rollup_1h e link_1h do servidor
+
+_GRANDEZAS = (("t", "t_min", "t_max", "t_sum"), ("rh", "rh_min", "rh_max", "rh_sum"))
+
+
+def ativa(janela_s: int = JANELA_S, deadband=DEADBAND, por_no=DEADBAND_POR_NO) -> bool:
+    return janela_s > 0 or any(v is not None for v in deadband) or bool(por_no)
+
+
+def _hora(ts: float) -> float:
+    return ts - ts % SEGURAR_MAX_S
+
+
+def _extremos() -> Dict[str, List[Any]]:
+    """{grandeza: [mínimo, máximo, soma, n]}"""
+    return {g: [None, None, 0.0, 0] for g, *_ in _GRANDEZAS}
+
+
+def _juntar_extremos(a: Dict[str, List[Any]], b: Dict[str, List[Any]]):
+    for g, *_ in _GRANDEZAS:
+        x, y = a[g], b[g]
+        if y[3] == 0:
+            continue
+        x[0] = y[0] if x[0] is None else min(x[0], y[0])
+        x[1] = y[1] if x[1] is None else max(x[1], y[1])
+        x[2] += y[2]
+        x[3] += y[3]
+
+
+def _campos(extremos: Dict[str, List[Any]]) -> Dict[str, Any]:
+    campos = {}
+    for g, nome_min, nome_max, nome_soma in _GRANDEZAS:
+        minimo, maximo, soma, _ = extremos[g]
+        campos[nome_min] = minimo
+        campos[nome_max] = maximo
+        campos[nome_soma] = None if minimo is None else round(soma, 2)
+    return campos
+
+
+class _Resumo:
+    """Acumulador de leituras de um nó (uma janela ou o que está segurado)."""
+
+    def __init__(self, leitura: Dict[str, Any]):
+        self.n = 0
+        self.primeiro = self.ultimo = leitura["packet_number"]
+        self.ts = leitura["ts"]
+        self.valores: Dict[str, Optional[float]] = {}
+        self.extremos = _extremos()
+        # início do minuto -> [ts mais recente, n, extremos] das leituras do minuto
+        self.partes: Dict[float, List[Any]] = {}
+        self.somar(leitura)
+
+    def somar(self, leitura: Dict[str, Any]):
+        self.n += 1
+        pacote = leitura["packet_number"]
+        ts = leitura["ts"]
+        self.primeiro = min(self.primeiro, pacote)
+        self.ultimo = max(self.ultimo, pacote)
+        self.ts = max(self.ts, ts)
+        parte = self.partes.setdefault(ts - ts % PARTE_S, [ts, 0, _extremos()])
+        parte[0] = max(parte[0], ts)
+        parte[1] += 1
+        for g, *_ in _GRANDEZAS:
+            x = leitura.get(g)
+            self.valores[g] = x
+            if x is None:
+                continue
+            for acc in (self.extremos[g], parte[2][g]):
+                acc[0] = x if acc[0] is None else min(acc[0], x)
+                acc[1] = x if acc[1] is None else max(acc[1], x)
+                acc[2] += x
+                acc[3] += 1
+
+    def juntar(self, outro: "_Resumo"):
+        self.n += outro.n
+        self.primeiro = min(self.primeiro, outro.primeiro)
+        self.ultimo = max(self.ultimo, outro.ultimo)
+        self.ts = max(self.ts, outro.ts)
+        _juntar_extremos(self.extremos, outro.extremos)
+        for minuto, (ts, n, extremos) in outro.partes.items():
+            parte = self.partes.setdefault(minuto, [ts, 0, _extremos()])
+            parte[0] = max(parte[0], ts)
+            parte[1] += n
+            _juntar_extremos(parte[2], extremos)
+
+    def valor(self, g: str, media: bool) -> Optional[float]:
+        """Valor que representa o resumo: a média da janela ou a última leitura."""
+        if not media:
+            return self.valores.get(g)
+        _, _, soma, n = self.extremos[g]
+        return round(soma / n, 2) if n else None
+
+
+class Agregador:
+    def __init__(self, emitir: Callable[[Dict[str, Any]], Any], janela_s: int = JANELA_S,
+                 deadband: Tuple[Optional[float], Optional[float]] = DEADBAND,
+                 por_no: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                 heartbeat_s: int = HEARTBEAT_S):
+        self.emitir = emitir
+        self.janela_s = janela_s
+        self.deadband = deadband
+        self.por_no = DEADBAND_POR_NO if por_no is None else por_no
+        self.heartbeat_s = heartbeat_s
+        self._lock = threading.Lock()
+        # node_id -> [janela aberta (início, _Resumo) ou None, segurado (_Resumo) ou None,
+        #             último envio (ts, {grandeza: valor}) ou None]
+        self._nos: Dict[str, List[Any]] = {}
+        self.leituras = 0
+        self.registros = 0
+
+    # ---------- entrada ----------
+    def adicionar(self, leitura: Dict[str, Any]):
+        node_id = leitura["node_id"]
+        ts = leitura["ts"]
+        with self._lock:
+            self.leituras += 1
+            no = self._nos.setdefault(node_id, [None, None, None])
+            aberta, segurado, _ = no
+            # Pacote abaixo do que já está acumulado (fora de ordem ou contador
+            # reiniciado) ou leitura de outra hora: envia o acumulado para a faixa
+            # de pacotes não se misturar e o registro não cobrir duas horas
+            acumulado = [r for r in (segurado, aberta and aberta[1]) if r is not None]
+            if any(leitura["packet_number"] < r.ultimo or _hora(r.ts) != _hora(ts)
+                   for r in acumulado):
+                self._fechar(node_id, forcar=True)
+                aberta = None
+            elif aberta is not None and ts >= self._fim(aberta[0]):
+                self._fechar(node_id)
+                aberta = None
+
+            if aberta is None:
+                inicio = ts - ts % self.janela_s if self.janela_s > 0 else ts
+                no[0] = (inicio, _Resumo(leitura))
+            else:
+                aberta[1].somar(leitura)
+            if self.janela_s <= 0:
+                self._fechar(node_id)
+
+    def vencer(self, agora: float):
+        """Fecha as janelas que terminaram e envia o que está segurado há HEARTBEAT_S
+        ou desde a hora anterior."""
+        with self._lock:
+            for node_id, (aberta, segurado, enviado) in list(self._nos.items()):
+                if aberta is not None and agora >= self._fim(aberta[0]):
+                    self._fechar(node_id, forcar=_hora(agora) != _hora(aberta[0]))
+                elif aberta is None and segurado is not None and (
+                    enviado is None or agora - enviado[0] >= self.heartbeat_s
+                    or _hora(agora) != _hora(segurado.ts)
+                ):
+                    self._fechar(node_id, forcar=True)
+
+    def esvaziar(self):
+        with self._lock:
+            for node_id in list(self._nos):
+                self._fechar(node_id, forcar=True)
+
+    def _fim(self, inicio: float) -> float:
+        """Fim da janela que começa em `inicio`: a janela não passa da virada da hora."""
+        return min(inicio + self.janela_s, _hora(inicio) + SEGURAR_MAX_S)
+
+    # ---------- decisão e envio ----------
+    def _mudou(self, node_id: str, resumo: _Resumo, enviado) -> bool:
+        limites = self.por_no.get(node_id, self.deadband)
+        if enviado is None or all(v is None for v in limites):
+            return True
+        if resumo.ts - enviado[0] >= self.heartbeat_s:
+            return True
+        # Grandeza sem limite: qualquer diferença conta como mudança
+        for (g, *_), limite in zip(_GRANDEZAS, limites, strict=True):
+            atual, anterior = resumo.valor(g, self.janela_s > 0), enviado[1].get(g)
+            if atual is None or anterior is None or limite is None:
+                if atual != anterior:
+                    return True
+            elif abs(atual - anterior) > limite:
+                return True
+        return False
+
+    def _fechar(self, node_id: str, forcar: bool = False):
+        """Fecha a janela aberta do nó; envia ou segura conforme a banda morta."""
+        no = self._nos[node_id]
+        aberta, segurado, enviado = no
+        no[0] = None
+        if aberta is None and segurado is None:
+            return
+        ultimo = aberta[1] if aberta is not None else segurado
+        if not forcar and not self._mudou(node_id, ultimo, enviado):
+            if segurado is None:
+                no[1] = ultimo
+            elif ultimo is not segurado:
+                segurado.juntar(ultimo)
+                segurado.valores = ultimo.valores
+            return
+
+        media = self.janela_s > 0
+        valores = {g: ultimo.valor(g, media) for g, *_ in _GRANDEZAS}
+        total = segurado
+        if total is None:
+            total = ultimo
+        elif ultimo is not segurado:
+            total.juntar(ultimo)
+        resumo: Dict[str, Any] = {"n": total.n, "first_packet": total.primeiro,
+                                  **_campos(total.extremos)}
+        if len(total.partes) > 1:
+            resumo["parts"] = [{"ts": ts, "n": n, **_campos(extremos)}
+                               for _, (ts, n, extremos) in sorted(total.partes.items())]
+        no[1] = None
+        no[2] = (total.ts, valores)
+        self.registros += 1
+        self.emitir({
+            "ts": total.ts,
+            "node_id": node_id,
+            "packet_number": total.ultimo,
+            "t": valores["t"],
+            "rh": valores["rh"],
+            "summary": resumo,
+        })
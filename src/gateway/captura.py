@@ -0,0 +1,117 @@
+"""
+Captura e reprodução das linhas seriais do gateway.
+
+Arquivo de captura: uma linha de texto por linha serial recebida,
+"<instante epoch>\t<porta>\t<linha crua>", na ordem de chegada.
+- Captura(path).gravar(porta, linha) : acrescenta uma linha (seguro entre threads)
+- ler(path)                          : (instante, porta, linha) de um arquivo gravado
+- sintetico(nos, taxa, duracao, ...) : as mesmas tuplas para N transmissores
+                                       simulados, com retransmissões duplicadas
+- reproduzir(eventos, velocidade, f) : chama f(linha, porta, instante) respeitando
+                                       o intervalo original dividido por `velocidade`
+                                       (1 = tempo real, 0 = o mais rápido possível)
+- Relogio()                          : ts das leituras reproduzidas, a partir do
+                                       instante gravado de cada linha
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+Evento = Tuple[float, str, str]  # (instante, porta, linha)
+
+
+class Captura:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._arquivo = open(path, "a", encoding="utf-8", buffering=1)  # linha a linha
+
+    def gravar(self, porta: str, linha: str):
+        linha = linha.rstrip("\r\n")
+        with self._lock:
+            self._arquivo.write(f"{time.time():.6f}\t{porta}\t{linha}\n")
+
+    def close(self):
+        with self._lock:
+            self._arquivo.close()
+
+
+def ler(path: str) -> Iterator[Evento]:
+    with open(path, encoding="utf-8") as f:
+        for registro in f:
+            instante, porta, linha = registro.rstrip("\n").split("\t", 2)
+            yield float(instante), porta, linha
+
+
+def sintetico(nos: int, taxa: float, duracao: float, duplicados: float = 0.0,
+              porta: str = "sintetico") -> Iterator[Evento]:
+    """Cada nó transmite `taxa` leituras/s por `duracao` s, no formato do Transmissor.ino.
+
+    Uma fração `duplicados` das linhas é repetida logo em seguida, como um
+    pacote ouvido por dois receptores.
+    """
+    intervalo = 1.0 / taxa
+    inicio = time.time()
+    fases = [random.random() * intervalo for _ in range(nos)]  # espalha os nós
+    temperaturas = [random.uniform(18, 30) for _ in range(nos)]
+    total = int(duracao * taxa)
+    for pacote in range(1, total + 1):
+        rodada = []
+        for no in range(nos):
+            temperaturas[no] += random.uniform(-0.2, 0.2)
+            instante = inicio + fases[no] + (pacote - 1) * intervalo
+            linha = f"N{no:03d},{pacote},{temperaturas[no]:.1f},{random.randint(40, 70)}.0"
+            rodada.append((instante, linha))
+            if duplicados and random.random() < duplicados:
+                rodada.append((instante, linha))
+        rodada.sort()
+        for instante, linha in rodada:
+            yield instante, porta, linha
+
+
+def reproduzir(eventos: Iterable[Evento], velocidade: float,
+               processar: Callable[[str, str, float], object]) -> int:
+    """Entrega os eventos a `processar`; devolve quantas linhas foram entregues."""
+    n = 0
+    relogio = None
+    for instante, porta, linha in eventos:
+        if velocidade > 0:
+            if relogio is None:
+                relogio = (time.monotonic(), instante)
+            alvo = relogio[0] + (instante - relogio[1]) / velocidade
+            espera = alvo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+        processar(linha, porta, instante)
+        n += 1
+    return n
+
+
+class Relogio:
+    """ts (epoch s) das leituras reproduzidas, independente da velocidade.
+
+    O primeiro evento fica em `inicio` (padrão: agora) e os seguintes mantêm o
+    intervalo gravado. Por nó o ts nunca volta, e um pacote com número abaixo
+    do anterior (o contador reiniciou) fica ao menos 1 s depois dele: com
+    --velocidade 0 as leituras de uma captura inteira caberiam no mesmo
+    segundo, e a deduplicação só reconhece o reinício com um ts mais novo
+    (dedupe.contador_reiniciou).
+    """
+
+    def __init__(self, inicio: Optional[float] = None):
+        self.inicio = time.time() if inicio is None else inicio
+        self._primeiro: Optional[float] = None
+        self._nos: Dict[str, Tuple[int, int]] = {}  # node_id -> (último ts, último pacote)
+
+    def ts(self, instante: float, node_id: str, pacote: int) -> int:
+        if self._primeiro is None:
+            self._primeiro = instante
+        ts = int(self.inicio + instante - self._primeiro)
+        anterior = self._nos.get(node_id)
+        if anterior is not None:
+            ts_anterior, pacote_anterior = anterior
+            ts = max(ts, ts_anterior + 1 if pacote < pacote_anterior else ts_anterior)
+        self._nos[node_id] = (ts, pacote)
+        return ts
@@ -1,66 +1,415 @@
-import serial
-import time
+"""
+Gateway: lê as portas seriais dos receptores LoRa e envia as leituras ao servidor.
+
+Execução:
+  python3 gateway.py [portas...]                    # hardware (padrão: LORA_PORTAS)
+  python3 gateway.py --gravar captura.tsv [portas]  # idem, gravando as linhas cruas
+  python3 gateway.py --reproduzir captura.tsv --velocidade 10   # replay 10x
+  python3 gateway.py --sintetico 200 --taxa 1 --duracao 60 --velocidade 0
+                                                    # 200 nós simulados, sem pausas
+  python3 gateway.py --janela 60 --deadband-temp 0.5 --deadband-rh 2
+                                                    # resumos de 1 min com banda morta
+
+Reprodução e gerador sintético passam pelo mesmo caminho das portas reais
+(paserver, deduplicação, spool e envio) e, ao final, relatam a vazão.
+
+Com agregação (agregacao.py: --janela, --deadband-*, --heartbeat ou as
+variáveis LORA_AGREGAR_JANELA_S/LORA_DEADBAND_*), as leituras deduplicadas
+passam pelo agregador e o spool recebe resumos por nó no lugar delas.
+"""
+
+import argparse
+import http.client
 import json
+import os
+import sys
+import tempfile
+import threading
 import time
-import urllib.request
+from collections import Counter
+from typing import Optional
+from urllib.parse import urlparse
 
-SERVER_URL = "http://localhost:8080/ingest"  # URL do servidor
-PORTA = '/dev/ttyACM0'
+import agregacao
+import captura
+import serial
+from spool import Spool
+
+# Deduplicação e formato binário compartilhados com o servidor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "compartilhado"))
+import binario  # noqa: E402
+from dedupe import JanelaDedupe  # noqa: E402
+
+SERVER_URL = "http://localhost:8080/ingest/batch"  # URL de ingestão em lote do servidor
+# Portas seriais dos receptores LoRa (uma thread de leitura por porta).
+# Podem ser passadas na linha de comando ou em LORA_PORTAS separadas por vírgula.
+PORTAS = os.environ.get("LORA_PORTAS", "/dev/ttyACM0").split(",")
 BAUD_RATE = 115200
+RECONEXAO_S = 5           # espera antes de reabrir uma porta que falhou
+
+# Store-and-forward: leituras vão primeiro para o spool em disco e uma thread
+# separada as envia em lotes, reaproveitando a conexão HTTP.
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool.db")
+LOTE_ENVIO = 200          # leituras por POST
+TIMEOUT_HTTP = 5          # segundos
+BACKOFF_MIN = 0.5         # segundos
+BACKOFF_MAX = 60.0        # segundos
+# Respostas que recusam o conteúdo do lote: reenviar não adianta, então o lote
+# é descartado (413 só quando o lote já tem uma leitura só). Os demais 4xx
+# (408, 429, 404 de uma URL errada...) e os 5xx são tentados de novo.
+STATUS_DESCARTE = (400, 413, 422)
+# Formato dos lotes enviados: "ndjson" ou "binario" (registros fixos de
+# binario.py, bem menores e mais baratos de decodificar no servidor). Se o
+# servidor não entender o binário, o gateway volta para NDJSON sozinho.
+FORMATO_ENVIO = os.environ.get("LORA_FORMATO", "ndjson")
+
+# Formato da linha serial: "node_id,pacote,temperatura,umidade". Linhas no
+# formato antigo "pacote,temperatura,umidade" são atribuídas a NODE_PADRAO.
+NODE_PADRAO = "node_padrao"
+
+spool = None
+gravacao = None   # captura.Captura quando iniciado com --gravar
+relogio = None    # captura.Relogio na reprodução: o ts vem do instante gravado
+agregador = None  # agregacao.Agregador quando a agregação está ligada
+AGREGACAO_TICK_S = 1.0  # intervalo entre verificações de janelas e heartbeats vencidos
+VERBOSO = True    # uma linha no console por leitura (desligado na reprodução rápida)
+# Linhas lidas, inválidas, duplicadas e enviadas ao spool
+contadores: Counter = Counter()
+_contadores_lock = threading.Lock()
+# Deduplicação por nó, compartilhada entre as portas: o mesmo transmissor pode
+# ser ouvido por mais de um receptor.
+janela = JanelaDedupe()
+
+def _contar(chave: str):
+    with _contadores_lock:
+        contadores[chave] += 1
 
-def main():
-    pacote_anterior = None
+def main(portas=None, gravar=None):
+    global spool, gravacao
+    portas = portas or PORTAS
+    if gravar:
+        gravacao = captura.Captura(gravar)
+        print(f"Gravando as linhas seriais em {gravar}")
     print("=== Leitor Serial Python ===")
-    ser = serial.Serial(PORTA, BAUD_RATE, timeout = 1)
-    time.sleep(2)
-    print(f"Conectado com sucesso em {PORTA}")
-    print(f"Aguardando dados do ESP32S3...\n")
+    spool = Spool(SPOOL_PATH)
+    threading.Thread(target=worker_envio, args=(spool,), name="envio", daemon=True).start()
+    _iniciar_agregacao()
+
+    leitores = []
+    for porta in portas:
+        t = threading.Thread(target=ler_porta, args=(porta,), name=f"serial:{porta}", daemon=True)
+        t.start()
+        leitores.append(t)
+    print(f"Aguardando dados do ESP32S3 em {', '.join(portas)}...\n")
     print("="*50)
+    try:
+        for t in leitores:
+            t.join()
+    except KeyboardInterrupt:
+        print("Encerrando gateway...")
+        if agregador:
+            agregador.esvaziar()  # o que estava segurado vai para o spool
 
+def ler_porta(porta: str):
+    """Lê uma porta serial com leituras bloqueantes (sem busy-wait) e reconecta se cair."""
     while True:
-        if ser.in_waiting > 0:  # Se há dados disponíveis
-            # Lê uma linha da serial
-            linha = ser.readline().decode('utf-8').strip()
-            # Se a linha for inválida
-            if not linha:
-                continue
-            # Se a linha não está vazia
-            if linha:
-                numero_do_pacote_atual, temperatura_atual, umidade_atual = paserver(linha)
-                # Verifico o número do pacote recebido pela porta serial
-                # Caso o pacote seja duplicado
-                if numero_do_pacote_atual == pacote_anterior:
-                    continue
-                # Caso seja um pacote novo
-                pacote_anterior = numero_do_pacote_atual
-                print(f"Número do pacote: {numero_do_pacote_atual}, Temperatura: {temperatura_atual}°C, Umidade {umidade_atual} %")
-                # Preparo o dado no formato esperado pelo servidor
-                dados_dashboard = gerar_leitura(numero_do_pacote_atual, temperatura_atual, umidade_atual)
-                # Envio o dado para o servidor
-                enviar_dado(dados_dashboard)
+        try:
+            # readline bloqueia até chegar '\n' ou estourar o timeout
+            with serial.Serial(porta, BAUD_RATE, timeout=1) as ser:
+                time.sleep(2)
+                print(f"Conectado com sucesso em {porta}")
+                while True:
+                    linha = ser.readline()
+                    if linha:
+                        texto = linha.decode('utf-8', errors='replace')
+                        if gravacao:
+                            gravacao.gravar(porta, texto)
+                        processar_linha(texto, porta)
+        except serial.SerialException as e:
+            print(f"[ERRO] Porta {porta} indisponível: {e}; nova tentativa em {RECONEXAO_S}s")
+            time.sleep(RECONEXAO_S)
+
+def processar_linha(linha: str, porta: str, instante: Optional[float] = None):
+    """Interpreta uma linha de uma porta, descarta duplicados e envia a leitura ao spool.
+
+    `instante` é o momento gravado na captura, quando a linha vem de uma reprodução.
+    """
+    linha = linha.strip()
+    # Se a linha for inválida
+    if not linha:
+        return None
+    _contar("linhas")
+    try:
+        node_id, numero_do_pacote_atual, temperatura_atual, umidade_atual = paserver(linha)
+    except ValueError:
+        _contar("invalidas")
+        if VERBOSO:
+            print(f"[{porta}] Linha ignorada: {linha!r}")
+        return None
+    # Preparo o dado no formato esperado pelo servidor
+    ts = None
+    if relogio is not None and instante is not None:
+        ts = relogio.ts(instante, node_id, numero_do_pacote_atual)
+    dados_dashboard = gerar_leitura(
+        node_id, numero_do_pacote_atual, temperatura_atual, umidade_atual, ts
+    )
+    # Caso o pacote seja duplicado (retransmissão ou ouvido por outra porta);
+    # o ts separa a repetição de um contador que reiniciou
+    if not janela.registrar(node_id, numero_do_pacote_atual, dados_dashboard["ts"]):
+        _contar("duplicadas")
+        return None
+    _contar("enviadas")
+    if VERBOSO:
+        print(f"[{porta}] Nó: {node_id}, Número do pacote: {numero_do_pacote_atual}, "
+              f"Temperatura: {temperatura_atual}°C, Umidade {umidade_atual} %")
+    # Envio o dado para o servidor
+    enviar_dado(dados_dashboard)
+    return dados_dashboard
 
 def paserver(linha: str) -> list:
-    numero_do_pacote, temperatura, umidade = linha.split(",")
-    return [int(numero_do_pacote), float(temperatura), float(umidade)]
+    campos = linha.split(",")
+    if len(campos) == 3:
+        campos.insert(0, NODE_PADRAO)
+    node_id, numero_do_pacote, temperatura, umidade = campos
+    node_id = node_id.strip()
+    if not node_id:
+        raise ValueError("node_id vazio")
+    return [node_id, int(numero_do_pacote), float(temperatura), float(umidade)]
 
-def gerar_leitura(numero_pacote: int, temperatura: float, umidade: float) -> dict:
-    """Gera uma leitura para enviar ao servidor no formato JSON."""
+def gerar_leitura(node_id: str, numero_pacote: int, temperatura: float, umidade: float,
+                  ts: Optional[int] = None) -> dict:
+    """Gera uma leitura para enviar ao servidor no formato JSON (ts padrão: agora)."""
     return {
-        "ts": int(time.time()),
+        "ts": int(time.time()) if ts is None else ts,
+        "node_id": node_id,
         "packet_number": numero_pacote,
         "t": temperatura,   # temperatura °C
         "rh": umidade,  # umidade %
     }
 
 def enviar_dado(dado: dict):
-    """Envia o dado ao servidor via HTTP POST."""
+    """Grava o dado no spool (ou no agregador); o envio ao servidor é feito pela thread de envio."""
+    if agregador:
+        agregador.adicionar(dado)
+    else:
+        spool.put(dado)
+
+
+def _encaminhar(registro: dict):
+    spool.put(registro)
+
+
+def _iniciar_agregacao():
+    if agregador:
+        threading.Thread(target=worker_agregacao, args=(agregador,), name="agregacao",
+                         daemon=True).start()
+
+
+def worker_agregacao(agregador: agregacao.Agregador):
+    """Fecha janelas e envia heartbeats mesmo quando um nó para de transmitir."""
+    while True:
+        time.sleep(AGREGACAO_TICK_S)
+        agregador.vencer(time.time())
+
+
+def _corpo_lote(lote, formato: str):
+    """Monta o corpo do POST a partir dos payloads JSON do spool.
+
+    Resumos do agregador não cabem nos registros binários: lotes com resumos
+    vão em NDJSON.
+    """
+    if formato == "binario":
+        leituras = [json.loads(payload) for _, payload in lote]
+        if not any("summary" in d for d in leituras):
+            return binario.codificar(
+                (d["node_id"], d["packet_number"], d["ts"], d.get("t"), d.get("rh"))
+                for d in leituras
+            ), binario.TIPO
+    return "\n".join(payload for _, payload in lote).encode("utf-8"), "application/x-ndjson"
+
+
+def _post_lote(conn: http.client.HTTPConnection, path: str, corpo: bytes, tipo: str):
+    conn.request("POST", path, body=corpo, headers={"Content-Type": tipo})
+    resp = conn.getresponse()
+    return resp.status, resp.reason, resp.read(), resp.getheader("Retry-After")
+
+
+def _espera(backoff: float, retry_after) -> float:
+    """Respeita o Retry-After do servidor (segundos) quando for maior que o backoff."""
+    try:
+        return min(max(backoff, float(retry_after)), BACKOFF_MAX)
+    except (TypeError, ValueError):
+        return backoff
+
+
+def worker_envio(spool: Spool):
+    """Drena o spool em lotes por uma conexão keep-alive, com backoff exponencial."""
+    url = urlparse(SERVER_URL)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=TIMEOUT_HTTP)
+    backoff = BACKOFF_MIN
+    formato = FORMATO_ENVIO
+    tamanho = teto = LOTE_ENVIO  # o teto cai para abaixo de cada lote recusado com 413
+    while True:
+        lote = spool.peek(tamanho)
+        if not lote:
+            spool.wait(timeout=5)
+            continue
+
+        try:
+            corpo, tipo = _corpo_lote(lote, formato)
+        except (ValueError, KeyError, TypeError) as e:
+            # Leitura que não cabe nos registros binários: este lote vai em NDJSON
+            print(f"[ERRO] Lote não cabe no formato binário ({e}); enviando em NDJSON")
+            corpo, tipo = _corpo_lote(lote, "ndjson")
+        try:
+            try:
+                status, reason, resposta, retry_after = _post_lote(conn, url.path, corpo, tipo)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Conexão reaproveitada foi fechada pelo servidor: tenta de novo uma vez
+                conn.close()
+                status, reason, resposta, retry_after = _post_lote(conn, url.path, corpo, tipo)
+        except Exception as e:
+            conn.close()
+            print(f"[ERRO] Falha ao enviar lote ({spool.pending()} no spool): {e}; "
+                  f"nova tentativa em {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, BACKOFF_MAX)
+            continue
+
+        if tipo == binario.TIPO and status in (400, 415):
+            # Servidor sem suporte ao formato binário: reenvia o mesmo lote em NDJSON
+            print(f"[ERRO] Servidor recusou o formato binário ({status}); usando NDJSON")
+            formato = "ndjson"
+            continue
+
+        if status == 413 and len(lote) > 1:
+            # Lote grande demais para o servidor: reenvia em metades
+            teto = len(lote) - 1
+            tamanho = len(lote) // 2
+            print(f"[ERRO] Lote de {len(lote)} grande demais (413); tentando {tamanho} por vez")
+            continue
+
+        if not 200 <= status < 300 and status not in STATUS_DESCARTE:
+            espera = _espera(backoff, retry_after)
+            print(f"[ERRO] Servidor respondeu {status} {reason}; nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+            backoff = min(backoff * 2, BACKOFF_MAX)
+            continue
+
+        backoff = BACKOFF_MIN
+        # 2xx: lote aceito. 400/413/422: o lote nunca será aceito, então é
+        # descartado para não travar o spool.
+        spool.ack(lote[-1][0])
+        if 200 <= status < 300:
+            tamanho = min(tamanho * 2, teto)
+            if VERBOSO:
+                print(f"[{time.strftime('%H:%M:%S')}] Enviado lote de {len(lote)} "
+                      f"-> {status} {reason}")
+        else:
+            print(f"[ERRO] Lote de {len(lote)} recusado: {status} {reason} "
+                  f"{resposta[:200].decode('utf-8', 'replace')}")
+
+def _pendentes_servidor(url) -> int:
+    """Leituras aceitas pelo servidor e ainda não gravadas no banco (GET /health)."""
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=TIMEOUT_HTTP)
+    try:
+        conn.request("GET", "/health")
+        return int(json.loads(conn.getresponse().read()).get("pending", 0))
+    finally:
+        conn.close()
+
+def _esperar(condicao, limite_s: float) -> bool:
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if condicao():
+            return True
+        time.sleep(0.05)
+    return False
+
+def reproduzir(eventos, velocidade: float, spool_path: str, limite_s: float = 300.0):
+    """Passa os eventos (captura ou sintéticos) pelo caminho normal e relata a vazão."""
+    global spool, relogio
+    spool = Spool(spool_path)
+    relogio = captura.Relogio()
+    threading.Thread(target=worker_envio, args=(spool,), name="envio", daemon=True).start()
+    _iniciar_agregacao()
+    contadores.clear()
+
+    t0 = time.monotonic()
+    captura.reproduzir(eventos, velocidade, processar_linha)
+    if agregador:
+        agregador.esvaziar()
+    t_leitura = time.monotonic() - t0
+    entregue = _esperar(lambda: spool.pending() == 0, limite_s)
+    t_envio = time.monotonic() - t0
+    url = urlparse(SERVER_URL)
     try:
-        body = json.dumps(dado).encode("utf-8")
-        req = urllib.request.Request(SERVER_URL, data=body, headers={"Content-Type": "application/json"})
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            print(f"[{time.strftime('%H:%M:%S')}] Enviado -> {resp.status} {resp.reason}")
-    except Exception as e:
-        print(f"[ERRO] Falha ao enviar: {e}")
+        gravado = entregue and _esperar(lambda: _pendentes_servidor(url) == 0, limite_s)
+    except (OSError, ValueError):
+        gravado = False  # servidor sem /health com "pending"
+    t_banco = time.monotonic() - t0
+
+    enviadas = contadores["enviadas"]
+    print("="*50)
+    print(f"Linhas: {contadores['linhas']} ({contadores['invalidas']} inválidas, "
+          f"{contadores['duplicadas']} duplicadas), leituras novas: {enviadas}")
+    print(f"Leitura/dedupe/spool: {t_leitura:.2f}s "
+          f"({contadores['linhas'] / max(t_leitura, 1e-9):.0f} linhas/s)")
+    if agregador:
+        print(f"Agregação: {agregador.registros} registros encaminhados "
+              f"({agregador.registros / max(enviadas, 1):.1%} das leituras novas)")
+    if entregue:
+        print(f"Aceitas pelo servidor: {t_envio:.2f}s "
+              f"({enviadas / max(t_envio, 1e-9):.0f} leituras/s)")
+    else:
+        print(f"[ERRO] Spool não esvaziou em {limite_s:.0f}s ({spool.pending()} pendentes)")
+    if gravado:
+        print(f"Gravadas no banco: {t_banco:.2f}s "
+              f"({enviadas / max(t_banco, 1e-9):.0f} leituras/s ponta a ponta)")
+    spool.close()
+
+def _argumentos(argv):
+    p = argparse.ArgumentParser(description="Gateway serial -> servidor LoRa")
+    p.add_argument("portas", nargs="*", help="portas seriais (padrão: LORA_PORTAS)")
+    p.add_argument("--gravar", metavar="ARQUIVO",
+                   help="grava as linhas seriais cruas neste arquivo")
+    p.add_argument("--reproduzir", metavar="ARQUIVO",
+                   help="reproduz uma captura em vez das portas")
+    p.add_argument("--sintetico", type=int, metavar="NOS",
+                   help="gera leituras de NOS nós simulados")
+    p.add_argument("--taxa", type=float, default=0.2, help="leituras/s por nó simulado")
+    p.add_argument("--duracao", type=float, default=60.0, help="segundos simulados")
+    p.add_argument("--duplicados", type=float, default=0.05,
+                   help="fração de linhas sintéticas repetidas (0.05 = 5%%)")
+    p.add_argument("--velocidade", type=float, default=1.0,
+                   help="1 = tempo real, N = N vezes mais rápido, 0 = sem pausas")
+    p.add_argument("--servidor", default=SERVER_URL, help="URL de /ingest/batch")
+    p.add_argument("--spool", help="spool da reprodução (padrão: arquivo temporário)")
+    p.add_argument("--verboso", action="store_true", help="imprime cada leitura na reprodução")
+    p.add_argument("--janela", type=int, default=agregacao.JANELA_S, metavar="S",
+                   help="resume as leituras de cada nó em janelas de S segundos (0 = desligado)")
+    p.add_argument("--deadband-temp", type=float, default=agregacao.DEADBAND[0], metavar="C",
+                   help="segura valores que variaram no máximo C °C desde o último envio")
+    p.add_argument("--deadband-rh", type=float, default=agregacao.DEADBAND[1], metavar="PCT",
+                   help="idem para a umidade (pontos percentuais)")
+    p.add_argument("--heartbeat", type=int, default=agregacao.HEARTBEAT_S, metavar="S",
+                   help="com banda morta, envia ao menos um registro por nó a cada S segundos")
+    return p.parse_args(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = _argumentos(sys.argv[1:])
+    deadband = (args.deadband_temp, args.deadband_rh)
+    if agregacao.ativa(args.janela, deadband):
+        agregador = agregacao.Agregador(_encaminhar, args.janela, deadband,
+                                        heartbeat_s=args.heartbeat)
+    if not (args.reproduzir or args.sintetico):
+        main(args.portas, args.gravar)
+        sys.exit(0)
+    SERVER_URL = args.servidor
+    VERBOSO = args.verboso
+    if args.reproduzir:
+        eventos = captura.ler(args.reproduzir)
+    else:
+        eventos = captura.sintetico(args.sintetico, args.taxa, args.duracao, args.duplicados)
+    spool_path = args.spool or os.path.join(tempfile.mkdtemp(prefix="lora-replay-"), "spool.db")
+    reproduzir(eventos, args.velocidade, spool_path)
\ No newline at end of file
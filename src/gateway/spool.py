@@ -0,0 +1,68 @@
+"""
+Spool em disco (store-and-forward) para o gateway.
+
+As leituras são gravadas em um arquivo SQLite local antes de qualquer envio,
+então uma queda do servidor ou um reinício do gateway não perde dados.
+- put(dado)      : grava uma leitura no fim do spool
+- peek(n)        : devolve até n leituras mais antigas (id, payload JSON)
+- ack(ultimo_id) : remove as leituras já confirmadas pelo servidor
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+class Spool:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._novos = threading.Event()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spool (
+                    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL
+                )
+                """
+            )
+        if self.pending():
+            self._novos.set()
+
+    def put(self, dado: Dict[str, Any]):
+        payload = json.dumps(dado, separators=(",", ":"))
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO spool (payload) VALUES (?)", (payload,))
+        self._novos.set()
+
+    def peek(self, n: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT id, payload FROM spool ORDER BY id LIMIT ?", (n,)
+            )
+            return cur.fetchall()
+
+    def ack(self, ultimo_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM spool WHERE id <= ?", (ultimo_id,))
+
+    def pending(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0])
+
+    def wait(self, timeout: float) -> bool:
+        """Espera até existir algo novo no spool (ou o timeout expirar)."""
+        ok = self._novos.wait(timeout)
+        self._novos.clear()
+        return ok
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
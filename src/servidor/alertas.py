@@ -0,0 +1,153 @@
+"""
+Motor de alertas em fluxo, avaliado no caminho de persistência.
+- avaliar(linhas)   : aplica as regras às leituras recém-gravadas e devolve as transições
+- estados(nos)      : estado serializado (JSON) dos nós, gravado como checkpoint no banco
+- carregar(estados) : restaura o checkpoint na inicialização (sem reler o histórico)
+- limpar()          : zera tudo (após /delete-all)
+
+Regras por nó e por grandeza (temp e rh), todas O(1) por leitura:
+- threshold_low/high : valor fora de [MIN, MAX]
+- rate               : variação por minuto acima de TAXA; o intervalo no
+                       denominador é de no mínimo 1 min, para a resolução de
+                       1 °C do DHT11 não disparar entre leituras próximas
+- zscore             : |x - média| / desvio acima de ZSCORE, com média e
+                       variância móveis (Welford com esquecimento exponencial,
+                       ~JANELA leituras) calculadas antes de incluir x
+- stuck              : o mesmo valor em REPETICOES leituras seguidas
+
+Cada (regra, grandeza) de um nó fica ativa ou inativa: a passagem para ativa
+gera uma transição "fired" e a volta ao normal uma "resolved". Leituras fora
+de ordem (ts não maior que o da anterior) só passam pelos limites fixos.
+
+Configuração (LORA_ALERT_*): limites vazios desligam a regra; TAXA, ZSCORE
+e REPETICOES iguais a 0 também.
+"""
+
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+GRANDEZAS = ("temp", "rh")
+
+
+def _valor(nome: str, padrao: str) -> Optional[float]:
+    valor = os.environ.get(nome, padrao).strip()
+    return float(valor) if valor else None
+
+
+LIMITES = {
+    "temp": (_valor("LORA_ALERT_TEMP_MIN", "0"), _valor("LORA_ALERT_TEMP_MAX", "50")),
+    "rh": (_valor("LORA_ALERT_RH_MIN", "20"), _valor("LORA_ALERT_RH_MAX", "90")),
+}
+TAXA = {  # variação máxima por minuto
+    "temp": _valor("LORA_ALERT_TEMP_RATE", "5"),
+    "rh": _valor("LORA_ALERT_RH_RATE", "20"),
+}
+TAXA_INTERVALO_MIN_S = 60
+ZSCORE = _valor("LORA_ALERT_ZSCORE", "4")
+JANELA = int(os.environ.get("LORA_ALERT_ZSCORE_WINDOW", "120"))
+MIN_AMOSTRAS = 30
+DESVIO_MINIMO = {"temp": 0.5, "rh": 1.0}  # resolução do DHT11: evita z enorme com variância ~0
+REPETICOES = int(os.environ.get("LORA_ALERT_STUCK_READINGS", "120"))
+
+# Estado de uma grandeza: [último valor, ts do último, n, média, variância, repetições]
+_ULTIMO, _TS, _N, _MEDIA, _VAR, _REPETIDAS = range(6)
+
+_lock = threading.Lock()
+# node_id -> {"temp": [...], "rh": [...], "ativos": {"regra:grandeza": ts de início}}
+_nos: Dict[str, Dict[str, Any]] = {}
+
+
+def _novo_no() -> Dict[str, Any]:
+    return {g: [None, None, 0, 0.0, 0.0, 0] for g in GRANDEZAS} | {"ativos": {}}
+
+
+def _condicoes(
+    g: str, x: float, ts: int, estado: List[Any]
+) -> List[Tuple[str, bool, float, Optional[float]]]:
+    """(regra, disparou, medida, limite) para uma grandeza; atualiza os acumuladores."""
+    baixo, alto = LIMITES[g]
+    resultado = []
+    if baixo is not None:
+        resultado.append(("threshold_low", x < baixo, x, baixo))
+    if alto is not None:
+        resultado.append(("threshold_high", x > alto, x, alto))
+
+    ultimo, ts_ultimo, n, media, var, repetidas = estado
+    if ts_ultimo is not None and ts <= ts_ultimo:
+        return resultado  # fora de ordem: não mexe nos acumuladores
+
+    if TAXA[g] and ultimo is not None:
+        taxa = abs(x - ultimo) * 60 / max(ts - ts_ultimo, TAXA_INTERVALO_MIN_S)
+        resultado.append(("rate", taxa > TAXA[g], round(taxa, 3), TAXA[g]))
+    if ZSCORE and n >= MIN_AMOSTRAS:
+        z = (x - media) / max(math.sqrt(var), DESVIO_MINIMO[g])
+        resultado.append(("zscore", abs(z) > ZSCORE, round(z, 3), ZSCORE))
+
+    repetidas = repetidas + 1 if x == ultimo else 1
+    if REPETICOES:
+        resultado.append(("stuck", repetidas >= REPETICOES, repetidas, REPETICOES))
+
+    # Welford com esquecimento: média/variância exatas até JANELA leituras, depois móveis
+    n += 1
+    alfa = max(1.0 / n, 2.0 / (JANELA + 1))
+    delta = x - media
+    media += alfa * delta
+    var = (1 - alfa) * (var + delta * alfa * delta)
+    estado[:] = [x, ts, n, media, var, repetidas]
+    return resultado
+
+
+def avaliar(linhas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Transições (fired/resolved) provocadas pelas linhas, na ordem em que ocorreram."""
+    transicoes = []
+    with _lock:
+        for linha in linhas:
+            node_id = linha.get("node_id") or "node_padrao"
+            ts = linha["ts"]
+            no = _nos.get(node_id)
+            if no is None:
+                no = _nos[node_id] = _novo_no()
+            ativos = no["ativos"]
+            for g in GRANDEZAS:
+                x = linha.get(g)
+                if x is None:
+                    continue
+                for regra, disparou, medida, limite in _condicoes(g, x, ts, no[g]):
+                    chave = f"{regra}:{g}"
+                    if disparou == (chave in ativos):
+                        continue
+                    if disparou:
+                        ativos[chave] = ts
+                    else:
+                        del ativos[chave]
+                    transicoes.append({
+                        "state": "fired" if disparou else "resolved",
+                        "ts": ts, "node_id": node_id, "rule": regra, "metric": g,
+                        "value": x, "score": medida, "threshold": limite,
+                    })
+    return transicoes
+
+
+def estados(nos: Iterable[str]) -> List[Tuple[str, str]]:
+    with _lock:
+        return [(n, json.dumps(_nos[n], separators=(",", ":"))) for n in set(nos) if n in _nos]
+
+
+def carregar(estados_salvos: Dict[str, str]):
+    with _lock:
+        _nos.clear()
+        for node_id, estado in estados_salvos.items():
+            _nos[node_id] = json.loads(estado)
+
+
+def limpar():
+    with _lock:
+        _nos.clear()
+
+
+def ativos() -> int:
+    with _lock:
+        return sum(len(no["ativos"]) for no in _nos.values())
@@ -0,0 +1,199 @@
+"""
+Codificação colunar comprimida para o arquivo de leituras antigas.
+- codificar(linhas)  : bloco de leituras de um nó (ordenadas por ts) -> bytes
+- decodificar(blob)  : bytes -> lista de leituras (ts, packet_number, temp, rh)
+
+Cada coluna é gravada separadamente:
+- ts            : primeiro valor, primeiro delta e depois delta-de-delta
+- packet_number : deltas
+- temp / rh     : deltas em ponto fixo (10^k, o menor k que reproduz os valores
+                  exatamente) ou, se nenhuma escala servir, XOR dos bits IEEE-754
+                  com o valor anterior
+
+Os inteiros vão em zigzag + varint, valores ausentes (NULL) ficam em um mapa de
+bits e o bloco inteiro passa por zlib. Leituras de DHT11 variam pouco, então a
+maioria dos deltas ocupa um único byte antes mesmo da compressão.
+"""
+
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+VERSAO = 1
+MAX_ESCALA = 3  # até 3 casas decimais em ponto fixo
+
+_PONTO_FIXO = 0
+_XOR = 1
+
+
+def _zigzag(v: int) -> int:
+    return v << 1 if v >= 0 else ((-v) << 1) - 1
+
+
+def _unzigzag(u: int) -> int:
+    return (u >> 1) ^ -(u & 1)
+
+
+def _put_varint(buf: bytearray, u: int):
+    while u >= 0x80:
+        buf.append((u & 0x7F) | 0x80)
+        u >>= 7
+    buf.append(u)
+
+
+def _get_varint(dados: bytes, pos: int) -> Tuple[int, int]:
+    u = 0
+    shift = 0
+    while True:
+        b = dados[pos]
+        pos += 1
+        u |= (b & 0x7F) << shift
+        if b < 0x80:
+            return u, pos
+        shift += 7
+
+
+def _put_presenca(buf: bytearray, valores: Sequence[Any]) -> List[Any]:
+    """Grava o mapa de bits de não-nulos (ou 0 se não há nulos); devolve os presentes."""
+    presentes = [v for v in valores if v is not None]
+    if len(presentes) == len(valores):
+        buf.append(0)
+        return presentes
+    buf.append(1)
+    mapa = bytearray((len(valores) + 7) // 8)
+    for i, v in enumerate(valores):
+        if v is not None:
+            mapa[i >> 3] |= 1 << (i & 7)
+    buf += mapa
+    return presentes
+
+
+def _get_presenca(dados: bytes, pos: int, n: int) -> Tuple[Optional[bytes], int]:
+    if dados[pos] == 0:
+        return None, pos + 1
+    tamanho = (n + 7) // 8
+    return dados[pos + 1:pos + 1 + tamanho], pos + 1 + tamanho
+
+
+def _espalhar(mapa: Optional[bytes], n: int, presentes: List[Any]) -> List[Any]:
+    if mapa is None:
+        return presentes
+    it = iter(presentes)
+    return [next(it) if mapa[i >> 3] >> (i & 7) & 1 else None for i in range(n)]
+
+
+def _put_deltas(buf: bytearray, valores: Sequence[int]):
+    anterior = 0
+    for v in valores:
+        _put_varint(buf, _zigzag(v - anterior))
+        anterior = v
+
+
+def _get_deltas(dados: bytes, pos: int, n: int) -> Tuple[array, int]:
+    valores = array("q")
+    atual = 0
+    for _ in range(n):
+        u, pos = _get_varint(dados, pos)
+        atual += _unzigzag(u)
+        valores.append(atual)
+    return valores, pos
+
+
+def _escala(valores: Sequence[float]) -> Optional[int]:
+    for k in range(MAX_ESCALA + 1):
+        fator = 10 ** k
+        if all(round(v * fator) / fator == v for v in valores):
+            return k
+    return None
+
+
+def _put_real(buf: bytearray, valores: Sequence[Any]):
+    presentes = _put_presenca(buf, valores)
+    _put_varint(buf, len(presentes))
+    k = _escala(presentes)
+    if k is not None:
+        buf.append(_PONTO_FIXO)
+        buf.append(k)
+        _put_deltas(buf, [round(v * 10 ** k) for v in presentes])
+        return
+    buf.append(_XOR)
+    bits = array("Q")
+    bits.frombytes(array("d", presentes).tobytes())
+    anterior = 0
+    for b in bits:
+        _put_varint(buf, b ^ anterior)
+        anterior = b
+
+
+def _get_real(dados: bytes, pos: int, n: int) -> Tuple[List[Any], int]:
+    mapa, pos = _get_presenca(dados, pos, n)
+    quantos, pos = _get_varint(dados, pos)
+    modo = dados[pos]
+    pos += 1
+    if modo == _PONTO_FIXO:
+        fator = 10 ** dados[pos]
+        inteiros, pos = _get_deltas(dados, pos + 1, quantos)
+        presentes = [v / fator if fator > 1 else float(v) for v in inteiros]
+    else:
+        bits = array("Q")
+        anterior = 0
+        for _ in range(quantos):
+            u, pos = _get_varint(dados, pos)
+            anterior ^= u
+            bits.append(anterior)
+        reais = array("d")
+        reais.frombytes(bits.tobytes())
+        presentes = reais.tolist()
+    return _espalhar(mapa, n, presentes), pos
+
+
+def codificar(linhas: Sequence[Dict[str, Any]]) -> bytes:
+    """Codifica leituras de um único nó, já ordenadas por ts."""
+    buf = bytearray()
+    n = len(linhas)
+    buf.append(VERSAO)
+    _put_varint(buf, n)
+
+    # ts: delta-de-delta (intervalos regulares viram sequências de zeros)
+    anterior = delta_anterior = 0
+    for i, linha in enumerate(linhas):
+        ts = int(linha["ts"])
+        delta = ts - anterior
+        _put_varint(buf, _zigzag(delta if i < 2 else delta - delta_anterior))
+        anterior, delta_anterior = ts, delta
+
+    pacotes = _put_presenca(buf, [linha.get("packet_number") for linha in linhas])
+    _put_varint(buf, len(pacotes))
+    _put_deltas(buf, [int(p) for p in pacotes])
+
+    _put_real(buf, [linha.get("temp") for linha in linhas])
+    _put_real(buf, [linha.get("rh") for linha in linhas])
+    return zlib.compress(bytes(buf), 6)
+
+
+def decodificar(blob: bytes) -> List[Dict[str, Any]]:
+    dados = zlib.decompress(blob)
+    if dados[0] != VERSAO:
+        raise ValueError(f"versão de bloco desconhecida: {dados[0]}")
+    n, pos = _get_varint(dados, 1)
+
+    ts = array("q")
+    anterior = delta = 0
+    for i in range(n):
+        u, pos = _get_varint(dados, pos)
+        v = _unzigzag(u)
+        delta = v if i < 2 else delta + v
+        anterior += delta
+        ts.append(anterior)
+
+    mapa, pos = _get_presenca(dados, pos, n)
+    quantos, pos = _get_varint(dados, pos)
+    pacotes, pos = _get_deltas(dados, pos, quantos)
+    packet_numbers = _espalhar(mapa, n, pacotes.tolist())
+
+    temps, pos = _get_real(dados, pos, n)
+    rhs, pos = _get_real(dados, pos, n)
+    return [
+        {"ts": ts[i], "packet_number": packet_numbers[i], "temp": temps[i], "rh": rhs[i]}
+        for i in range(n)
+    ]
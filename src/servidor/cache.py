@@ -0,0 +1,174 @@
+"""
+Estado recente em memória, para o dashboard e /api/last não consultarem o SQLite.
+- carregar()          : reconstrói o estado a partir do banco (na inicialização)
+- registrar(linhas)   : aplica as leituras recém-gravadas pelo worker de persistência
+- limpar()            : zera o estado (após /delete-all)
+- atualizar_enlace()  : relê o resumo de qualidade do enlace (chamado pelo worker)
+- snapshot()          : cópia consistente de tudo para renderizar uma página
+- versao()            : contador incrementado a cada alteração (chave de caches/ETag)
+
+Guarda a última leitura de cada nó, o total de linhas, um buffer circular com
+as leituras mais recentes e o resumo do enlace das últimas LINK_WINDOW_S por
+nó. Todas as operações são O(1) no tamanho da tabela; o resumo do enlace vem
+de link_1h (uma linha por nó e hora), relido no máximo a cada LINK_REFRESH_S.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+import storage
+
+RECENT_SIZE = 50
+LINK_WINDOW_S = 24 * 3600
+LINK_REFRESH_S = float(os.environ.get("LORA_LINK_REFRESH_S", "10"))
+
+log = logging.getLogger("lora-server")
+
+_lock = threading.Lock()
+_latest_by_node: Dict[str, Dict[str, Any]] = {}
+_recent: "deque[Dict[str, Any]]" = deque(maxlen=RECENT_SIZE)
+_total_rows = 0
+_enlace: List[Dict[str, Any]] = []
+_enlace_em = 0.0  # time.monotonic() da última leitura de link_1h
+_versao = 0
+_alterado_em = time.time()
+
+
+def _alterou():
+    global _versao, _alterado_em
+    _versao += 1
+    _alterado_em = time.time()
+
+
+def _normalizar(linha: Dict[str, Any]) -> Dict[str, Any]:
+    """Deixa a linha no mesmo formato devolvido pelas consultas de storage."""
+    return {
+        "ts": linha.get("ts"),
+        "packet_number": linha.get("packet_number"),
+        "node_id": linha.get("node_id") or "node_padrao",
+        "temp": linha.get("temp"),
+        "rh": linha.get("rh"),
+    }
+
+
+def _consultar_enlace() -> List[Dict[str, Any]]:
+    agora = int(time.time())
+    return storage.get_link_stats(agora - LINK_WINDOW_S, agora)
+
+
+def carregar():
+    global _total_rows, _enlace, _enlace_em
+    latest = storage.get_latest_by_node()
+    recent = storage.get_last_readings(limit=RECENT_SIZE)
+    total = storage.count_rows()
+    enlace = _consultar_enlace()
+    with _lock:
+        _latest_by_node.clear()
+        _latest_by_node.update(latest)
+        _recent.clear()
+        _recent.extend(reversed(recent))  # buffer fica do mais antigo para o mais novo
+        _total_rows = total
+        _enlace, _enlace_em = enlace, time.monotonic()
+        _alterou()
+
+
+def registrar(linhas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aplica as linhas gravadas e as devolve já normalizadas."""
+    global _total_rows
+    normalizadas = [_normalizar(linha) for linha in linhas]
+    with _lock:
+        for linha in normalizadas:
+            atual = _latest_by_node.get(linha["node_id"])
+            if atual is None or (linha["ts"] or 0) >= (atual["ts"] or 0):
+                _latest_by_node[linha["node_id"]] = linha
+            _recent.append(linha)
+            _total_rows += 1
+        if normalizadas:
+            _alterou()
+    return normalizadas
+
+
+def atualizar_enlace(forcar: bool = False):
+    """Relê o resumo do enlace se o último tem mais de LINK_REFRESH_S (ou com `forcar`).
+
+    Chamado depois de cada lote gravado, fora do caminho das requisições; uma
+    falha mantém o resumo anterior.
+    """
+    global _enlace, _enlace_em
+    if not forcar and time.monotonic() - _enlace_em < LINK_REFRESH_S:
+        return
+    try:
+        enlace = _consultar_enlace()
+    except Exception as e:
+        log.warning("Falha ao atualizar o resumo do enlace: %s", e)
+        return
+    with _lock:
+        _enlace, _enlace_em = enlace, time.monotonic()
+        _alterou()
+
+
+def limpar():
+    global _total_rows, _enlace
+    with _lock:
+        _latest_by_node.clear()
+        _recent.clear()
+        _total_rows = 0
+        _enlace = []
+        _alterou()
+
+
+def node_count() -> int:
+    return len(_latest_by_node)
+
+
+def latest_by_node() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return dict(_latest_by_node)
+
+
+def last_reading() -> Optional[Dict[str, Any]]:
+    """Leitura mais nova entre todos os nós."""
+    with _lock:
+        if not _latest_by_node:
+            return None
+        return max(_latest_by_node.values(), key=lambda r: r["ts"] or 0)
+
+
+def recent(limit: int = RECENT_SIZE) -> List[Dict[str, Any]]:
+    """Leituras mais recentes, da mais nova para a mais antiga (como ORDER BY ts DESC)."""
+    with _lock:
+        linhas = list(_recent)
+    linhas.sort(key=lambda r: r["ts"] or 0, reverse=True)
+    return linhas[:limit]
+
+
+def total_rows() -> int:
+    return _total_rows
+
+
+def versao() -> int:
+    return _versao
+
+
+def alterado_em() -> float:
+    return _alterado_em
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        latest = dict(_latest_by_node)
+        linhas = list(_recent)
+        total = _total_rows
+        enlace = _enlace
+        versao_atual = _versao
+        alterado = _alterado_em
+    linhas.sort(key=lambda r: r["ts"] or 0, reverse=True)
+    last = max(latest.values(), key=lambda r: r["ts"] or 0) if latest else None
+    return {
+        "latest_by_node": latest, "last": last, "recent": linhas, "total_rows": total,
+        "link": enlace, "versao": versao_atual, "alterado_em": alterado,
+    }
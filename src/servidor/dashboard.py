@@ -1,11 +1,17 @@
 """
 Gera HTML simples para o dashboard.
-- render_html(last_packet, recent, stats) -> str
+- render_html(last_packet, recent, stats, series=None, janela=None, link=None) -> str
+
+Os gráficos aceitam séries de qualquer tamanho: antes de desenhar, os pontos
+são reduzidos com LTTB (Largest-Triangle-Three-Buckets) para no máximo
+MAX_PONTOS_GRAFICO, então o SVG tem tamanho fixo mesmo para uma semana de dados.
 """
 
+import hashlib
+import json
 import time
 from html import escape
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def _fmt_ts(ts: int) -> str:
@@ -15,13 +21,323 @@ def _fmt_ts(ts: int) -> str:
         return str(ts)
 
 
+MAX_PONTOS_GRAFICO = 200
+JANELAS_GRAFICO = ("", "1h", "24h", "7d", "30d")  # "" = leituras recentes
+LINHAS_AO_VIVO = 50  # linhas mantidas na tabela/gráficos atualizados pelo stream
+_SEM_DADOS = '<tr><td colspan="{colunas}" style="padding:12px;"><em>Sem dados</em></td></tr>'
+
+# ---------- Arquivos estáticos (servidos em /static/, com cache no navegador) ----------
+DASHBOARD_CSS = """\
+:root {
+  --bg: #fbfdff;
+  --card: #ffffff;
+  --muted: #68707a;
+  --accent: #2b6cb0;
+  --border: #e6eef8;
+  --shadow: 0 6px 18px rgba(32,40,55,0.06);
+  --radius: 10px;
+  --danger: #e53e3e;
+  --danger-soft: #fff5f5;
+  --danger-border: #fed7d7;
+}
+* { box-sizing: border-box; }
+body {
+  font-family: Inter, system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial;
+  margin: 20px; background: var(--bg); color:#0b1220;
+}
+header {
+  display:flex; flex-wrap:wrap; align-items:baseline; gap:12px; justify-content:space-between;
+}
+header h1 { margin:0; font-size:20px; letter-spacing: -0.2px; }
+.sub { color:var(--muted); font-size:13px; }
+.topline { display:flex; gap:8px; align-items:center; flex-wrap:wrap; justify-content:flex-end; }
+.pill {
+  display:inline-block; background: #eef6ff; border:1px solid var(--border); padding:6px 10px;
+  border-radius:999px; font-size:13px; color:var(--accent);
+}
+.metrics { margin: 8px 0 18px; color:var(--muted); font-size:13px; }
+
+.grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 14px; }
+.card {
+  background: var(--card); border: 1px solid var(--border); border-radius: var(--radius);
+  padding:12px; box-shadow: var(--shadow);
+}
+.card.empty { text-align:center; color:var(--muted); padding:18px; }
+.card-head {
+  display:flex; justify-content:space-between; align-items:center; gap:8px; margin-bottom:8px;
+}
+.room { margin:0; font-size:15px; }
+.muted { color:var(--muted); font-size:12px; }
+
+.card-body { display:flex; gap:12px; }
+.stat {
+  flex:1; padding:8px; background: linear-gradient(180deg,#fbfdff,#f6f9ff); border-radius:8px;
+  border:1px solid #f0f6ff; text-align:center;
+}
+.label { font-size:12px; color:var(--muted); }
+.value { font-weight:600; margin-top:6px; font-size:15px; }
+
+.charts-grid {
+  display: grid;
+  grid-template-columns: repeat(auto-fit, minmax(260px, 1fr));
+  gap: 14px;
+  margin-top: 18px;
+}
+.chart-title {
+  margin: 0;
+  font-size: 15px;
+}
+.chart-subtitle {
+  margin: 0;
+  font-size: 12px;
+  color: var(--muted);
+}
+.chart-body {
+  margin-top: 6px;
+}
+.chart-svg {
+  width: 100%;
+  height: 260px;
+}
+.axis-line {
+  stroke: #d0d7e2;
+  stroke-width: 0.8;
+}
+.axis-label-x {
+  font-size: 6px;
+  fill: #8791a2;
+  dominant-baseline: hanging;
+}
+.axis-label-y {
+  font-size: 10px;
+  fill: #8791a2;
+}
+.chart-empty {
+  font-size: 13px;
+  color: var(--muted);
+  padding: 12px 4px;
+}
+
+table {
+  border-collapse: collapse; width: 100%; margin-top: 18px; background: #fff; border-radius:8px;
+  overflow:hidden; box-shadow: var(--shadow);
+}
+thead th {
+  background: #f7fbff; padding:10px 12px; text-align:left; font-size:13px; color:var(--muted);
+  border-bottom:1px solid var(--border);
+}
+tbody td { padding:10px 12px; font-size:14px; border-bottom:1px solid #f1f5f9; }
+tbody tr:last-child td { border-bottom: none; }
+
+@media (max-width:700px) {
+  header { gap:8px; flex-direction:column; align-items:flex-start; }
+  .topline { width:100%; justify-content:space-between; }
+  .card-body { flex-direction:column; }
+  thead th, tbody td { font-size:13px; padding:8px; }
+}
+
+.footer { margin-top: 18px; color:var(--muted); font-size:12px; }
+code { background: #f6f8fa; padding: 2px 6px; border-radius: 4px; font-size:13px; }
+
+.btn-danger {
+  border-radius: 999px;
+  border: 1px solid var(--danger-border);
+  background: var(--danger-soft);
+  color: var(--danger);
+  padding: 6px 12px;
+  font-size: 13px;
+  font-weight: 600;
+  cursor: pointer;
+  display:inline-flex;
+  align-items:center;
+  gap:6px;
+}
+.btn-danger:hover {
+  background: #fed7d7;
+}
+.btn-danger span.icon {
+  font-size: 14px;
+  line-height: 1;
+}
+.danger-zone {
+  display:flex;
+  align-items:center;
+  gap:8px;
+}
+"""
+
+# Atualização ao vivo: o navegador assina GET /stream (SSE) e corrige cards,
+# tabela e gráficos no lugar, sem recarregar a página. Os gráficos são
+# redesenhados com a mesma geometria de _build_timeseries_svg.
+DASHBOARD_JS = """\
+function confirmDeleteAll(form) {
+  if (confirm("Tem certeza que deseja apagar TODAS as leituras do banco de dados?")) {
+    return true;
+  }
+  return false;
+}
+
+(function () {
+  var dados = JSON.parse(document.getElementById("dados-dashboard").textContent);
+  var recentes = dados.recent;
+  var LIMITE = dados.limite;
+
+  function pad(n) { return (n < 10 ? "0" : "") + n; }
+  function fmtTs(ts) {
+    var d = new Date(ts * 1000);
+    return d.getFullYear() + "-" + pad(d.getMonth() + 1) + "-" + pad(d.getDate()) + " " +
+      pad(d.getHours()) + ":" + pad(d.getMinutes()) + ":" + pad(d.getSeconds());
+  }
+  function hhmm(ts) {
+    var d = new Date(ts * 1000);
+    return pad(d.getHours()) + ":" + pad(d.getMinutes());
+  }
+  function texto(id, valor) {
+    var el = document.getElementById(id);
+    if (el) el.textContent = valor;
+  }
+
+  function desenhar(id, chave) {
+    var el = document.getElementById(id);
+    if (!el) return;
+    var pts = recentes.filter(function (r) { return r[chave] !== null && r[chave] !== undefined; })
+      .map(function (r) { return [r.ts, +r[chave]]; })
+      .sort(function (a, b) { return a[0] - b[0]; });
+    if (pts.length < 2) {
+      el.innerHTML =
+        "<div class='chart-empty'><em>Sem dados suficientes para o gráfico.</em></div>";
+      return;
+    }
+    var L = 18, R = 6, T = 8, B = 26, W = 140, H = 120, uw = W - L - R, uh = H - T - B;
+    var ys = pts.map(function (p) { return p[1]; });
+    var ymin = Math.min.apply(null, ys), ymax = Math.max.apply(null, ys);
+    if (ymax === ymin) ymax = ymin + 1;
+    var t0 = pts[0][0], span = (pts[pts.length - 1][0] - t0) || 1;
+    var xy = pts.map(function (p) {
+      var x = L + uw * (p[0] - t0) / span, y = T + (1 - (p[1] - ymin) / (ymax - ymin)) * uh;
+      return x.toFixed(2) + "," + y.toFixed(2);
+    }).join(" ");
+    var n = pts.length, passo = Math.max(1, Math.floor(n / 5)), ticks = "", base = T + uh;
+    for (var i = 0; i < n; i += passo) ticks += rotuloX(pts, i, t0, span, L, uw, base);
+    if ((n - 1) % passo !== 0) ticks += rotuloX(pts, n - 1, t0, span, L, uw, base);
+    [[0, ymin], [0.5, (ymin + ymax) / 2], [1, ymax]].forEach(function (f) {
+      ticks += '<text x="' + (L - 2) + '" dx="-4" y="' + (T + (1 - f[0]) * uh).toFixed(2) +
+        '" text-anchor="end" alignment-baseline="middle" class="axis-label-y">' +
+        f[1].toFixed(1) + "</text>";
+    });
+    el.innerHTML = '<svg viewBox="0 0 ' + W + " " + H + '" class="chart-svg">' +
+      '<line x1="' + L + '" y1="' + base + '" x2="' + (W - R) + '" y2="' + base +
+      '" class="axis-line" />' +
+      '<line x1="' + L + '" y1="' + T + '" x2="' + L + '" y2="' + base + '" class="axis-line" />' +
+      '<polyline fill="rgba(43,108,176,0.12)" stroke="none" points="' +
+      L + "," + base + " " + xy + " " + (W - R) + "," + base + '" />' +
+      '<polyline fill="none" stroke="#2b6cb0" stroke-width="2.4" points="' + xy + '" />' +
+      ticks + "</svg>";
+  }
+  function rotuloX(pts, i, t0, span, L, uw, base) {
+    var x = L + uw * (pts[i][0] - t0) / span;
+    return '<text x="' + x.toFixed(2) + '" y="' + (base + 10).toFixed(2) +
+      '" text-anchor="middle" class="axis-label-x">' + hhmm(pts[i][0]) + "</text>";
+  }
+
+  function tabela() {
+    var corpo = document.getElementById("tabela-recentes");
+    if (!corpo) return;
+    corpo.textContent = "";
+    recentes.forEach(function (r) {
+      var tr = document.createElement("tr");
+      [fmtTs(r.ts), r.node_id, r.packet_number, r.temp, r.rh].forEach(function (v) {
+        var td = document.createElement("td");
+        td.textContent = String(v);
+        tr.appendChild(td);
+      });
+      corpo.appendChild(tr);
+    });
+  }
+
+  function estatisticas(stats) {
+    texto("total-leituras", stats.total_rows);
+    texto("atualizado-topo", fmtTs(Math.floor(stats.updated_at)));
+    texto("atualizado-rodape", fmtTs(Math.floor(stats.updated_at)));
+  }
+
+  if (!window.EventSource) {
+    setTimeout(function () { location.reload(); }, 10000);
+    return;
+  }
+  var fonte = new EventSource("/stream");
+  fonte.addEventListener("readings", function (ev) {
+    var msg = JSON.parse(ev.data);
+    if (!document.getElementById("card-pacote")) { location.reload(); return; }
+    msg.readings.forEach(function (r) { recentes.push(r); });
+    recentes.sort(function (a, b) { return b.ts - a.ts; });
+    recentes = recentes.slice(0, LIMITE);
+    var ultima = recentes[0];
+    texto("card-pacote", ultima.node_id + " · N° Pacote " + ultima.packet_number);
+    texto("card-ts", fmtTs(ultima.ts));
+    texto("card-temp", ultima.temp + " °C");
+    texto("card-rh", ultima.rh + " %");
+    tabela();
+    if (dados.ao_vivo) { desenhar("grafico-temp", "temp"); desenhar("grafico-rh", "rh"); }
+    estatisticas(msg.stats);
+  });
+  fonte.addEventListener("reset", function () { location.reload(); });
+})();
+"""
+
+# Versão dos estáticos na URL: muda quando o conteúdo muda (invalida o cache)
+ASSETS_VERSION = hashlib.sha1((DASHBOARD_CSS + DASHBOARD_JS).encode("utf-8")).hexdigest()[:10]
+STATIC_FILES = {
+    "/static/dashboard.css": (DASHBOARD_CSS.encode("utf-8"), "text/css; charset=utf-8"),
+    "/static/dashboard.js": (DASHBOARD_JS.encode("utf-8"), "application/javascript; charset=utf-8"),
+}
+
+
+def _lttb(points: List[Tuple[int, float]], threshold: int) -> List[Tuple[int, float]]:
+    """
+    Reduz `points` (ordenados por ts) para `threshold` pontos preservando a forma.
+    Mantém o primeiro e o último; em cada bucket intermediário escolhe o ponto que
+    forma o maior triângulo com o ponto já escolhido e a média do próximo bucket.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return points
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Média do próximo bucket
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(p[0] for p in points[start:end]) / (end - start)
+        avg_y = sum(p[1] for p in points[start:end]) / (end - start)
+
+        # Ponto do bucket atual com maior área
+        ax, ay = points[a]
+        melhor = -1.0
+        escolhido = a
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > melhor:
+                melhor = area
+                escolhido = j
+        sampled.append(points[escolhido])
+        a = escolhido
+
+    sampled.append(points[-1])
+    return sampled
+
+
 def _build_timeseries_svg(
     recent: List[Dict[str, Any]],
     value_key: str,
+    max_pontos: int = MAX_PONTOS_GRAFICO,
 ) -> str:
     """
     Gera um SVG simples de série temporal usando os dados de `recent`.
     value_key: "temp" ou "rh"
+    Séries maiores que `max_pontos` são reduzidas com LTTB antes do desenho.
     """
     # Filtra apenas linhas com valor válido
     points: List[Tuple[int, float]] = []
@@ -40,8 +356,9 @@ def _build_timeseries_svg(
     if len(points) < 2:
         return "<div class='chart-empty'><em>Sem dados suficientes para o gráfico.</em></div>"
 
-    # Ordena por timestamp (garantia)
+    # Ordena por timestamp (garantia) e reduz ao orçamento de pontos
     points.sort(key=lambda x: x[0])
+    points = _lttb(points, max_pontos)
 
     ts_list = [p[0] for p in points]
     ys = [p[1] for p in points]
@@ -63,17 +380,14 @@ def _build_timeseries_svg(
     usable_w = WIDTH - LEFT - RIGHT
     usable_h = HEIGHT - TOP - BOTTOM
 
+    # X proporcional ao tempo: depois do LTTB os pontos não são equidistantes
     n = len(points)
-    xs = []
-    for i in range(n):
-        if n == 1:
-            x = LEFT + usable_w / 2
-        else:
-            x = LEFT + (usable_w * i / (n - 1))
-        xs.append(x)
+    t0 = ts_list[0]
+    span = (ts_list[-1] - t0) or 1
+    xs = [LEFT + usable_w * (ts - t0) / span for ts in ts_list]
 
     svg_points = []
-    for x, y in zip(xs, ys):
+    for x, y in zip(xs, ys, strict=True):
         norm = (y - y_min) / (y_max - y_min)
         svg_y = TOP + (1 - norm) * usable_h
         svg_points.append(f"{x:.2f},{svg_y:.2f}")
@@ -87,10 +401,11 @@ def _build_timeseries_svg(
     axis_y = TOP + usable_h            # posição da linha do eixo X
     label_y = axis_y + 10              # labels um pouco abaixo da linha
 
+    fmt = "%d/%m %H:%M" if span > 24 * 3600 else "%H:%M"
     for idx in tick_indices:
         x = xs[idx]
         ts_val = ts_list[idx]
-        label = time.strftime("%H:%M", time.localtime(ts_val))
+        label = time.strftime(fmt, time.localtime(ts_val))
         x_ticks.append(
             f'<text x="{x:.2f}" y="{label_y:.2f}" '
             f'text-anchor="middle" class="axis-label-x">{escape(label)}</text>'
@@ -109,7 +424,8 @@ def _build_timeseries_svg(
 
     svg = f"""
     <svg viewBox="0 0 {WIDTH} {HEIGHT}" class="chart-svg">
-      <line x1="{LEFT}" y1="{TOP + usable_h}" x2="{WIDTH - RIGHT}" y2="{TOP + usable_h}" class="axis-line" />
+      <line x1="{LEFT}" y1="{TOP + usable_h}" x2="{WIDTH - RIGHT}" y2="{TOP + usable_h}"
+            class="axis-line" />
       <line x1="{LEFT}" y1="{TOP}" x2="{LEFT}" y2="{TOP + usable_h}" class="axis-line" />
 
       <polyline
@@ -136,7 +452,16 @@ def render_html(
     last_packet: Dict[str, Dict[str, Any]],
     recent: List[Dict[str, Any]],
     stats: Dict[str, Any],
+    series: Optional[List[Dict[str, Any]]] = None,
+    janela: Optional[str] = None,
+    link: Optional[List[Dict[str, Any]]] = None,
 ) -> str:
+    """
+    `series` (opcional) alimenta os gráficos com um intervalo longo, por exemplo
+    o resultado de storage.get_series; `janela` é o rótulo do intervalo ("24h").
+    Sem `series`, os gráficos usam as leituras recentes. `link` são os totais
+    de storage.get_link_stats, mostrados na tabela de qualidade do enlace.
+    """
     # Cards de última leitura por packet
     cards = []
     if not last_packet:
@@ -145,20 +470,22 @@ def render_html(
         ts = _fmt_ts(last_packet.get("ts"))
         temp = escape(str(last_packet.get("temp", "—")))
         rh = escape(str(last_packet.get("rh", "—")))
+        node = escape(str(last_packet.get("node_id")))
+        pacote = escape(str(last_packet.get("packet_number")))
         card = f"""
         <div class="card">
           <div class="card-head">
-            <h3 class="room">N° Pacote {escape(str(last_packet.get("packet_number")))}</h3>
-            <div class="small muted">{ts}</div>
+            <h3 class="room" id="card-pacote">{node} · N° Pacote {pacote}</h3>
+            <div class="small muted" id="card-ts">{ts}</div>
           </div>
           <div class="card-body">
             <div class="stat">
               <div class="label">🌡️ Temperatura</div>
-              <div class="value">{temp} °C</div>
+              <div class="value" id="card-temp">{temp} °C</div>
             </div>
             <div class="stat">
               <div class="label">💧 UR</div>
-              <div class="value">{rh} %</div>
+              <div class="value" id="card-rh">{rh} %</div>
             </div>
           </div>
         </div>
@@ -171,149 +498,57 @@ def render_html(
         rows_html.append(
             "<tr>"
             f"<td>{_fmt_ts(r.get('ts'))}</td>"
+            f"<td>{escape(str(r.get('node_id')))}</td>"
             f"<td>{escape(str(r.get('packet_number')))}</td>"
             f"<td>{escape(str(r.get('temp')))}</td>"
             f"<td>{escape(str(r.get('rh')))}</td>"
             "</tr>"
         )
 
+    # Qualidade do enlace por nó (perda de pacotes)
+    link_html = []
+    for n in link or []:
+        pdr = "—" if n.get("pdr") is None else f"{n['pdr'] * 100:.1f} %"
+        iat = "—" if n.get("iat_mean") is None else f"{n['iat_mean']:.1f} s"
+        link_html.append(
+            "<tr>"
+            f"<td>{escape(str(n.get('node_id')))}</td>"
+            f"<td>{n.get('received')} / {n.get('expected')}</td>"
+            f"<td>{pdr}</td>"
+            f"<td>{max(n.get('lost', 0) - n.get('late', 0), 0)}</td>"
+            f"<td>{n.get('gaps')} (maior: {n.get('max_gap')})</td>"
+            f"<td>{n.get('late')}</td>"
+            f"<td>{n.get('duplicates')}</td>"
+            f"<td>{iat}</td>"
+            "</tr>"
+        )
+
     updated = _fmt_ts(int(stats.get("updated_at", time.time())))
 
-    # Gráficos de série temporal usando as leituras recentes
-    temp_svg = _build_timeseries_svg(recent, "temp")
-    rh_svg = _build_timeseries_svg(recent, "rh")
+    # Gráficos de série temporal (leituras recentes ou a janela pedida)
+    pontos = recent if series is None else series
+    temp_svg = _build_timeseries_svg(pontos, "temp")
+    rh_svg = _build_timeseries_svg(pontos, "rh")
+    if series is None:
+        subtitulo = "Baseado nas leituras recentes"
+    else:
+        subtitulo = f"Últimas {escape(janela or '')}"
+    dados_json = json.dumps(
+        {"recent": recent, "limite": LINHAS_AO_VIVO, "ao_vivo": series is None},
+        ensure_ascii=False,
+    ).replace("</", "<\\/")
+    links = " · ".join(
+        f'<a href="/dashboard{"?range=" + j if j else ""}">{escape(j or "recentes")}</a>'
+        for j in JANELAS_GRAFICO
+    )
 
     html = f"""<!DOCTYPE html>
 <html lang="pt-BR">
 <head>
   <meta charset="utf-8">
   <title>Dashboard LoRa - Protótipo</title>
-  <meta http-equiv="refresh" content="10"> <!-- auto-refresh a cada 10s -->
   <meta name="viewport" content="width=device-width,initial-scale=1">
-  <style>
-    :root {{
-      --bg: #fbfdff;
-      --card: #ffffff;
-      --muted: #68707a;
-      --accent: #2b6cb0;
-      --border: #e6eef8;
-      --shadow: 0 6px 18px rgba(32,40,55,0.06);
-      --radius: 10px;
-      --danger: #e53e3e;
-      --danger-soft: #fff5f5;
-      --danger-border: #fed7d7;
-    }}
-    * {{ box-sizing: border-box; }}
-    body {{ font-family: Inter, system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial; margin: 20px; background: var(--bg); color:#0b1220; }}
-    header {{ display:flex; flex-wrap:wrap; align-items:baseline; gap:12px; justify-content:space-between; }}
-    header h1 {{ margin:0; font-size:20px; letter-spacing: -0.2px; }}
-    .sub {{ color:var(--muted); font-size:13px; }}
-    .topline {{ display:flex; gap:8px; align-items:center; flex-wrap:wrap; justify-content:flex-end; }}
-    .pill {{ display:inline-block; background: #eef6ff; border:1px solid var(--border); padding:6px 10px; border-radius:999px; font-size:13px; color:var(--accent); }}
-    .metrics {{ margin: 8px 0 18px; color:var(--muted); font-size:13px; }}
-
-    .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 14px; }}
-    .card {{ background: var(--card); border: 1px solid var(--border); border-radius: var(--radius); padding:12px; box-shadow: var(--shadow); }}
-    .card.empty {{ text-align:center; color:var(--muted); padding:18px; }}
-    .card-head {{ display:flex; justify-content:space-between; align-items:center; gap:8px; margin-bottom:8px; }}
-    .room {{ margin:0; font-size:15px; }}
-    .muted {{ color:var(--muted); font-size:12px; }}
-
-    .card-body {{ display:flex; gap:12px; }}
-    .stat {{ flex:1; padding:8px; background: linear-gradient(180deg,#fbfdff,#f6f9ff); border-radius:8px; border:1px solid #f0f6ff; text-align:center; }}
-    .label {{ font-size:12px; color:var(--muted); }}
-    .value {{ font-weight:600; margin-top:6px; font-size:15px; }}
-
-    .charts-grid {{
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(260px, 1fr));
-      gap: 14px;
-      margin-top: 18px;
-    }}
-    .chart-title {{
-      margin: 0;
-      font-size: 15px;
-    }}
-    .chart-subtitle {{
-      margin: 0;
-      font-size: 12px;
-      color: var(--muted);
-    }}
-    .chart-body {{
-      margin-top: 6px;
-    }}
-    .chart-svg {{
-      width: 100%;
-      height: 260px;
-    }}
-    .axis-line {{
-      stroke: #d0d7e2;
-      stroke-width: 0.8;
-    }}
-    .axis-label-x {{
-      font-size: 6px;
-      fill: #8791a2;
-      dominant-baseline: hanging;
-    }}
-    .axis-label-y {{
-      font-size: 10px;
-      fill: #8791a2;
-    }}
-    .chart-empty {{
-      font-size: 13px;
-      color: var(--muted);
-      padding: 12px 4px;
-    }}
-
-    table {{ border-collapse: collapse; width: 100%; margin-top: 18px; background: #fff; border-radius:8px; overflow:hidden; box-shadow: var(--shadow); }}
-    thead th {{ background: #f7fbff; padding:10px 12px; text-align:left; font-size:13px; color:var(--muted); border-bottom:1px solid var(--border); }}
-    tbody td {{ padding:10px 12px; font-size:14px; border-bottom:1px solid #f1f5f9; }}
-    tbody tr:last-child td {{ border-bottom: none; }}
-
-    @media (max-width:700px) {{
-      header {{ gap:8px; flex-direction:column; align-items:flex-start; }}
-      .topline {{ width:100%; justify-content:space-between; }}
-      .card-body {{ flex-direction:column; }}
-      thead th, tbody td {{ font-size:13px; padding:8px; }}
-    }}
-
-    .footer {{ margin-top: 18px; color:var(--muted); font-size:12px; }}
-    code {{ background: #f6f8fa; padding: 2px 6px; border-radius: 4px; font-size:13px; }}
-
-    .btn-danger {{
-      border-radius: 999px;
-      border: 1px solid var(--danger-border);
-      background: var(--danger-soft);
-      color: var(--danger);
-      padding: 6px 12px;
-      font-size: 13px;
-      font-weight: 600;
-      cursor: pointer;
-      display:inline-flex;
-      align-items:center;
-      gap:6px;
-    }}
-    .btn-danger:hover {{
-      background: #fed7d7;
-    }}
-    .btn-danger span.icon {{
-      font-size: 14px;
-      line-height: 1;
-    }}
-    .danger-zone {{
-      display:flex;
-      align-items:center;
-      gap:8px;
-    }}
-  </style>
-  <script>
-    function confirmDeleteAll(form) {{
-      if (confirm("Tem certeza que deseja apagar TODAS as leituras do banco de dados?")) {{
-        return true;
-      }}
-      return false;
-    }}
-  </script>
+  <link rel="stylesheet" href="/static/dashboard.css?v={ASSETS_VERSION}">
 </head>
 <body>
   <header>
@@ -322,9 +557,12 @@ def render_html(
       <div class="sub">Visão rápida</div>
     </div>
     <div class="topline">
-      <span class="pill">Leituras: {stats.get('total_rows', 0)}</span>
-      <div class="sub">Última: <strong>{updated}</strong></div>
-      <form class="danger-zone" method="POST" action="/delete-all" onsubmit="return confirmDeleteAll(this);">
+      <span class="pill">
+        Leituras: <span id="total-leituras">{stats.get('total_rows', 0)}</span>
+      </span>
+      <div class="sub">Última: <strong id="atualizado-topo">{updated}</strong></div>
+      <form class="danger-zone" method="POST" action="/delete-all"
+            onsubmit="return confirmDeleteAll(this);">
         <button type="submit" class="btn-danger" title="Apagar todos os dados do banco">
           <span class="icon">🗑️</span>
           <span>Apagar todos os dados</span>
@@ -343,10 +581,10 @@ def render_html(
       <div class="card-head">
         <div>
           <h3 class="chart-title">Temperatura (°C) – evolução temporal</h3>
-          <p class="chart-subtitle">Baseado nas leituras recentes</p>
+          <p class="chart-subtitle">{subtitulo} — {links}</p>
         </div>
       </div>
-      <div class="chart-body">
+      <div class="chart-body" id="grafico-temp">
         {temp_svg}
       </div>
     </div>
@@ -354,10 +592,10 @@ def render_html(
       <div class="card-head">
         <div>
           <h3 class="chart-title">Umidade Relativa (%) – evolução temporal</h3>
-          <p class="chart-subtitle">Baseado nas leituras recentes</p>
+          <p class="chart-subtitle">{subtitulo} — {links}</p>
         </div>
       </div>
-      <div class="chart-body">
+      <div class="chart-body" id="grafico-rh">
         {rh_svg}
       </div>
     </div>
@@ -369,20 +607,45 @@ def render_html(
       <thead>
         <tr>
           <th>Timestamp</th>
+          <th>Nó</th>
           <th>Número do Pacote</th>
           <th>Temp (°C)</th>
           <th>UR (%)</th>
         </tr>
       </thead>
+      <tbody id="tabela-recentes">
+        {''.join(rows_html) or _SEM_DADOS.format(colunas=5)}
+      </tbody>
+    </table>
+  </div>
+
+  <h2 style="margin-top:18px;font-size:16px;">Qualidade do enlace (últimas 24 h)</h2>
+  <div style="overflow:auto;">
+    <table role="table">
+      <thead>
+        <tr>
+          <th>Nó</th>
+          <th>Recebidos / esperados</th>
+          <th>Entrega</th>
+          <th>Perdidos</th>
+          <th>Buracos</th>
+          <th>Fora de ordem</th>
+          <th>Duplicados</th>
+          <th>Intervalo médio</th>
+        </tr>
+      </thead>
       <tbody>
-        {''.join(rows_html) or '<tr><td colspan="4" style="padding:12px;"><em>Sem dados</em></td></tr>'}
+        {''.join(link_html) or _SEM_DADOS.format(colunas=8)}
       </tbody>
     </table>
   </div>
 
   <div class="footer">
-    Atualizado em <code>{updated}</code>. Página atualiza automaticamente a cada 5s.
+    Atualizado em <code id="atualizado-rodape">{updated}</code>.
+    Atualização ao vivo via <code>/stream</code>.
   </div>
+  <script id="dados-dashboard" type="application/json">{dados_json}</script>
+  <script src="/static/dashboard.js?v={ASSETS_VERSION}"></script>
 </body>
 </html>
 """
@@ -0,0 +1,163 @@
+"""
+Diário de ingestão (write-ahead log) em disco.
+
+Toda leitura aceita por /ingest ou /ingest/batch é anexada ao diário antes da
+resposta 202; o worker de persistência confirma o número de sequência depois do
+commit no SQLite. Se o processo morrer no meio do caminho, recuperar() devolve
+as entradas ainda não confirmadas para serem gravadas na inicialização.
+- anexar(item)       : grava um registro e devolve seu número de sequência
+- sincronizar(seq)   : garante o registro em disco (só no modo "always")
+- confirmar(seq)     : tudo até seq já está no banco (libera segmentos antigos)
+- recuperar()        : registros com seq acima do último checkpoint, em ordem
+
+Formato: segmentos `NNNNNNNNNNNN.log` com registros [seq u64][tamanho u32]
+[crc32 u32][JSON]. Um registro truncado ou corrompido (escrita interrompida
+pela queda) encerra a leitura do segmento. O checkpoint é um arquivo com o
+último seq confirmado; se ele ficar para trás, a reexecução é idempotente
+graças ao UNIQUE (node_id, packet_number) do banco.
+
+Modo de sincronização (LORA_JOURNAL_SYNC):
+- "none"   : write() sem fsync; sobrevive à queda do processo (padrão)
+- "always" : fsync antes da resposta; sobrevive à queda da máquina. Vários
+             anexos concorrentes compartilham o mesmo fsync (group commit)
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Iterator, List, Optional, Tuple
+
+SEGMENT_BYTES = int(os.environ.get("LORA_JOURNAL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+SYNC = os.environ.get("LORA_JOURNAL_SYNC", "none")
+
+_CABECALHO = struct.Struct("<QII")
+_CHECKPOINT = struct.Struct("<Q")
+
+
+class Diario:
+    def __init__(self, diretorio: str, sync: str = SYNC, segment_bytes: int = SEGMENT_BYTES):
+        os.makedirs(diretorio, exist_ok=True)
+        self.diretorio = diretorio
+        self.sync = sync
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._checkpoint_path = os.path.join(diretorio, "checkpoint")
+        self.confirmado = self._ler_checkpoint()
+        self._sincronizado = 0
+
+        # Segmentos existentes: (primeiro seq, caminho); o último seq vem da varredura
+        self._segmentos: List[Tuple[int, str]] = sorted(
+            (int(nome[:-4]), os.path.join(diretorio, nome))
+            for nome in os.listdir(diretorio) if nome.endswith(".log")
+        )
+        ultimo = self.confirmado
+        for _, caminho in self._segmentos:
+            for seq, _ in self._registros(caminho):
+                ultimo = max(ultimo, seq)
+        self.ultimo_seq = ultimo
+        self._fd: Optional[int] = None
+        self._tamanho = 0
+        self._abrir_segmento()
+
+    # ---------- escrita ----------
+    def _abrir_segmento(self):
+        primeiro = self.ultimo_seq + 1
+        caminho = os.path.join(self.diretorio, f"{primeiro:012d}.log")
+        self._fd = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._tamanho = os.fstat(self._fd).st_size
+        if not self._segmentos or self._segmentos[-1][1] != caminho:
+            self._segmentos.append((primeiro, caminho))
+
+    def anexar(self, item: Any) -> int:
+        payload = json.dumps(item, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            seq = self.ultimo_seq + 1
+            registro = _CABECALHO.pack(seq, len(payload), zlib.crc32(payload)) + payload
+            os.write(self._fd, registro)
+            self.ultimo_seq = seq
+            self._tamanho += len(registro)
+            if self._tamanho >= self.segment_bytes:
+                if self.sync == "always":
+                    os.fsync(self._fd)
+                    self._sincronizado = seq
+                os.close(self._fd)
+                self._abrir_segmento()
+        return seq
+
+    def sincronizar(self, seq: int):
+        """fsync compartilhado: quem chega enquanto outro sincroniza aproveita o mesmo."""
+        if self.sync != "always" or self._sincronizado >= seq:
+            return
+        with self._sync_lock:
+            if self._sincronizado >= seq:
+                return
+            with self._lock:
+                fd = os.dup(self._fd)
+                alvo = self.ultimo_seq
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._sincronizado = alvo
+
+    # ---------- confirmação ----------
+    def confirmar(self, seq: int):
+        """Chamado pelo worker após o commit; apaga segmentos já totalmente gravados."""
+        if seq <= self.confirmado:
+            return
+        self.confirmado = seq
+        fd = os.open(self._checkpoint_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, _CHECKPOINT.pack(seq), 0)
+        finally:
+            os.close(fd)
+        with self._lock:
+            # Um segmento fechado pode sair quando o seguinte começa depois de seq
+            while len(self._segmentos) > 1 and self._segmentos[1][0] <= seq + 1:
+                _, caminho = self._segmentos.pop(0)
+                os.unlink(caminho)
+
+    def pendentes(self) -> int:
+        return self.ultimo_seq - self.confirmado
+
+    # ---------- leitura ----------
+    def _ler_checkpoint(self) -> int:
+        try:
+            with open(self._checkpoint_path, "rb") as f:
+                return _CHECKPOINT.unpack(f.read(_CHECKPOINT.size))[0]
+        except (OSError, struct.error):
+            return 0
+
+    @staticmethod
+    def _registros(caminho: str) -> Iterator[Tuple[int, Any]]:
+        with open(caminho, "rb") as f:
+            dados = f.read()
+        pos = 0
+        while pos + _CABECALHO.size <= len(dados):
+            seq, tamanho, crc = _CABECALHO.unpack_from(dados, pos)
+            inicio = pos + _CABECALHO.size
+            payload = dados[inicio:inicio + tamanho]
+            if len(payload) < tamanho or zlib.crc32(payload) != crc:
+                return  # escrita interrompida: o resto do segmento não vale
+            yield seq, json.loads(payload)
+            pos = inicio + tamanho
+
+    def recuperar(self) -> List[Tuple[int, Any]]:
+        """Registros ainda não confirmados, na ordem em que foram aceitos."""
+        with self._lock:
+            segmentos = list(self._segmentos)
+        return [
+            (seq, item)
+            for _, caminho in segmentos
+            for seq, item in self._registros(caminho)
+            if seq > self.confirmado
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
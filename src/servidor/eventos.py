@@ -0,0 +1,123 @@
+"""
+Barramento de eventos ao vivo para o stream SSE (GET /stream).
+- publicar(evento, dados) : chamado pelo worker de persistência após cada commit
+- tem_assinantes()        : evita serializar eventos quando ninguém está ouvindo
+- Fluxo                   : corpo de resposta que assina o barramento e gera SSE
+
+Cada evento é serializado uma única vez e a mesma sequência de bytes é entregue
+a todos os assinantes. Um assinante lento demais (fila cheia) é desconectado;
+o EventSource do navegador reconecta sozinho.
+"""
+
+import asyncio
+import json
+import queue
+import threading
+from typing import Any, AsyncIterator, Iterator, Optional, Set
+
+MAX_PENDENTES = 256      # eventos enfileirados por assinante
+HEARTBEAT_S = 15.0       # comentário SSE para manter a conexão viva
+RETRY_MS = 3000          # intervalo de reconexão sugerido ao navegador
+
+
+class Assinatura:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.encerrada = False
+        if loop is None:
+            self.fila: Any = queue.Queue(maxsize=MAX_PENDENTES)
+        else:
+            self.fila = asyncio.Queue(maxsize=MAX_PENDENTES)
+
+    def _put(self, msg: bytes):
+        try:
+            self.fila.put_nowait(msg)
+        except (queue.Full, asyncio.QueueFull):
+            self.encerrada = True
+
+    def entregar(self, msg: bytes):
+        if self.loop is None:
+            self._put(msg)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, msg)
+        except RuntimeError:  # event loop já encerrado
+            self.encerrada = True
+
+
+_lock = threading.Lock()
+_assinaturas: Set[Assinatura] = set()
+
+
+def _assinar(loop: Optional[asyncio.AbstractEventLoop] = None) -> Assinatura:
+    a = Assinatura(loop)
+    with _lock:
+        _assinaturas.add(a)
+    return a
+
+
+def _cancelar(a: Assinatura):
+    with _lock:
+        _assinaturas.discard(a)
+
+
+def tem_assinantes() -> bool:
+    return bool(_assinaturas)
+
+
+def assinantes() -> int:
+    return len(_assinaturas)
+
+
+def formatar(evento: str, dados: Any) -> bytes:
+    corpo = json.dumps(dados, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {evento}\ndata: {corpo}\n\n".encode()
+
+
+def publicar(evento: str, dados: Any):
+    if not _assinaturas:
+        return
+    msg = formatar(evento, dados)
+    with _lock:
+        assinaturas = list(_assinaturas)
+    for a in assinaturas:
+        a.entregar(msg)
+        if a.encerrada:
+            _cancelar(a)
+
+
+class Fluxo:
+    """Corpo de resposta SSE, consumido pelo servidor com threads (iter) ou asyncio (async for)."""
+
+    def __init__(self, heartbeat: float = HEARTBEAT_S):
+        self.heartbeat = heartbeat
+
+    def _inicio(self) -> bytes:
+        return f"retry: {RETRY_MS}\n\n".encode("ascii")
+
+    def __iter__(self) -> Iterator[bytes]:
+        a = _assinar()
+        try:
+            yield self._inicio()
+            while not a.encerrada:
+                try:
+                    yield a.fila.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield b": ping\n\n"
+        finally:
+            _cancelar(a)
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._aiter()
+
+    async def _aiter(self) -> AsyncIterator[bytes]:
+        a = _assinar(asyncio.get_running_loop())
+        try:
+            yield self._inicio()
+            while not a.encerrada:
+                try:
+                    yield await asyncio.wait_for(a.fila.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+        finally:
+            _cancelar(a)
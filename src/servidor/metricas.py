@@ -0,0 +1,165 @@
+"""
+Métricas no formato texto do Prometheus (GET /metrics).
+- Contador(nome, ajuda, rotulos)   : .inc(*valores_rotulos, n=1)
+- Medidor(nome, ajuda, funcao)     : valor lido na hora da coleta (ex.: tamanho da fila)
+- Histograma(nome, ajuda, rotulos) : .observar(valor, *valores_rotulos), buckets fixos
+- cronometrar(histograma, rotulo)  : decorador que observa a duração de uma função
+- exportar()                       : texto de todas as métricas registradas
+
+Feito para ficar ligado em produção: cada observação é um bisect em uma lista
+curta e um incremento sob um lock próprio da série; nada é alocado por
+observação depois que a combinação de rótulos já existe.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Buckets padrão (segundos): de 100µs a 10s
+BUCKETS_LATENCIA = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_registro: List["_Metrica"] = []
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: Sequence[str], valores: Sequence[str]) -> str:
+    if not nomes:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores, strict=True)) + "}"
+
+
+def _numero(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+    def exportar(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *valores: str, n: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + n
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return self._cabecalho() + [
+            f"{self.nome}{_rotulos(self.rotulos, v)} {_numero(n)}" for v, n in itens
+        ]
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo calculado por `funcao` no momento da coleta."""
+
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, funcao: Callable[[], float]):
+        super().__init__(nome, ajuda)
+        self.funcao = funcao
+
+    def exportar(self) -> List[str]:
+        return self._cabecalho() + [f"{self.nome} {_numero(self.funcao())}"]
+
+
+class _Serie:
+    __slots__ = ("contagens", "soma", "total")
+
+    def __init__(self, n: int):
+        self.contagens = [0] * n  # por bucket (não cumulativo); +Inf no fim
+        self.soma = 0.0
+        self.total = 0
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], _Serie] = {}
+
+    def observar(self, valor: float, *valores: str):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = _Serie(len(self.buckets) + 1)
+            serie.contagens[i] += 1
+            serie.soma += valor
+            serie.total += 1
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (v, list(s.contagens), s.soma, s.total) for v, s in self._series.items()
+            )
+        linhas = self._cabecalho()
+        nomes_le = self.rotulos + ("le",)
+        for valores, contagens, soma, total in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), contagens, strict=True):
+                acumulado += n
+                rot = _rotulos(nomes_le, valores + (_numero(limite),))
+                linhas.append(f"{self.nome}_bucket{rot} {acumulado}")
+            rot = _rotulos(self.rotulos, valores)
+            linhas.append(f"{self.nome}_sum{rot} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rot} {total}")
+        return linhas
+
+
+def cronometrar(histograma: Histograma, *valores: str):
+    """Decorador: observa em `histograma` a duração de cada chamada (também com exceção)."""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envolvida(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histograma.observar(time.perf_counter() - t0, *valores)
+        return envolvida
+    return decorador
+
+
+def exportar() -> str:
+    linhas: List[str] = []
+    for metrica in _registro:
+        linhas.extend(metrica.exportar())
+    return "\n".join(linhas) + "\n"
+
+
+# Métricas do próprio processo
+_INICIO = time.time()
+Medidor("lora_process_start_time_seconds", "Horário de início do processo (epoch).",
+        lambda: _INICIO)
@@ -2,33 +2,213 @@
 """
 Servidor HTTP.
 - POST /ingest        : recebe leituras em JSON e enfileira para persistência
+- POST /ingest/batch  : recebe várias leituras (array JSON ou NDJSON) de uma vez
+                        (as duas rotas também aceitam o formato binário de binario.py)
 - POST /delete-all : apaga todas as leituras do banco
-- GET  /dashboard     : renderiza HTML simples com últimas leituras
+- GET  /dashboard     : renderiza HTML simples com últimas leituras (ETag + gzip)
+- GET  /static/...    : CSS e JS do dashboard (cache longo no navegador)
 - GET  /health        : status rápido
+- GET  /metrics       : métricas no formato do Prometheus (latências, fila, commits)
+- GET  /api/series    : série histórica de um nó (bruta ou agregada por minuto/hora)
+- GET  /api/alerts    : alertas do motor de regras (limites, taxa, z-score, valor travado)
+- GET  /api/link      : qualidade do enlace por nó (perda de pacotes, buracos, intervalos)
+- GET  /api/readings  : histórico bruto paginado por cursor (ts, rowid)
+- GET  /export.csv    : exportação do histórico em CSV (streaming, memória constante)
+- GET  /export.ndjson : o mesmo em NDJSON
+- GET  /stream        : Server-Sent Events com as leituras novas e as estatísticas
 
 Execução:
-  python3 servidor.py
+  python3 servidor.py                          # uma thread por conexão (HTTP/1.1 keep-alive)
+  LORA_SERVER_MODE=async python3 servidor.py   # asyncio: uma thread para todas as conexões
+  LORA_HTTP_PROCESSES=4 python3 servidor.py    # 4 processos HTTP + 1 processo escritor
 """
 
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from urllib.parse import urlparse, parse_qs
+import csv
+import gzip
+import io
 import json
-import time
 import logging
-import threading
-import queue
+import math
+import multiprocessing
 import os
-from typing import Any, Dict
+import queue
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
-# Módulos locais
-import storage
-import dashboard
+# Módulos locais (deduplicação e formato binário ficam em src/compartilhado, com o gateway)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "compartilhado"))
+import alertas  # noqa: E402
+import binario  # noqa: E402
+import cache  # noqa: E402
+import dashboard  # noqa: E402
+import diario  # noqa: E402
+import eventos  # noqa: E402
+import metricas  # noqa: E402
+import storage  # noqa: E402
+from dedupe import JanelaDedupe  # noqa: E402
 
 HOST = os.environ.get("LORA_HOST", "0.0.0.0")
 PORT = int(os.environ.get("LORA_PORT", "8080"))
+# "threaded" (ThreadingHTTPServer, padrão) ou "async" (asyncio); os dois com keep-alive
+SERVER_MODE = os.environ.get("LORA_SERVER_MODE", "threaded")
+# Conexão keep-alive ociosa é fechada depois de KEEPALIVE_TIMEOUT segundos
+KEEPALIVE_TIMEOUT = float(os.environ.get("LORA_KEEPALIVE_TIMEOUT", "15"))
+# Acima de 1: processos HTTP na mesma porta (SO_REUSEPORT) e um processo
+# escritor dono da conexão de escrita do SQLite (ver "Vários processos" abaixo)
+HTTP_PROCESSES = int(os.environ.get("LORA_HTTP_PROCESSES", "1"))
+
+# Fila de ingestão (producer: handler; consumer: worker de persistência).
+# Cada entrada é (instante em que entrou na fila, item, seq no diário), onde o
+# item é uma leitura (dict) ou um lote aceito por /ingest/batch (list).
+INGEST_QUEUE: "queue.Queue[Any]" = queue.Queue(maxsize=10_000)
+MAX_BATCH_ITEMS = int(os.environ.get("LORA_MAX_BATCH_ITEMS", "5000"))
+
+
+# Deduplicação por nó antes da fila: retransmissões do gateway não chegam ao
+# banco. A janela só é marcada depois que a leitura entra na fila, para que um
+# 503 não faça a retransmissão seguinte ser tomada como duplicada.
+DEDUPE = JanelaDedupe()
+MAX_NODE_ID = 64
+
+
+def _chave(data: Dict[str, Any]) -> Tuple[str, Optional[int], Any]:
+    """(nó, pacote, ts): o ts separa um pacote repetido de um contador reiniciado."""
+    return (data.get("node_id") or "node_padrao", _packet_number(data.get("packet_number")),
+            data.get("ts"))
+
+
+# Retransmissões barradas aqui não chegam ao banco; a contagem por (nó, hora de
+# chegada) segue com o próximo lote do worker para as estatísticas de enlace.
+_duplicadas: "Counter[Tuple[str, int]]" = Counter()
+_duplicadas_lock = threading.Lock()
+
+
+def _contar_duplicadas(nos: List[str]):
+    agora = int(time.time())
+    hora = agora - agora % storage.LINK_BUCKET
+    with _duplicadas_lock:
+        _duplicadas.update((n, hora) for n in nos)
+
+
+def _drenar_duplicadas() -> Dict[Tuple[str, int], int]:
+    global _duplicadas
+    with _duplicadas_lock:
+        contagem, _duplicadas = _duplicadas, Counter()
+    return dict(contagem)
+
+
+# ---------- Diário e contrapressão ----------
+# Leituras aceitas vão para o diário em disco (diario.py) antes do 202 e são
+# reexecutadas na inicialização se o processo morrer antes do commit.
+# Contrapressão com histerese: ao passar de QUEUE_HIGH leituras pendentes o
+# servidor responde 503 até voltar a QUEUE_LOW, com Retry-After calculado pela
+# vazão recente do worker.
+JOURNAL_ENABLED = os.environ.get("LORA_JOURNAL", "1") != "0"
+QUEUE_HIGH = int(os.environ.get("LORA_QUEUE_HIGH", "8000"))
+QUEUE_LOW = int(os.environ.get("LORA_QUEUE_LOW", "4000"))
+RETRY_AFTER_MAX = 60
+JANELA_VAZAO_S = 10.0
+
+_fila_lock = threading.Lock()
+_diario: Optional[diario.Diario] = None
+_pendentes = 0       # leituras aceitas e ainda não gravadas
+_saturado = False
+_gravacoes: "deque[Tuple[float, int]]" = deque()  # (instante, leituras) dos últimos commits
+
+
+def _diretorio_diario() -> str:
+    # Cada processo HTTP tem o seu diário (subdiretório w<índice>)
+    base = storage.DB_PATH + ".diario"
+    return base if _processo is None else os.path.join(base, f"w{_processo}")
+
+
+def _abrir_diario() -> Optional[diario.Diario]:
+    """Diário ao lado do banco (aberto na primeira leitura aceita)."""
+    global _diario
+    if _diario is None and JOURNAL_ENABLED:
+        _diario = diario.Diario(_diretorio_diario())
+    return _diario
+
+
+def _item_tamanho(item: Any) -> int:
+    return len(item) if isinstance(item, list) else 1
+
+
+def enfileirar(item: Any):
+    """Grava no diário e coloca na fila; levanta queue.Full se o servidor está saturado."""
+    global _pendentes, _saturado
+    with _fila_lock:
+        if _saturado or _pendentes >= QUEUE_HIGH or INGEST_QUEUE.full():
+            if not _saturado:
+                log.warning("Fila saturada (%d leituras pendentes): respondendo 503 até %d.",
+                            _pendentes, QUEUE_LOW)
+            _saturado = True
+            raise queue.Full
+        d = _abrir_diario()
+        seq = d.anexar(item) if d else 0
+        INGEST_QUEUE.put_nowait((time.monotonic(), item, seq))
+        _pendentes += _item_tamanho(item)
+    if d:
+        d.sincronizar(seq)
+
+
+def _liberar(leituras: int):
+    """O worker terminou de processar `leituras` retiradas da fila."""
+    global _pendentes, _saturado
+    agora = time.monotonic()
+    with _fila_lock:
+        _pendentes -= leituras
+        if _saturado and _pendentes <= QUEUE_LOW:
+            _saturado = False
+            log.info("Fila abaixo da marca baixa (%d pendentes): ingestão liberada.", _pendentes)
+        _gravacoes.append((agora, leituras))
+        while _gravacoes and _gravacoes[0][0] < agora - JANELA_VAZAO_S:
+            _gravacoes.popleft()
+
+
+def vazao() -> float:
+    """Leituras processadas pelo worker por segundo nos últimos JANELA_VAZAO_S segundos."""
+    with _fila_lock:
+        if not _gravacoes:
+            return 0.0
+        total = sum(n for _, n in _gravacoes)
+        inicio = _gravacoes[0][0]
+    return total / max(time.monotonic() - inicio, 1.0)
+
+
+def retry_after() -> int:
+    """Segundos até a fila voltar à marca baixa, na vazão atual."""
+    taxa = vazao()
+    if taxa <= 0:
+        return RETRY_AFTER_MAX
+    return max(1, min(RETRY_AFTER_MAX, math.ceil((_pendentes - QUEUE_LOW) / taxa)))
+
+
+def resposta_saturado() -> "Resposta":
+    return Resposta(503, b"Service Unavailable: queue full",
+                    headers={"Retry-After": str(retry_after())})
 
-# Fila de ingestão (producer: handler; consumer: worker de persistência)
-INGEST_QUEUE: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=10_000)
+
+def recuperar_diario():
+    """Reenfileira o que foi aceito mas não chegou ao banco antes da última parada."""
+    global _pendentes
+    d = _abrir_diario()
+    if d is None:
+        return
+    registros = d.recuperar()
+    for seq, item in registros:
+        INGEST_QUEUE.put((time.monotonic(), item, seq))  # bloqueia se a fila encher
+        with _fila_lock:
+            _pendentes += _item_tamanho(item)
+    if registros:
+        log.warning("Diário: %d entradas não gravadas reenfileiradas.", len(registros))
 
 # ---------- Logging básico ----------
 logging.basicConfig(
@@ -37,134 +217,1131 @@ logging.basicConfig(
 )
 log = logging.getLogger("lora-server")
 
+# ---------- Métricas (GET /metrics) ----------
+M_REQUISICOES = metricas.Histograma(
+    "lora_http_request_duration_seconds", "Latência das requisições por rota.",
+    ("method", "route"),
+)
+M_RESPOSTAS = metricas.Contador(
+    "lora_http_responses_total", "Respostas por rota e código HTTP.", ("route", "code"),
+)
+M_LEITURAS = metricas.Contador(
+    "lora_ingest_readings_total",
+    "Leituras recebidas em /ingest e /ingest/batch por resultado "
+    "(accepted, rejected, duplicate, unavailable = 503 por fila cheia).",
+    ("result",),
+)
+M_PARSE = metricas.Histograma(
+    "lora_ingest_parse_seconds", "Tempo de decodificação e validação do corpo.", ("route",),
+)
+M_ESPERA_FILA = metricas.Histograma(
+    "lora_ingest_queue_wait_seconds", "Tempo entre entrar na fila e ser retirado pelo worker.",
+)
+M_COMMIT = metricas.Histograma(
+    "lora_persist_commit_seconds", "Duração da gravação de um lote (transação única).",
+)
+M_LINHAS_COMMIT = metricas.Histograma(
+    "lora_persist_rows_per_commit", "Leituras por lote gravado.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+M_PERSISTIDAS = metricas.Contador(
+    "lora_persist_readings_total", "Leituras processadas pelo worker (inserted, duplicate, "
+    "discarded).", ("result",),
+)
+M_FALHAS_LOTE = metricas.Contador(
+    "lora_persist_failures_total", "Tentativas de gravar um lote que falharam no banco.",
+)
+M_ALERTAS = metricas.Contador(
+    "lora_alerts_total", "Alertas disparados, por regra.", ("rule",),
+)
+M_RENDER = metricas.Histograma(
+    "lora_dashboard_render_seconds", "Tempo para montar o HTML do dashboard.", ("range",),
+)
+metricas.Medidor("lora_ingest_queue_depth", "Entradas na fila de ingestão.",
+                 lambda: INGEST_QUEUE.qsize())
+metricas.Medidor("lora_ingest_queue_capacity", "Capacidade da fila de ingestão.",
+                 lambda: INGEST_QUEUE.maxsize)
+metricas.Medidor("lora_ingest_pending_readings", "Leituras aceitas ainda não gravadas.",
+                 lambda: _pendentes)
+metricas.Medidor("lora_ingest_saturated", "1 enquanto a ingestão responde 503 (histerese).",
+                 lambda: int(_saturado))
+metricas.Medidor("lora_ingest_drain_rate", "Leituras gravadas por segundo (janela de 10s).",
+                 lambda: vazao())
+metricas.Medidor("lora_sse_subscribers", "Clientes conectados em /stream.",
+                 lambda: eventos.assinantes())
+
 # ---------- Worker de persistência ----------
-def worker_persistencia():
-    log.info("Worker de persistência iniciado.")
-    while True:
-        item = INGEST_QUEUE.get()
-        if item is None:  # sinal de parada (não usado em execução normal)
+# Group commit: o worker junta até BATCH_SIZE leituras (ou espera no máximo
+# BATCH_LINGER_MS após a primeira) e grava tudo em uma única transação.
+BATCH_SIZE = int(os.environ.get("LORA_BATCH_SIZE", "500"))
+BATCH_LINGER_MS = float(os.environ.get("LORA_BATCH_LINGER_MS", "50"))
+# Banco fora do ar (travado, disco cheio): o mesmo lote é tentado de novo com
+# espera exponencial entre PERSIST_RETRY_MIN_S e PERSIST_RETRY_MAX_S
+PERSIST_RETRY_MIN_S = 0.5
+PERSIST_RETRY_MAX_S = float(os.environ.get("LORA_PERSIST_RETRY_MAX_S", "30"))
+
+
+def _tamanho(entrada: Any) -> int:
+    return _item_tamanho(entrada[1])
+
+
+def _coletar_lote() -> List[Any]:
+    """Bloqueia até chegar a primeira leitura e junta as seguintes no mesmo lote."""
+    lote = [INGEST_QUEUE.get()]
+    if lote[0] is None:
+        return lote
+    total = _tamanho(lote[0])
+    prazo = time.monotonic() + BATCH_LINGER_MS / 1000.0
+    while total < BATCH_SIZE:
+        restante = prazo - time.monotonic()
+        try:
+            if restante <= 0:
+                item = INGEST_QUEUE.get_nowait()
+            else:
+                item = INGEST_QUEUE.get(timeout=restante)
+        except queue.Empty:
+            break
+        lote.append(item)
+        if item is None:
             break
+        total += _tamanho(item)
+    return lote
+
+
+def _packet_number(valor: Any) -> Optional[int]:
+    return None if valor is None else int(valor)
+
+
+def _item_para_linha(item: Any) -> Dict[str, Any]:
+    """Converte o payload recebido em /ingest para as colunas do banco."""
+    if isinstance(item, (tuple, list)):  # formato binário: já vem na ordem das colunas
+        ts, node_id, pacote, temp, rh = item
+        return {"ts": ts, "packet_number": pacote, "node_id": node_id, "temp": temp, "rh": rh}
+    linha = {
+        "ts": int(item["ts"]),
+        "packet_number": _packet_number(item.get("packet_number")),
+        "node_id": item.get("node_id"),
+        "temp": item.get("t"),
+        "rh": item.get("rh"),
+    }
+    resumo = item.get("summary")
+    if resumo is not None:
+        linha["summary"] = {"n": resumo["n"], "first_packet": resumo["first_packet"],
+                            **_colunas_resumo(resumo)}
+        if resumo.get("parts"):
+            linha["summary"]["parts"] = [
+                {"ts": int(p["ts"]), "n": p["n"], **_colunas_resumo(p)} for p in resumo["parts"]
+            ]
+    return linha
+
+
+def _colunas_resumo(resumo: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "temp_min": resumo.get("t_min"), "temp_max": resumo.get("t_max"),
+        "temp_sum": resumo.get("t_sum"), "rh_min": resumo.get("rh_min"),
+        "rh_max": resumo.get("rh_max"), "rh_sum": resumo.get("rh_sum"),
+    }
+
+
+def persistir_lote(
+    itens: List[Dict[str, Any]], duplicadas: Optional[Dict[Tuple[str, int], int]] = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Grava um lote de leituras. Retorna (linhas gravadas, nº de descartadas).
+
+    Itens malformados são descartados individualmente; duplicatas de
+    (node_id, packet_number) não entram nas linhas gravadas. Se a transação do
+    lote falhar por causa de uma leitura, as linhas são regravadas uma a uma para
+    que as válidas não se percam; uma falha do próprio banco (ex.: "database is
+    locked") é levantada, e o lote inteiro deve ser tentado de novo.
+    As linhas gravadas passam pelo motor de alertas. `duplicadas` são as
+    retransmissões barradas na ingestão ({(nó, hora): n}), somadas às
+    estatísticas de enlace. Em um processo HTTP (LORA_HTTP_PROCESSES > 1) o
+    lote vai para o processo escritor.
+    """
+    if _escritor is not None:
+        return _escritor.chamar("persistir", itens, duplicadas)
+
+    gravadas, descartadas = _gravar_lote(itens, duplicadas)
+    if gravadas:
+        _avaliar_alertas(gravadas)
+    return gravadas, descartadas
+
+
+def _falha_do_banco(e: Exception) -> bool:
+    """Erro do banco em si (travado, disco cheio, E/S), e não de uma leitura.
+
+    Nesses casos o lote inteiro falha e deve ser tentado de novo; IntegrityError,
+    erros de conversão e de validação descartam só a leitura culpada.
+    """
+    return isinstance(e, sqlite3.DatabaseError) and not isinstance(
+        e, (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.ProgrammingError)
+    )
+
+
+def _gravar_lote(
+    itens: List[Any], duplicadas: Optional[Dict[Tuple[str, int], int]] = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    linhas = []
+    descartadas = 0
+    for item in itens:
+        try:
+            linhas.append(_item_para_linha(item))
+        except Exception as e:
+            descartadas += 1
+            log.warning("Leitura inválida descartada (%s): %r", e, item)
+
+    try:
+        return storage.insert_many(linhas, duplicadas), descartadas
+    except Exception as e:
+        if _falha_do_banco(e):
+            raise
+        log.error("Falha ao persistir lote de %d leituras (%s); gravando individualmente.",
+                  len(linhas), e)
+
+    gravadas = []
+    for linha in linhas:
         try:
-            storage.insert_reading(
-                ts=item["ts"],
-                packet_number=item.get("packet_number"),
-                temp=item.get("t"),
-                rh=item.get("rh"),
+            if storage.insert_reading(**linha):
+                gravadas.append(linha)
+        except Exception as e:
+            if _falha_do_banco(e):
+                raise  # o que já foi gravado volta como duplicata na nova tentativa
+            descartadas += 1
+            log.warning("Leitura descartada (%s): %r", e, linha)
+    if duplicadas:
+        storage.insert_many([], duplicadas)
+    return gravadas, descartadas
+
+
+_alertas_lock = threading.Lock()  # avaliação e gravação na mesma ordem
+
+
+def _avaliar_alertas(gravadas: List[Dict[str, Any]]):
+    try:
+        with _alertas_lock:
+            transicoes = alertas.avaliar(gravadas)
+            storage.save_alerts(
+                transicoes, alertas.estados(r.get("node_id") or "node_padrao" for r in gravadas)
             )
+    except Exception as e:
+        log.exception("Falha no motor de alertas: %s", e)
+        return
+    if not transicoes:
+        return
+    for t in transicoes:
+        if t["state"] == "fired":
+            M_ALERTAS.inc(t["rule"])
+            log.warning("Alerta %s/%s no nó %s: valor %s (medida %s, limite %s)",
+                        t["rule"], t["metric"], t["node_id"], t["value"], t["score"],
+                        t["threshold"])
+    _publicar_alertas(transicoes)
+    _difundir(("alertas", transicoes))
+
+
+def _publicar_alertas(transicoes: List[Dict[str, Any]]):
+    if eventos.tem_assinantes():
+        eventos.publicar("alert", {"alerts": transicoes})
+
+
+def worker_persistencia():
+    log.info("Worker de persistência iniciado (lote=%d, espera=%.0fms).",
+             BATCH_SIZE, BATCH_LINGER_MS)
+    parar = False
+    while not parar:
+        lote = _coletar_lote()
+        if lote[-1] is None:  # sinal de parada (não usado em execução normal)
+            parar = True
+        itens: List[Dict[str, Any]] = []
+        ultimo_seq = 0
+        agora = time.monotonic()
+        for entrada in lote:
+            if entrada is None:
+                continue
+            enfileirado_em, item, seq = entrada
+            ultimo_seq = max(ultimo_seq, seq)
+            M_ESPERA_FILA.observar(agora - enfileirado_em)
+            if isinstance(item, list):
+                itens.extend(item)
+            else:
+                itens.append(item)
+        try:
+            if itens:
+                t0 = time.perf_counter()
+                resultado = _persistir_com_retentativa(itens, _drenar_duplicadas(), parar)
+                if resultado is None:
+                    continue  # parada com o banco fora do ar: o lote fica no diário
+                gravadas, descartadas = resultado
+                M_COMMIT.observar(time.perf_counter() - t0)
+                M_LINHAS_COMMIT.observar(len(itens))
+                M_PERSISTIDAS.inc("inserted", n=len(gravadas))
+                M_PERSISTIDAS.inc("duplicate", n=len(itens) - len(gravadas) - descartadas)
+                M_PERSISTIDAS.inc("discarded", n=descartadas)
+                _aplicar_gravadas(gravadas)
+                _difundir(("linhas", gravadas))
+                if descartadas:
+                    log.error("Lote com %d leituras: %d gravadas, %d descartadas.",
+                              len(itens), len(gravadas), descartadas)
+            # Só depois do commit: se falhar, o lote continua no diário
+            if _diario is not None and ultimo_seq:
+                _diario.confirmar(ultimo_seq)
         except Exception as e:
-            log.exception("Falha ao persistir leitura: %s", e)
+            log.exception("Falha ao persistir lote: %s", e)
         finally:
-            INGEST_QUEUE.task_done()
+            _liberar(len(itens))
+            for _ in lote:
+                INGEST_QUEUE.task_done()
+
+
+def _persistir_com_retentativa(
+    itens: List[Any], duplicadas: Dict[Tuple[str, int], int], parar: bool
+) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+    """persistir_lote() até dar certo, com espera exponencial entre as tentativas.
+
+    Uma falha aqui é do banco ou do processo escritor (as leituras inválidas já
+    são descartadas uma a uma), então o lote não pode ser confirmado no diário
+    nem passado adiante: o worker para nele, a fila enche e a ingestão responde
+    503 até o banco voltar. Enquanto isso as leituras saem da janela de
+    deduplicação, para a retransmissão do gateway não ser tomada por duplicata
+    de algo que não está no banco. Devolve None se o worker está parando.
+    """
+    espera = PERSIST_RETRY_MIN_S
+    desmarcadas = False
+    while True:
+        try:
+            gravadas, descartadas = persistir_lote(itens, duplicadas)
+        except Exception as e:
+            M_FALHAS_LOTE.inc()
+            log.error("Falha ao persistir lote de %d leituras (%s); nova tentativa em %.1fs.",
+                      len(itens), e, espera)
+            if not desmarcadas:
+                for item in itens:
+                    _desmarcar(item)
+                desmarcadas = True
+            if parar:
+                return None
+            time.sleep(espera)
+            espera = min(espera * 2, PERSIST_RETRY_MAX_S)
+            continue
+        if desmarcadas:
+            for linha in gravadas:
+                if linha.get("packet_number") is not None:
+                    DEDUPE.marcar(linha.get("node_id") or "node_padrao", linha["packet_number"],
+                                  linha["ts"])
+            log.info("Lote de %d leituras gravado depois de falha do banco.", len(itens))
+        return gravadas, descartadas
+
+
+def _desmarcar_chaves(chaves: List[Tuple[str, int, Any]]):
+    """Desfaz DEDUPE.registrar() das leituras de um lote que não entrou na fila."""
+    for node_id, pacote, _ in chaves:
+        DEDUPE.desmarcar(node_id, pacote)
+
+
+def _desmarcar(item: Any):
+    try:
+        linha = _item_para_linha(item)
+    except Exception:
+        return  # inválida: nunca foi marcada
+    if linha["packet_number"] is not None:
+        DEDUPE.desmarcar(linha["node_id"] or "node_padrao", linha["packet_number"])
+
+
+def _aplicar_gravadas(gravadas: List[Dict[str, Any]]):
+    """Leva as linhas recém-gravadas ao cache (e o resumo do enlace) e aos assinantes de /stream."""
+    novas = cache.registrar(gravadas)
+    if novas:
+        cache.atualizar_enlace()
+    if novas and eventos.tem_assinantes():
+        eventos.publicar("readings", {"readings": novas, "stats": _stats()})
+
+
+# ---------- Validação ----------
+def validar_leitura(data: Any) -> Optional[str]:
+    """Retorna None se a leitura é aceitável, ou a mensagem de erro."""
+    if not isinstance(data, dict):
+        return "reading must be a JSON object"
+    ts = data.get("ts")
+    if not isinstance(ts, (int, float)) or isinstance(ts, bool) or not 0 <= ts <= storage.TS_MAX:
+        return f"ts must be an epoch timestamp between 0 and {storage.TS_MAX}"
+    if "packet_number" not in data:
+        return "missing packet_number"
+    try:
+        _packet_number(data["packet_number"])
+    except (TypeError, ValueError):
+        return "packet_number must be an integer"
+    node_id = data.get("node_id")
+    if node_id is not None and (not isinstance(node_id, str) or not node_id
+                                or len(node_id) > MAX_NODE_ID):
+        return f"node_id must be a non-empty string of at most {MAX_NODE_ID} characters"
+    for campo in ("t", "rh"):
+        if not _numero_ou_nulo(data.get(campo)):
+            return f"{campo} must be a finite number or null"
+    if "summary" in data:
+        return _validar_resumo(data["summary"], data["packet_number"])
+    return None
+
+
+_CAMPOS_RESUMO = ("t_min", "t_max", "t_sum", "rh_min", "rh_max", "rh_sum")
+
+
+def _validar_resumo(resumo: Any, pacote: Any) -> Optional[str]:
+    """Resumo de várias leituras feito pelo gateway (ver src/gateway/agregacao.py)."""
+    if not isinstance(resumo, dict):
+        return "summary must be a JSON object"
+    n, primeiro = resumo.get("n"), resumo.get("first_packet")
+    if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+        return "summary.n must be a positive integer"
+    if not isinstance(primeiro, int) or pacote is None or not primeiro <= int(pacote):
+        return "summary.first_packet must be an integer not above packet_number"
+    erro = _validar_campos_resumo(resumo, "summary")
+    if erro or "parts" not in resumo:
+        return erro
+    # Um resumo por minuto coberto, cada um com o próprio ts (rollup de 1 min)
+    partes = resumo["parts"]
+    if not isinstance(partes, list) or not all(isinstance(p, dict) for p in partes):
+        return "summary.parts must be a list of JSON objects"
+    for parte in partes:
+        ts, n_parte = parte.get("ts"), parte.get("n")
+        if (not isinstance(ts, (int, float)) or isinstance(ts, bool)
+                or not 0 <= ts <= storage.TS_MAX):
+            return f"summary.parts[].ts must be an epoch timestamp between 0 and {storage.TS_MAX}"
+        if not isinstance(n_parte, int) or isinstance(n_parte, bool) or n_parte < 1:
+            return "summary.parts[].n must be a positive integer"
+        erro = _validar_campos_resumo(parte, "summary.parts[]")
+        if erro:
+            return erro
+    if sum(p["n"] for p in partes) != n:
+        return "summary.parts must add up to summary.n"
+    return None
+
+
+def _validar_campos_resumo(resumo: Dict[str, Any], nome: str) -> Optional[str]:
+    for campo in _CAMPOS_RESUMO:
+        if not _numero_ou_nulo(resumo.get(campo)):
+            return f"{nome}.{campo} must be a finite number or null"
+    return None
+
+
+def _numero_ou_nulo(valor: Any) -> bool:
+    # json.loads aceita NaN, Infinity e 1e999 (float("inf")); o arquivo
+    # comprimido só guarda valores finitos
+    if valor is None:
+        return True
+    if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+        return False
+    try:
+        return math.isfinite(valor)
+    except OverflowError:  # inteiro grande demais para um float
+        return False
+
+
+def parse_lote(raw: bytes, content_type: str = "") -> List[Tuple[Any, Optional[str]]]:
+    """Decodifica um corpo de /ingest/batch em uma única passada.
+
+    Aceita um array JSON ou NDJSON (uma leitura por linha). Retorna uma lista de
+    (leitura, erro) na ordem recebida; `erro` é None para itens válidos.
+    Levanta ValueError se o corpo inteiro for ilegível.
+    """
+    text = raw.decode("utf-8")
+    ndjson = "ndjson" in content_type or not text.lstrip().startswith("[")
+    itens: List[Tuple[Any, Optional[str]]] = []
+    if not ndjson:
+        data = json.loads(text)
+        if not isinstance(data, list):
+            raise ValueError("expected a JSON array")
+        for d in data:
+            itens.append((d, validar_leitura(d)))
+        return itens
+
+    for linha in text.splitlines():
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            d = json.loads(linha)
+        except ValueError as e:
+            itens.append((None, f"invalid JSON: {e}"))
+            continue
+        itens.append((d, validar_leitura(d)))
+    return itens
 
 
 persist_thread = threading.Thread(target=worker_persistencia, name="persist", daemon=True)
 persist_thread.start()
 
 
-# ---------- HTTP Handler ----------
-class Handler(BaseHTTPRequestHandler):
-    server_version = "LoRaProto/1.0"
+# ---------- Manutenção ----------
+# Retenção e /delete-all só descartam partições (metadados); as tabelas são
+# apagadas aqui, fora do caminho das requisições, uma por transação. Partições
+# frias também são comprimidas aqui para o arquivo (storage.compact_archive).
+MAINTENANCE_INTERVAL_S = float(os.environ.get("LORA_MAINTENANCE_INTERVAL_S", "3600"))
+MANUTENCAO = threading.Event()
 
-    def _send(self, code: int, content: bytes, content_type: str = "text/plain; charset=utf-8"):
-        self.send_response(code)
-        self.send_header("Content-Type", content_type)
-        self.send_header("Content-Length", str(len(content)))
-        self.end_headers()
-        self.wfile.write(content)
 
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        if parsed.path in ("/", "/dashboard"):
-
-            # Dados para o dashboard
-            last_by_packet = storage.get_latest_by_packet()
-            last_packet = last_by_packet[str(max([int(i) for i in last_by_packet.keys()])) if last_by_packet else None] # pega o último pacote recebido
-            recent = storage.get_last_readings(limit=50)
-
-            stats = {
-                "queued": INGEST_QUEUE.qsize(),
-                "packets": len(last_by_packet),
-                "total_rows": storage.count_rows(),
-                "updated_at": time.time(),
-            }
-            html = dashboard.render_html(last_packet=last_packet, recent=recent, stats=stats)
-            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
-            return
+def worker_manutencao():
+    while True:
+        MANUTENCAO.wait(MAINTENANCE_INTERVAL_S)
+        MANUTENCAO.clear()
+        try:
+            removidas = storage.apply_retention()
+            if removidas:
+                _recarregar()
+                _difundir(("recarregar",))
+                log.info("Retenção: %d leituras antigas descartadas.", removidas)
+            arquivadas = storage.compact_archive()
+            if arquivadas:
+                log.info("Arquivo: %d leituras antigas comprimidas.", arquivadas)
+            apagadas = storage.purge_dropped()
+            if apagadas:
+                log.info("Manutenção: %d tabelas descartadas apagadas do disco.", apagadas)
+        except Exception as e:
+            log.exception("Falha na manutenção: %s", e)
 
-        if parsed.path == "/health":
-            payload = {"ok": True, "queue": INGEST_QUEUE.qsize(), "time": int(time.time())}
-            self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
-            return
 
-        if parsed.path == "/api/last":
-            # Endpoint simples para debug/validação automática
-            data = storage.get_latest_by_packet()
-            self._send(200, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
-            return
+def _recarregar():
+    cache.carregar()
+    eventos.publicar("reset", _stats())
 
-        self._send(404, b"Not Found")
 
-    def do_POST(self):
-        parsed = urlparse(self.path)
+def _limpar_estado():
+    """Estado em memória depois de /delete-all (o banco já foi esvaziado)."""
+    cache.limpar()
+    DEDUPE.limpar()
+    _drenar_duplicadas()
+    eventos.publicar("reset", _stats())
 
-        # 1) Rota de ingestão normal
-        if parsed.path == "/ingest":
-            # Lê payload
-            try:
-                length = int(self.headers.get("Content-Length", "0"))
-                raw = self.rfile.read(length)
-                data = json.loads(raw.decode("utf-8"))
-            except Exception as e:
-                log.warning("Payload inválido: %s", e)
-                self._send(400, b"Bad Request: invalid JSON")
-                return
 
-            # Validação mínima
-            required = ("packet_number",)
-            if not all(k in data for k in required):
-                self._send(422, b"Unprocessable Entity: missing packet_number")
-                return
+# ---------- Rotas ----------
+# As rotas não dependem do transporte: recebem uma Requisicao e devolvem uma
+# Resposta, e tanto o servidor com threads quanto o asyncio (servidor_async)
+# usam a mesma tabela ROTAS.
+class Requisicao(NamedTuple):
+    method: str
+    path: str
+    query: Dict[str, List[str]]
+    headers: Any  # email.message.Message (busca sem diferenciar maiúsculas)
+    body: bytes = b""
 
-            # Enfileira para persistência
-            try:
-                INGEST_QUEUE.put_nowait(data)
-            except queue.Full:
-                log.error("Fila cheia! descartando leitura.")
-                self._send(503, b"Service Unavailable: queue full")
-                return
 
-            # 202 para indicar que foi aceito e será processado
-            self._send(202, b"Accepted")
+class Resposta(NamedTuple):
+    code: int
+    content: Any = b""  # bytes, ou um iterável de bytes para respostas em streaming
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Optional[Dict[str, str]] = None
+
+
+def _json(code: int, data: Any) -> Resposta:
+    return Resposta(code, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+
+
+def _param(req: Requisicao, nome: str, padrao: Optional[str] = None) -> Optional[str]:
+    valores = req.query.get(nome)
+    return valores[0] if valores else padrao
+
+
+# Janelas aceitas em /dashboard?range= (segundos)
+JANELAS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600, "30d": 30 * 24 * 3600}
+# Pontos buscados no banco para uma janela; o dashboard ainda reduz com LTTB
+DASHBOARD_SERIES_POINTS = 2000
+
+
+def _stats() -> Dict[str, Any]:
+    return {
+        "queued": INGEST_QUEUE.qsize(),
+        "nodes": cache.node_count(),
+        "total_rows": cache.total_rows(),
+        "updated_at": cache.alterado_em(),
+    }
+
+
+# ---------- Cache HTTP (ETag/If-None-Match e gzip) ----------
+BOOT_ID = f"{int(time.time()):x}"  # ETags de outra execução nunca coincidem
+GZIP_MIN_BYTES = 1024
+
+
+class Corpo(NamedTuple):
+    """Corpo pronto para envio: chave do ETag, bytes originais e versão gzip."""
+    etag: str
+    raw: bytes
+    gz: Optional[bytes]
+
+
+def preparar_corpo(etag: str, raw: bytes) -> Corpo:
+    gz = gzip.compress(raw, compresslevel=6, mtime=0) if len(raw) >= GZIP_MIN_BYTES else None
+    return Corpo(etag, raw, gz)
+
+
+def resposta_cacheavel(req: Requisicao, corpo: Corpo, content_type: str,
+                       cache_control: str = "no-cache") -> Resposta:
+    """200 (comprimido se o cliente aceitar gzip) ou 304 se o ETag ainda vale."""
+    usar_gz = corpo.gz is not None and "gzip" in (req.headers.get("Accept-Encoding") or "")
+    etag = f'"{corpo.etag}{"-gz" if usar_gz else ""}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if_none_match = req.headers.get("If-None-Match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Resposta(304, b"", content_type, headers)
+
+    if usar_gz:
+        headers["Content-Encoding"] = "gzip"
+        return Resposta(200, corpo.gz, content_type, headers)
+    return Resposta(200, corpo.raw, content_type, headers)
+
+
+# Página renderizada por janela; reaproveitada enquanto a versão dos dados
+# (cache.versao) não mudar. Janelas longas também expiram a cada minuto, pois
+# o intervalo desliza com o relógio.
+_PAGINAS: Dict[Optional[str], Tuple[Tuple[int, int], Corpo]] = {}
+
+
+def _render_dashboard(estado: Dict[str, Any], janela: Optional[str]) -> bytes:
+    # Janela longa pedida: série do nó da última leitura, via rollups
+    series = None
+    if janela is not None and estado["last"]:
+        ts_to = int(time.time())
+        ts_from = ts_to - JANELAS[janela]
+        node = estado["last"]["node_id"]
+        resolution = storage.choose_resolution(node, ts_from, ts_to, DASHBOARD_SERIES_POINTS)
+        series = storage.get_series(node, ts_from, ts_to, resolution)
+
+    stats = {
+        "queued": INGEST_QUEUE.qsize(),
+        "nodes": len(estado["latest_by_node"]),
+        "total_rows": estado["total_rows"],
+        "updated_at": estado["alterado_em"],
+    }
+    t0 = time.perf_counter()
+    html = dashboard.render_html(
+        last_packet=estado["last"], recent=estado["recent"], stats=stats,
+        series=series, janela=janela, link=estado["link"],
+    )
+    M_RENDER.observar(time.perf_counter() - t0, janela or "live")
+    return html.encode("utf-8")
+
+
+def rota_dashboard(req: Requisicao) -> Resposta:
+    janela = _param(req, "range")
+    if janela not in JANELAS or cache.last_reading() is None:
+        janela = None
+    chave = (cache.versao(), int(time.time()) // 60 if janela else 0)
+
+    em_cache = _PAGINAS.get(janela)
+    if em_cache is None or em_cache[0] != chave:
+        # Dados para o dashboard, direto do estado em memória
+        estado = cache.snapshot()
+        chave = (estado["versao"], chave[1])
+        etag = f"{BOOT_ID}-{chave[0]}-{chave[1]}-{janela or 'live'}"
+        em_cache = (chave, preparar_corpo(etag, _render_dashboard(estado, janela)))
+        _PAGINAS[janela] = em_cache
+
+    return resposta_cacheavel(req, em_cache[1], "text/html; charset=utf-8")
+
+
+_ESTATICOS = {
+    path: (preparar_corpo(dashboard.ASSETS_VERSION, raw), content_type)
+    for path, (raw, content_type) in dashboard.STATIC_FILES.items()
+}
+
+
+def rota_static(req: Requisicao) -> Resposta:
+    # A URL leva ?v=<hash do conteúdo>, então o navegador pode guardar para sempre
+    corpo, content_type = _ESTATICOS[req.path]
+    return resposta_cacheavel(req, corpo, content_type, "public, max-age=31536000, immutable")
+
+
+def rota_health(req: Requisicao) -> Resposta:
+    return _json(200, {
+        "ok": True, "queue": INGEST_QUEUE.qsize(), "pending": _pendentes,
+        "saturated": _saturado, "drain_rate": round(vazao(), 1), "time": int(time.time()),
+    })
+
+
+def rota_metrics(req: Requisicao) -> Resposta:
+    return Resposta(200, metricas.exportar().encode("utf-8"),
+                    "text/plain; version=0.0.4; charset=utf-8")
+
+
+def rota_stream(req: Requisicao) -> Resposta:
+    # Eventos: "readings" (leituras novas + estatísticas) e "reset" (após /delete-all)
+    return Resposta(200, eventos.Fluxo(), "text/event-stream; charset=utf-8", {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def rota_api_last(req: Requisicao) -> Resposta:
+    # Endpoint simples para debug/validação automática: última leitura de cada nó
+    return _json(200, cache.latest_by_node())
+
+
+SERIES_MAX_POINTS = int(os.environ.get("LORA_SERIES_MAX_POINTS", "500"))
+SERIES_MAX_LIMIT = int(os.environ.get("LORA_SERIES_MAX_LIMIT", "10000"))
+
+
+def rota_api_series(req: Requisicao) -> Resposta:
+    """GET /api/series?node=&from=&to=&resolution=&points= (from/to em epoch s).
+
+    A resposta tem no máximo SERIES_MAX_LIMIT pontos: uma resolução pedida que
+    passaria disso cai para o rollup mais fino que cabe, e o que ainda sobrar
+    é cortado ("truncated": true). Leituras brutas em qualquer quantidade
+    saem por /api/readings (paginada) ou /api/export.
+    """
+    try:
+        agora = int(time.time())
+        ts_to = int(_param(req, "to", str(agora)))
+        ts_from = int(_param(req, "from", str(ts_to - 24 * 3600)))
+        max_points = max(1, int(_param(req, "points", str(SERIES_MAX_POINTS))))
+    except ValueError:
+        return Resposta(400, b"Bad Request: from, to and points must be integers")
+    node = _param(req, "node", "node_padrao")
+    resolution = _param(req, "resolution", "auto")
+    if resolution == "auto":
+        resolution = storage.choose_resolution(
+            node, ts_from, ts_to, min(max_points, SERIES_MAX_LIMIT)
+        )
+    elif resolution not in storage.SERIES_RESOLUTIONS:
+        opcoes = ", ".join(("auto",) + storage.SERIES_RESOLUTIONS)
+        return Resposta(400, f"Bad Request: resolution must be one of {opcoes}".encode())
+    else:
+        # A resolução pedida é a mais fina aceita: sobe para a que cabe no limite
+        cabe = storage.choose_resolution(node, ts_from, ts_to, SERIES_MAX_LIMIT)
+        resolution = max(resolution, cabe, key=storage.SERIES_RESOLUTIONS.index)
+
+    pontos = storage.get_series(node, ts_from, ts_to, resolution, limit=SERIES_MAX_LIMIT + 1)
+    return _json(200, {
+        "node": node, "from": ts_from, "to": ts_to, "resolution": resolution,
+        "points": pontos[:SERIES_MAX_LIMIT], "truncated": len(pontos) > SERIES_MAX_LIMIT,
+    })
+
+
+READINGS_MAX_LIMIT = 5000
+
+
+def _intervalo(req: Requisicao) -> Tuple[int, int, Optional[str]]:
+    """from/to (epoch s) e node da query string; sem from/to vale o histórico todo."""
+    ts_to = int(_param(req, "to", str(int(time.time()))))
+    ts_from = int(_param(req, "from", "0"))
+    return ts_from, ts_to, _param(req, "node")
+
+
+def rota_api_readings(req: Requisicao) -> Resposta:
+    """GET /api/readings?from=&to=&node=&limit=&cursor= (ts crescente).
+
+    `next_cursor` vem preenchido enquanto houver mais linhas; basta repeti-lo
+    em `cursor` para a página seguinte. Páginas não se sobrepõem mesmo com
+    inserções no meio da navegação.
+    """
+    try:
+        ts_from, ts_to, node = _intervalo(req)
+        limit = min(max(1, int(_param(req, "limit", "500"))), READINGS_MAX_LIMIT)
+        cursor = _param(req, "cursor")
+        depois = tuple(int(p) for p in cursor.split("_", 1)) if cursor else None
+        if depois is not None and len(depois) != 2:
+            raise ValueError
+    except ValueError:
+        return Resposta(400, b"Bad Request: from, to, limit and cursor must be integers")
+    leituras, proximo = storage.get_readings(ts_from, ts_to, node, depois, limit)
+    return _json(200, {
+        "readings": leituras,
+        "next_cursor": f"{proximo[0]}_{proximo[1]}" if proximo else None,
+    })
+
+
+_CAMPOS_EXPORTACAO = ("ts", "node_id", "packet_number", "temp", "rh")
+
+
+def _exportar_csv(lotes) -> Iterator[bytes]:
+    buf = io.StringIO()
+    escritor = csv.writer(buf, lineterminator="\n")
+    escritor.writerow(_CAMPOS_EXPORTACAO)
+    try:
+        for lote in lotes:
+            escritor.writerows([r[c] for c in _CAMPOS_EXPORTACAO] for r in lote)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue().encode("utf-8")
+    finally:
+        lotes.close()
+
+
+def _exportar_ndjson(lotes) -> Iterator[bytes]:
+    try:
+        for lote in lotes:
+            yield "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in lote).encode("utf-8")
+    finally:
+        lotes.close()
+
+
+def _rota_exportar(req: Requisicao, formato: str) -> Resposta:
+    try:
+        ts_from, ts_to, node = _intervalo(req)
+    except ValueError:
+        return Resposta(400, b"Bad Request: from and to must be integers")
+    lotes = storage.stream_readings(ts_from, ts_to, node)
+    if formato == "csv":
+        corpo, tipo = _exportar_csv(lotes), "text/csv; charset=utf-8"
+    else:
+        corpo, tipo = _exportar_ndjson(lotes), "application/x-ndjson"
+    return Resposta(200, corpo, tipo, headers={
+        "Content-Disposition": f'attachment; filename="leituras.{formato}"',
+    })
+
+
+def rota_export_csv(req: Requisicao) -> Resposta:
+    return _rota_exportar(req, "csv")
+
+
+def rota_export_ndjson(req: Requisicao) -> Resposta:
+    return _rota_exportar(req, "ndjson")
+
+
+ALERTS_MAX_LIMIT = 1000
+
+
+def rota_api_alerts(req: Requisicao) -> Resposta:
+    """GET /api/alerts?state=active|all&node=&limit= (mais novos primeiro)."""
+    try:
+        limit = min(max(1, int(_param(req, "limit", "100"))), ALERTS_MAX_LIMIT)
+    except ValueError:
+        return Resposta(400, b"Bad Request: limit must be an integer")
+    estado = _param(req, "state", "all")
+    if estado not in ("active", "all"):
+        return Resposta(400, b"Bad Request: state must be active or all")
+    lista = storage.get_alerts(estado == "active", _param(req, "node"), limit)
+    return _json(200, {"alerts": lista})
+
+
+def rota_api_link(req: Requisicao) -> Resposta:
+    """GET /api/link?from=&to=&node= (padrão: últimas 24 h).
+
+    Totais por nó somados das horas do intervalo; com `node`, também os
+    contadores hora a hora em `buckets`.
+    """
+    try:
+        ts_to = int(_param(req, "to", str(int(time.time()))))
+        ts_from = int(_param(req, "from", str(ts_to - 24 * 3600)))
+    except ValueError:
+        return Resposta(400, b"Bad Request: from and to must be integers")
+    node = _param(req, "node")
+    resultado: Dict[str, Any] = {
+        "from": ts_from, "to": ts_to, "nodes": storage.get_link_stats(ts_from, ts_to, node),
+    }
+    if node is not None:
+        resultado["buckets"] = storage.get_link_buckets(node, ts_from, ts_to)
+    return _json(200, resultado)
+
+
+def _binario(req: Requisicao) -> bool:
+    return req.headers.get("Content-Type", "").split(";")[0].strip() == binario.TIPO
+
+
+def rota_ingest_binario(req: Requisicao, rota: str) -> Resposta:
+    """Lote no formato binário: as leituras seguem como tuplas até o worker."""
+    t0 = time.perf_counter()
+    try:
+        leituras = binario.decodificar(req.body)
+    except ValueError as e:
+        log.warning("Lote binário inválido: %s", e)
+        M_LEITURAS.inc("rejected")
+        return Resposta(400, b"Bad Request: invalid binary batch")
+    M_PARSE.observar(time.perf_counter() - t0, rota)
+
+    if len(leituras) > MAX_BATCH_ITEMS:
+        return Resposta(413, f"Payload Too Large: max {MAX_BATCH_ITEMS} items".encode())
+
+    # Consulta e marca na ordem do lote: um reinício do contador no meio do
+    # lote só é reconhecido com a janela já atualizada pelas leituras anteriores
+    validos = []
+    chaves = []
+    repetidos = []
+    for leitura in leituras:
+        chave = (leitura[1], leitura[2], leitura[0])
+        if not DEDUPE.registrar(*chave):
+            repetidos.append(chave[0])
+            continue
+        chaves.append(chave)
+        validos.append(leitura)
+    duplicadas = len(repetidos)
+    M_LEITURAS.inc("duplicate", n=duplicadas)
+    _contar_duplicadas(repetidos)
+    if validos:
+        try:
+            enfileirar(validos)
+        except queue.Full:
+            _desmarcar_chaves(chaves)
+            M_LEITURAS.inc("unavailable", n=len(validos))
+            return resposta_saturado()
+        M_LEITURAS.inc("accepted", n=len(validos))
+
+    # Sem erros por item: o corpo inteiro é válido ou é recusado acima
+    resultado = {"accepted": len(validos), "rejected": 0, "duplicates": duplicadas}
+    return _json(202 if validos or not leituras else 200, resultado)
+
+
+def rota_ingest(req: Requisicao) -> Resposta:
+    if _binario(req):
+        return rota_ingest_binario(req, "/ingest")
+
+    # Lê payload
+    t0 = time.perf_counter()
+    try:
+        data = json.loads(req.body.decode("utf-8"))
+    except Exception as e:
+        log.warning("Payload inválido: %s", e)
+        M_LEITURAS.inc("rejected")
+        return Resposta(400, b"Bad Request: invalid JSON")
+
+    # Validação mínima
+    erro = validar_leitura(data)
+    M_PARSE.observar(time.perf_counter() - t0, "/ingest")
+    if erro:
+        M_LEITURAS.inc("rejected")
+        return Resposta(422, f"Unprocessable Entity: {erro}".encode())
+
+    # Retransmissão já aceita: confirma sem gravar de novo
+    node_id, pacote, ts = _chave(data)
+    if pacote is not None and DEDUPE.duplicado(node_id, pacote, ts):
+        M_LEITURAS.inc("duplicate")
+        _contar_duplicadas([node_id])
+        return Resposta(200, b"Duplicate")
+
+    # Enfileira para persistência
+    try:
+        enfileirar(data)
+    except queue.Full:
+        M_LEITURAS.inc("unavailable")
+        return resposta_saturado()
+    if pacote is not None:
+        DEDUPE.marcar(node_id, pacote, ts)
+
+    # 202 para indicar que foi aceito e será processado
+    M_LEITURAS.inc("accepted")
+    return Resposta(202, b"Accepted")
+
+
+def rota_ingest_batch(req: Requisicao) -> Resposta:
+    if _binario(req):
+        return rota_ingest_binario(req, "/ingest/batch")
+
+    t0 = time.perf_counter()
+    try:
+        itens = parse_lote(req.body, req.headers.get("Content-Type", ""))
+    except Exception as e:
+        log.warning("Lote inválido: %s", e)
+        return Resposta(400, b"Bad Request: invalid batch")
+    M_PARSE.observar(time.perf_counter() - t0, "/ingest/batch")
+
+    if len(itens) > MAX_BATCH_ITEMS:
+        return Resposta(413, f"Payload Too Large: max {MAX_BATCH_ITEMS} items".encode())
+
+    # Consulta e marca na ordem do lote (ver rota_ingest_binario)
+    validos = []
+    chaves = []
+    repetidos = []
+    status_itens = []
+    for i, (d, erro) in enumerate(itens):
+        if erro is not None:
+            status_itens.append({"index": i, "status": "rejected", "error": erro})
+            continue
+        chave = _chave(d)
+        if chave[1] is not None:
+            if not DEDUPE.registrar(*chave):
+                status_itens.append({"index": i, "status": "duplicate"})
+                repetidos.append(chave[0])
+                continue
+            chaves.append(chave)
+        validos.append(d)
+        status_itens.append({"index": i, "status": "accepted"})
+    rejeitados = sum(1 for s in status_itens if s["status"] == "rejected")
+    resultado = {
+        "accepted": len(validos),
+        "rejected": rejeitados,
+        "duplicates": len(itens) - len(validos) - rejeitados,
+        "items": status_itens,
+    }
+
+    # O lote válido entra na fila como uma única unidade
+    M_LEITURAS.inc("rejected", n=resultado["rejected"])
+    M_LEITURAS.inc("duplicate", n=resultado["duplicates"])
+    _contar_duplicadas(repetidos)
+    if validos:
+        try:
+            enfileirar(validos)
+        except queue.Full:
+            _desmarcar_chaves(chaves)
+            M_LEITURAS.inc("unavailable", n=len(validos))
+            return resposta_saturado()
+        M_LEITURAS.inc("accepted", n=len(validos))
+
+    if validos or not itens:
+        code = 202
+    elif resultado["duplicates"]:
+        code = 200  # só retransmissões: nada a fazer, mas não é erro
+    else:
+        code = 422
+    return _json(code, resultado)
+
+
+def rota_delete_all(req: Requisicao) -> Resposta:
+    try:
+        if _escritor is not None:
+            _escritor.chamar("delete_all")
+        else:
+            storage.delete_all()
+            alertas.limpar()
+            MANUTENCAO.set()  # apaga as partições descartadas em segundo plano
+        _limpar_estado()
+        log.warning("Todas as leituras foram apagadas via /delete-all")
+    except Exception as e:
+        log.exception("Erro ao apagar todas as leituras: %s", e)
+        return Resposta(500, b"Internal Server Error")
+
+    # Redireciona de volta para o dashboard
+    return Resposta(303, headers={"Location": "/dashboard"})
+
+
+ROTAS: Dict[Tuple[str, str], Callable[[Requisicao], Resposta]] = {
+    ("GET", "/"): rota_dashboard,
+    ("GET", "/dashboard"): rota_dashboard,
+    ("GET", "/health"): rota_health,
+    ("GET", "/metrics"): rota_metrics,
+    ("GET", "/api/last"): rota_api_last,
+    ("GET", "/api/series"): rota_api_series,
+    ("GET", "/api/alerts"): rota_api_alerts,
+    ("GET", "/api/link"): rota_api_link,
+    ("GET", "/api/readings"): rota_api_readings,
+    ("GET", "/export.csv"): rota_export_csv,
+    ("GET", "/export.ndjson"): rota_export_ndjson,
+    ("GET", "/stream"): rota_stream,
+    **{("GET", path): rota_static for path in dashboard.STATIC_FILES},
+    ("POST", "/ingest"): rota_ingest,
+    ("POST", "/ingest/batch"): rota_ingest_batch,
+    ("POST", "/delete-all"): rota_delete_all,
+}
+
+
+def despachar(req: Requisicao) -> Resposta:
+    rota = ROTAS.get((req.method, req.path))
+    if rota is None:
+        M_RESPOSTAS.inc("other", "404")
+        return Resposta(404, b"Not Found")
+    t0 = time.perf_counter()
+    try:
+        resp = rota(req)
+    except Exception as e:
+        log.exception("Erro em %s %s: %s", req.method, req.path, e)
+        resp = Resposta(500, b"Internal Server Error")
+    # Em respostas com streaming (/stream) só a montagem é medida, não o envio
+    M_REQUISICOES.observar(time.perf_counter() - t0, req.method, req.path)
+    M_RESPOSTAS.inc(req.path, str(resp.code))
+    return resp
+
+
+def atender(method: str, target: str, headers: Any, body: bytes = b"") -> Resposta:
+    """Ponto de entrada comum aos dois servidores HTTP."""
+    parsed = urlparse(target)
+    return despachar(Requisicao(method, parsed.path, parse_qs(parsed.query), headers, body))
+
+
+# ---------- HTTP Handler (modo com threads) ----------
+class Handler(BaseHTTPRequestHandler):
+    server_version = "LoRaProto/1.0"
+    # HTTP/1.1 com keep-alive: toda resposta leva Content-Length ou vai em
+    # chunked, para o cliente saber onde ela termina sem fechar a conexão
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
+    def _send(self, resp: Resposta):
+        streaming = not isinstance(resp.content, bytes)
+        chunked = streaming and self.request_version == "HTTP/1.1"
+        self.send_response(resp.code)
+        self.send_header("Content-Type", resp.content_type)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        elif streaming:
+            # HTTP/1.0 não tem chunked: o corpo termina ao fechar a conexão
+            self.close_connection = True
+        elif resp.code != 304:  # 304 não tem corpo
+            self.send_header("Content-Length", str(len(resp.content)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        elif self.request_version != "HTTP/1.1":
+            self.send_header("Connection", "keep-alive")  # cliente 1.0 que pediu keep-alive
+        for nome, valor in (resp.headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        if not streaming:
+            self.wfile.write(resp.content)
             return
 
-        # 2) Rota para apagar todos os dados
-        if parsed.path == "/delete-all":
-            try:
-                storage.delete_all()
-                log.warning("Todas as leituras foram apagadas via /delete-all")
-            except Exception as e:
-                log.exception("Erro ao apagar todas as leituras: %s", e)
-                self._send(500, b"Internal Server Error")
-                return
+        partes = iter(resp.content)
+        try:
+            for parte in partes:
+                if not parte:
+                    continue  # chunk vazio encerraria o corpo
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(parte), parte) if chunked else parte)
+                self.wfile.flush()
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # cliente desconectou
+        finally:
+            fechar = getattr(partes, "close", None)
+            if fechar:
+                fechar()
 
-            # Redireciona de volta para o dashboard
-            self.send_response(303)
-            self.send_header("Location", "/dashboard")
-            self.end_headers()
+    def _dispatch(self, method: str):
+        # Um corpo que não foi lido por inteiro deixaria lixo na conexão: fecha
+        if self.headers.get("Transfer-Encoding"):
+            self.close_connection = True
+            self._send(Resposta(411, b"Length Required"))
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            body = self.rfile.read(length) if length > 0 else b""
+        except Exception as e:
+            log.warning("Corpo inválido: %s", e)
+            self.close_connection = True
+            self._send(Resposta(400, b"Bad Request"))
             return
+        self._send(atender(method, self.path, self.headers, body))
 
-        # Rota não encontrada
-        self._send(404, b"Not Found")
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
 
     # Silencia log de cada GET no console (opcional)
     def log_message(self, fmt, *args):
         log.info("%s - %s", self.address_string(), fmt % args)
 
 
-def main():
-    storage.init_db()  # garante esquema pronto
-    storage.migrate_db()  # aplica migrações, se necessário
-    with ThreadingHTTPServer((HOST, PORT), Handler) as httpd:
+class ServidorPortaCompartilhada(ThreadingHTTPServer):
+    """ThreadingHTTPServer com SO_REUSEPORT: o kernel distribui as conexões."""
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def _preparar_dedupe():
+    for node_id, r in cache.latest_by_node().items():
+        if r["packet_number"] is not None:
+            DEDUPE.marcar(node_id, r["packet_number"], r["ts"])
+
+
+def _servir(reuse_port: bool = False):
+    if SERVER_MODE == "async":
+        import servidor_async
+        servidor_async.serve(HOST, PORT, atender, reuse_port=reuse_port)
+        return
+
+    classe = ServidorPortaCompartilhada if reuse_port else ThreadingHTTPServer
+    with classe((HOST, PORT), Handler) as httpd:
         log.info("Servidor escutando em http://%s:%d", HOST, PORT)
         try:
             httpd.serve_forever()
@@ -172,5 +1349,193 @@ def main():
             log.info("Encerrando servidor...")
 
 
+# ---------- Vários processos ----------
+# Com LORA_HTTP_PROCESSES=N o processo principal vira o escritor: aplica as
+# migrações, roda a manutenção e é o único a gravar no SQLite. Ele sobe N
+# processos HTTP (spawn) que abrem a mesma porta com SO_REUSEPORT, validam,
+# deduplicam e registram no seu próprio diário as leituras recebidas. Cada
+# processo HTTP tem dois pipes com o escritor:
+# - chamadas (ida e volta): ("persistir", itens) e ("delete_all",); o worker de
+#   persistência do processo HTTP usa persistir_lote() como antes, só que a
+#   gravação acontece no escritor
+# - difusão (escritor -> HTTP): ("linhas", gravadas) dos outros processos,
+#   ("limpar",) e ("recarregar",), para o cache, a deduplicação e o /stream
+#   de cada processo verem todas as leituras
+# Métricas, fila e contrapressão são por processo HTTP; a deduplicação entre
+# processos é aproximada (a difusão chega depois do commit) e o UNIQUE do
+# banco continua sendo a última barreira.
+class _Escritor:
+    """Lado do processo HTTP: uma chamada por vez ao processo escritor."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    def chamar(self, *mensagem: Any) -> Any:
+        with self._lock:
+            self._conn.send(mensagem)
+            ok, valor = self._conn.recv()
+        if not ok:
+            raise RuntimeError(f"processo escritor: {valor}")
+        return valor
+
+
+_processo: Optional[int] = None          # índice deste processo HTTP (None no escritor)
+_escritor: Optional[_Escritor] = None
+_difusoes: Dict[int, Tuple[Any, threading.Lock]] = {}  # no escritor: pipe de cada processo
+
+
+def _difundir(mensagem: Tuple[Any, ...], exceto: Optional[int] = None):
+    for indice, (conn, lock) in list(_difusoes.items()):
+        if indice == exceto:
+            continue
+        try:
+            with lock:
+                conn.send(mensagem)
+        except (OSError, ValueError):
+            pass  # processo caiu; o supervisor sobe outro
+
+
+def _receber_difusao(conn):
+    """Processo HTTP: aplica o que o escritor difunde; sai se o escritor morrer."""
+    while True:
+        try:
+            tipo, *args = conn.recv()
+        except (EOFError, OSError):
+            log.error("Processo escritor encerrou; saindo.")
+            os._exit(1)
+        try:
+            if tipo == "linhas":
+                _aplicar_gravadas(args[0])
+                for linha in args[0]:
+                    if linha.get("packet_number") is not None:
+                        DEDUPE.marcar(linha.get("node_id") or "node_padrao",
+                                      linha["packet_number"], linha["ts"])
+            elif tipo == "alertas":
+                _publicar_alertas(args[0])
+            elif tipo == "limpar":
+                _limpar_estado()
+            elif tipo == "recarregar":
+                _recarregar()
+        except Exception as e:
+            log.exception("Falha ao aplicar difusão %r: %s", tipo, e)
+
+
+def _atender_processo(indice: int, conn):
+    """Escritor: atende as chamadas de um processo HTTP até o pipe fechar."""
+    while True:
+        try:
+            tipo, *args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if tipo == "persistir":
+                resultado = persistir_lote(*args)
+                _difundir(("linhas", resultado[0]), exceto=indice)
+            elif tipo == "delete_all":
+                storage.delete_all()
+                alertas.limpar()
+                MANUTENCAO.set()
+                _difundir(("limpar",), exceto=indice)
+                resultado = None
+            else:
+                raise ValueError(f"chamada desconhecida: {tipo}")
+            conn.send((True, resultado))
+        except Exception as e:
+            log.exception("Falha na chamada %r do processo %d: %s", tipo, indice, e)
+            try:
+                conn.send((False, str(e)))
+            except OSError:
+                return
+
+
+def _recuperar_diarios_processos():
+    """Escritor: grava o que ficou nos diários dos processos HTTP da última execução."""
+    base = storage.DB_PATH + ".diario"
+    if not JOURNAL_ENABLED or not os.path.isdir(base):
+        return
+    for nome in sorted(os.listdir(base)):
+        caminho = os.path.join(base, nome)
+        if not (nome.startswith("w") and os.path.isdir(caminho)):
+            continue
+        d = diario.Diario(caminho)
+        registros = d.recuperar()
+        for seq, item in registros:
+            persistir_lote(item if isinstance(item, list) else [item])
+            d.confirmar(seq)
+        d.close()
+        if registros:
+            log.warning("Diário %s: %d entradas não gravadas recuperadas.", nome, len(registros))
+
+
+def _processo_http(indice: int, chamadas, difusao, db_path: str, host: str, port: int):
+    """Ponto de entrada de um processo HTTP (iniciado com spawn)."""
+    global _processo, _escritor, HOST, PORT
+    storage.DB_PATH = db_path
+    HOST, PORT = host, port
+    _processo = indice
+    _escritor = _Escritor(chamadas)
+    cache.carregar()
+    threading.Thread(target=_receber_difusao, args=(difusao,), name="difusao",
+                     daemon=True).start()
+    recuperar_diario()  # sobra de uma queda deste processo com o escritor no ar
+    _preparar_dedupe()
+    _servir(reuse_port=True)
+
+
+def _iniciar_processo(ctx, indice: int):
+    chamadas, chamadas_filho = ctx.Pipe()
+    difusao_filho, difusao = ctx.Pipe(duplex=False)
+    p = ctx.Process(
+        target=_processo_http, name=f"http-{indice}", daemon=True,
+        args=(indice, chamadas_filho, difusao_filho, storage.DB_PATH, HOST, PORT),
+    )
+    p.start()
+    chamadas_filho.close()
+    difusao_filho.close()
+    _difusoes[indice] = (difusao, threading.Lock())
+    threading.Thread(target=_atender_processo, args=(indice, chamadas),
+                     name=f"escritor:{indice}", daemon=True).start()
+    return p
+
+
+def servir_processos(n: int):
+    """Processo escritor: sobe n processos HTTP e os recria se algum cair."""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("LORA_HTTP_PROCESSES > 1 exige SO_REUSEPORT (Linux ou BSD)")
+    ctx = multiprocessing.get_context("spawn")
+    processos = {i: _iniciar_processo(ctx, i) for i in range(n)}
+    log.info("Escritor com %d processos HTTP em http://%s:%d", n, HOST, PORT)
+    try:
+        while True:
+            time.sleep(1)
+            for i, p in list(processos.items()):
+                if not p.is_alive():
+                    log.error("Processo HTTP %d saiu (código %s); reiniciando.", i, p.exitcode)
+                    processos[i] = _iniciar_processo(ctx, i)
+    except KeyboardInterrupt:
+        log.info("Encerrando servidor...")
+    finally:
+        for p in processos.values():
+            p.terminate()
+
+
+def main():
+    storage.init_db()  # garante esquema pronto
+    storage.migrate_db()  # aplica migrações, se necessário
+    alertas.carregar(storage.load_alert_state())  # checkpoint do motor de alertas
+    cache.carregar()  # estado recente em memória para o dashboard
+    recuperar_diario()  # leituras aceitas antes de uma queda voltam para a fila
+    if HTTP_PROCESSES > 1:
+        _recuperar_diarios_processos()
+    _preparar_dedupe()
+    threading.Thread(target=worker_manutencao, name="manutencao", daemon=True).start()
+    MANUTENCAO.set()  # retenção e limpeza pendente logo na inicialização
+    if HTTP_PROCESSES > 1:
+        servir_processos(HTTP_PROCESSES)
+        return
+    _servir()
+
+
 if __name__ == "__main__":
     main()
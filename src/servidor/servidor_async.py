@@ -0,0 +1,212 @@
+"""
+Servidor HTTP/1.1 com asyncio (modo LORA_SERVER_MODE=async).
+- Mantém conexões keep-alive: um gateway ou navegador reaproveita o socket
+- Uma única thread de event loop atende todas as conexões
+- As rotas (que acessam o SQLite) rodam em um pool de threads, fora do loop
+
+As rotas são as mesmas do servidor com threads: `serve` recebe a função
+`atender` de servidor.py e só cuida do protocolo HTTP.
+"""
+
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import parse_headers
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger("lora-server")
+
+SERVER_VERSION = "LoRaProto/1.0"
+KEEPALIVE_TIMEOUT = float(os.environ.get("LORA_KEEPALIVE_TIMEOUT", "15"))
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = int(os.environ.get("LORA_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+WORKERS = int(os.environ.get("LORA_ASYNC_WORKERS", "8"))
+
+
+def _reason(code: int) -> str:
+    try:
+        return HTTPStatus(code).phrase
+    except ValueError:
+        return ""
+
+
+def _cabecalho(code: int, content_type: str, keep_alive: bool, tamanho: Optional[int] = None,
+               chunked: bool = False, extras: Optional[Dict[str, str]] = None) -> bytes:
+    """Linha de status + cabeçalhos. Sem tamanho nem chunked, o corpo vai até o fechamento."""
+    linhas = [
+        f"HTTP/1.1 {code} {_reason(code)}",
+        f"Server: {SERVER_VERSION}",
+        f"Date: {formatdate(usegmt=True)}",
+        f"Content-Type: {content_type}",
+    ]
+    if chunked:
+        linhas.append("Transfer-Encoding: chunked")
+    elif tamanho is not None:
+        linhas.append(f"Content-Length: {tamanho}")
+    linhas.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    for nome, valor in (extras or {}).items():
+        linhas.append(f"{nome}: {valor}")
+    return ("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1")
+
+
+def _chunk(parte: bytes) -> bytes:
+    return b"%x\r\n%s\r\n" % (len(parte), parte)
+
+
+def _erro(code: int, keep_alive: bool = False) -> bytes:
+    texto = f"{code} {_reason(code)}".encode()
+    return _cabecalho(code, "text/plain; charset=utf-8", keep_alive, len(texto)) + texto
+
+
+class _Conexao:
+    def __init__(self, atender: Callable, executor: ThreadPoolExecutor):
+        self.atender = atender
+        self.executor = executor
+
+    async def __call__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        cliente = peer[0] if peer else "-"
+        try:
+            while await self._atender(reader, writer, cliente):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _atender(self, reader, writer, cliente: str) -> bool:
+        """Atende uma requisição; retorna True se a conexão deve continuar aberta."""
+        try:
+            cabecalho = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), timeout=KEEPALIVE_TIMEOUT
+            )
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+        except asyncio.LimitOverrunError:
+            writer.write(_erro(431))
+            await writer.drain()
+            return False
+
+        linha, _, resto = cabecalho.partition(b"\r\n")
+        try:
+            method, target, versao = linha.decode("latin-1").split(" ", 2)
+            headers = parse_headers(io.BytesIO(resto))
+        except Exception:
+            writer.write(_erro(400))
+            await writer.drain()
+            return False
+
+        conexao = (headers.get("Connection") or "").lower()
+        if versao == "HTTP/1.1":
+            keep_alive = conexao != "close"
+        else:
+            keep_alive = conexao == "keep-alive"
+
+        if headers.get("Transfer-Encoding"):
+            writer.write(_erro(411))
+            await writer.drain()
+            return False
+        try:
+            length = int(headers.get("Content-Length", "0"))
+        except ValueError:
+            writer.write(_erro(400))
+            await writer.drain()
+            return False
+        if length > MAX_BODY_BYTES:
+            writer.write(_erro(413))
+            await writer.drain()
+            return False
+        body = await reader.readexactly(length) if length > 0 else b""
+
+        if method not in ("GET", "POST"):
+            writer.write(_erro(501, keep_alive))
+            await writer.drain()
+            return keep_alive
+
+        # A rota pode bloquear no SQLite: roda no pool, fora do event loop
+        loop = asyncio.get_running_loop()
+        resp = await loop.run_in_executor(
+            self.executor, self.atender, method, target, headers, body
+        )
+
+        log.info('%s - "%s" %d', cliente, linha.decode("latin-1"), resp.code)
+        if isinstance(resp.content, bytes):
+            writer.write(_cabecalho(resp.code, resp.content_type, keep_alive,
+                                    len(resp.content), extras=resp.headers) + resp.content)
+            await writer.drain()
+            return keep_alive
+
+        # Streaming: chunked em HTTP/1.1; em HTTP/1.0 o corpo termina ao fechar
+        chunked = versao == "HTTP/1.1"
+        keep_alive = keep_alive and chunked
+        writer.write(_cabecalho(resp.code, resp.content_type, keep_alive,
+                                chunked=chunked, extras=resp.headers))
+        await self._enviar_fluxo(resp.content, writer, chunked)
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        return keep_alive
+
+    async def _enviar_fluxo(self, conteudo: Any, writer: asyncio.StreamWriter, chunked: bool):
+        """Envia um corpo iterável; iteráveis síncronos rodam no pool (podem bloquear)."""
+        if hasattr(conteudo, "__aiter__"):
+            partes = conteudo.__aiter__()
+            try:
+                async for parte in partes:
+                    if parte:
+                        writer.write(_chunk(parte) if chunked else parte)
+                        await writer.drain()
+            finally:
+                fechar = getattr(partes, "aclose", None)
+                if fechar:
+                    await fechar()
+            return
+
+        loop = asyncio.get_running_loop()
+        partes = iter(conteudo)
+        try:
+            while True:
+                parte = await loop.run_in_executor(self.executor, next, partes, None)
+                if parte is None:
+                    break
+                if parte:
+                    writer.write(_chunk(parte) if chunked else parte)
+                    await writer.drain()
+        finally:
+            fechar = getattr(partes, "close", None)
+            if fechar:
+                await loop.run_in_executor(self.executor, fechar)
+
+
+async def _main(host: str, port: int, atender: Callable, executor: ThreadPoolExecutor,
+                reuse_port: bool):
+    server = await asyncio.start_server(
+        _Conexao(atender, executor), host, port, limit=MAX_HEADER_BYTES,
+        reuse_port=reuse_port or None,
+    )
+    log.info("Servidor (asyncio) escutando em http://%s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def serve(host: str, port: int, atender: Callable, reuse_port: bool = False):
+    """Roda o servidor asyncio até Ctrl+C.
+
+    atender(method, target, headers, body) deve devolver uma servidor.Resposta.
+    reuse_port=True abre o socket com SO_REUSEPORT (vários processos na mesma porta).
+    """
+    executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="aio-rota")
+    try:
+        asyncio.run(_main(host, port, atender, executor, reuse_port))
+    except KeyboardInterrupt:
+        log.info("Encerrando servidor...")
+    finally:
+        executor.shutdown(wait=False)
@@ -1,20 +1,187 @@
+import heapq
+import logging
 import os
+import queue
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import arquivo
+import metricas
+from dedupe import contador_reiniciou
+
+log = logging.getLogger("lora-server")
 
 DB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "database"))
 os.makedirs(DB_DIR, exist_ok=True)
 DB_PATH = os.path.join(DB_DIR, "dados.db")
 
-def _get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+# Duração das funções públicas deste módulo (exportada em /metrics)
+_DURACAO = metricas.Histograma(
+    "lora_db_query_seconds", "Duração das funções de storage.", ("function",)
+)
+
+# ---------- Gerenciador de conexões ----------
+# Uma única conexão de escrita (serializada por lock) e um pool limitado de
+# conexões somente leitura. Com WAL, leitores nunca bloqueiam o escritor.
+READ_POOL_SIZE = int(os.environ.get("LORA_DB_READERS", "4"))
+CACHE_SIZE_KB = int(os.environ.get("LORA_DB_CACHE_KB", "16384"))
+MMAP_SIZE = int(os.environ.get("LORA_DB_MMAP_BYTES", str(128 * 1024 * 1024)))
+STATEMENT_CACHE = 128
+
+_writer_conn: Optional[sqlite3.Connection] = None
+_writer_lock = threading.RLock()
+
+_pool_lock = threading.Lock()
+_readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+_readers_created = 0
+
+
+def _tune(conn: sqlite3.Connection) -> sqlite3.Connection:
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB};")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
     return conn
 
+
+def _open_writer() -> sqlite3.Connection:
+    # Transações controladas por _writer (isolation_level=None: sem BEGIN implícito)
+    conn = sqlite3.connect(
+        DB_PATH, timeout=30.0, check_same_thread=False, cached_statements=STATEMENT_CACHE,
+        isolation_level=None,
+    )
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return _tune(conn)
+
+
+def _open_reader() -> sqlite3.Connection:
+    uri = f"file:{quote(DB_PATH)}?mode=ro"
+    conn = sqlite3.connect(
+        uri, uri=True, timeout=30.0, check_same_thread=False, cached_statements=STATEMENT_CACHE
+    )
+    conn.execute("PRAGMA query_only=ON;")
+    return _tune(conn)
+
+
+_profundidade = 0  # blocos _writer() abertos (os internos fazem parte da transação externa)
+
+
+@contextmanager
+def _writer() -> Iterator[sqlite3.Connection]:
+    """Conexão de escrita compartilhada; o bloco roda em uma transação.
+
+    A transação começa com BEGIN IMMEDIATE antes de qualquer comando, inclusive
+    DDL (a criação de uma partição é desfeita junto com o lote que a pediu), e
+    termina em COMMIT ou ROLLBACK na saída do bloco mais externo.
+    """
+    global _writer_conn, _profundidade, _particoes
+    with _writer_lock:
+        if _writer_conn is None:
+            _writer_conn = _open_writer()
+        conn = _writer_conn
+        if _profundidade:
+            _profundidade += 1
+            try:
+                yield conn
+            finally:
+                _profundidade -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        _profundidade = 1
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            _particoes_novas.clear()
+            _particoes = None  # relido do banco na próxima inserção
+            raise
+        finally:
+            _profundidade = 0
+        if _particoes is not None:
+            _particoes.update(_particoes_novas)
+        _particoes_novas.clear()
+
+
+@contextmanager
+def _reader() -> Iterator[sqlite3.Connection]:
+    """Empresta uma conexão somente leitura do pool (cria sob demanda)."""
+    global _readers_created
+    try:
+        conn = _readers.get_nowait()
+    except queue.Empty:
+        with _pool_lock:
+            criar = _readers_created < READ_POOL_SIZE
+            if criar:
+                _readers_created += 1
+        if criar:
+            try:
+                conn = _open_reader()
+            except Exception:
+                with _pool_lock:
+                    _readers_created -= 1
+                raise
+        else:
+            conn = _readers.get()
+    try:
+        yield conn
+    finally:
+        _readers.put(conn)
+
+
+@contextmanager
+def _reader_snapshot() -> Iterator[sqlite3.Connection]:
+    """Como _reader, mas todas as consultas do bloco veem o mesmo snapshot do banco."""
+    with _reader() as conn:
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+
+def close_connections():
+    """Fecha a conexão de escrita e as leituras ociosas do pool."""
+    global _writer_conn, _readers_created, _particoes
+    with _writer_lock:
+        if _writer_conn is not None:
+            _writer_conn.close()
+            _writer_conn = None
+        _particoes = None
+        _particoes_novas.clear()
+    while True:
+        try:
+            conn = _readers.get_nowait()
+        except queue.Empty:
+            break
+        conn.close()
+        with _pool_lock:
+            _readers_created -= 1
+
+# ---------- Esquema e migrações ----------
+# A versão do esquema fica em PRAGMA user_version. init_db garante a versão 1
+# (tabela original); migrate_db aplica, em ordem, as migrações pendentes.
+SCHEMA_VERSION = 8
+MIGRATION_CHUNK = int(os.environ.get("LORA_MIGRATION_CHUNK", "5000"))
+
+
+def _user_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
 def init_db():
-    with _get_conn() as conn:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
+    with _writer() as conn:
+        if _user_version(conn) > 0:
+            return
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS readings (
@@ -29,67 +196,1424 @@ def init_db():
         conn.execute(
             "CREATE INDEX IF NOT EXISTS ix_packet_ts ON readings(packet_number, ts)"
         )
+        conn.execute("PRAGMA user_version = 1")
+
+
+def _migrar_v2():
+    """v1 -> v2: packet_number INTEGER, índices por ts e nó, (node_id, boot, packet_number) único.
+
+    O contador do transmissor volta a 1 quando ele perde a alimentação, então
+    cada linha é copiada, em ordem de chegada, para o boot (época de contagem)
+    do seu nó, com a mesma regra de _inserir_particionado; `boots` guarda as
+    épocas. Os dados são copiados em blocos de MIGRATION_CHUNK linhas, cada um
+    em sua própria transação, então o lock de escrita nunca fica preso por
+    muito tempo. O progresso fica em `migration_progress`: se o processo cair,
+    a cópia continua de onde parou.
+    """
+    with _writer() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS readings_v2 (
+                ts   INTEGER NOT NULL,
+                node_id TEXT NOT NULL DEFAULT 'node_padrao',
+                packet_number INTEGER,
+                temp REAL,
+                rh   REAL,
+                boot INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (node_id, boot, packet_number)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_readings_ts ON readings_v2(ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_readings_node_ts ON readings_v2(node_id, ts)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS boots (
+                node_id    TEXT NOT NULL,
+                boot       INTEGER NOT NULL,
+                ts_start   INTEGER NOT NULL,
+                max_packet INTEGER,
+                last_ts    INTEGER,
+                PRIMARY KEY (node_id, boot)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS migration_progress (
+                version INTEGER PRIMARY KEY,
+                last_rowid INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute("INSERT OR IGNORE INTO migration_progress VALUES (2, 0)")
+
+    # Linhas com (node_id, boot, packet_number) repetido ficam de fora da cópia
+    descartadas = 0
+    while True:
+        with _writer() as conn:
+            n = _copiar_bloco_v2(conn, MIGRATION_CHUNK)
+            if n is None:
+                break
+            descartadas += n
+
+    # Troca as tabelas em uma transação curta (copia o que chegou no meio tempo)
+    with _writer() as conn:
+        descartadas += _copiar_bloco_v2(conn, 2**62) or 0
+        conn.execute("DROP TABLE readings")
+        conn.execute("ALTER TABLE readings_v2 RENAME TO readings")
+        conn.execute("DELETE FROM migration_progress WHERE version = 2")
+        conn.execute("PRAGMA user_version = 2")
+    if descartadas:
+        log.warning("Migração v2: %d leituras repetidas (mesmo nó, boot e pacote) descartadas.",
+                    descartadas)
+
+
+def _copiar_bloco_v2(conn: sqlite3.Connection, limite: int) -> Optional[int]:
+    """Copia para readings_v2 até `limite` linhas v1 seguintes às já copiadas.
+
+    Retorna quantas ficaram de fora por repetir a chave, ou None se não havia
+    mais linhas.
+    """
+    last = conn.execute(
+        "SELECT last_rowid FROM migration_progress WHERE version = 2"
+    ).fetchone()[0]
+    rows = [
+        dict(r) for r in conn.execute(
+            "SELECT rowid, ts, node_id, packet_number, temp, rh FROM readings WHERE rowid > ? "
+            "ORDER BY rowid LIMIT ?",
+            (last, limite),
+        )
+    ]
+    if not rows:
+        return None
+    sql = (
+        "INSERT OR IGNORE INTO readings_v2 (ts, node_id, packet_number, temp, rh, boot) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    boots = _carregar_boots(conn, rows)
+    alteradas: Dict[Tuple[str, int], List[Any]] = {}
+    descartadas = 0
+    for r in rows:
+        try:  # packet_number era TEXT na v1; a afinidade INTEGER converte ao gravar
+            pacote = int(r["packet_number"])
+        except (TypeError, ValueError):
+            pacote = None
+        valores = [r["ts"], r["node_id"], r["packet_number"], r["temp"], r["rh"]]
+        epoca = _inserir_no_boot(conn, sql, boots[r["node_id"]], valores, pacote, int(r["ts"]))
+        if epoca is None:
+            descartadas += 1
+        else:
+            alteradas[(r["node_id"], epoca[0])] = epoca
+    _gravar_boots(conn, alteradas)
+    conn.execute(
+        "UPDATE migration_progress SET last_rowid = ? WHERE version = 2", (rows[-1]["rowid"],)
+    )
+    return descartadas
+
+
+def _migrar_v3():
+    """v2 -> v3: tabelas de agregados por minuto e por hora, preenchidas em blocos."""
+    with _writer() as conn:
+        for tabela in ROLLUPS:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {tabela} (
+                    node_id  TEXT NOT NULL,
+                    bucket   INTEGER NOT NULL,
+                    n        INTEGER NOT NULL,
+                    temp_min REAL, temp_max REAL, temp_sum REAL, temp_n INTEGER NOT NULL,
+                    rh_min   REAL, rh_max   REAL, rh_sum   REAL, rh_n   INTEGER NOT NULL,
+                    PRIMARY KEY (node_id, bucket)
+                ) WITHOUT ROWID
+                """
+            )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS migration_progress (
+                version INTEGER PRIMARY KEY,
+                last_rowid INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute("INSERT OR IGNORE INTO migration_progress VALUES (3, 0)")
+
+    # Backfill com o mesmo código usado na atualização incremental
+    while True:
+        with _writer() as conn:
+            last = conn.execute(
+                "SELECT last_rowid FROM migration_progress WHERE version = 3"
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT rowid, ts, node_id, temp, rh FROM readings WHERE rowid > ? "
+                "ORDER BY rowid LIMIT ?",
+                (last, MIGRATION_CHUNK),
+            ).fetchall()
+            if not rows:
+                conn.execute("DELETE FROM migration_progress WHERE version = 3")
+                conn.execute("PRAGMA user_version = 3")
+                break
+            _atualizar_rollups(conn, [dict(r) for r in rows])
+            conn.execute(
+                "UPDATE migration_progress SET last_rowid = ? WHERE version = 3",
+                (rows[-1]["rowid"],),
+            )
+
+
+def _migrar_v4():
+    """v3 -> v4: `readings` vira uma view sobre partições por período.
+
+    As linhas são distribuídas nas partições em blocos (com progresso salvo em
+    `migration_progress`); a troca final da tabela pela view é uma transação curta.
+    Os rollups já existem para essas linhas e não são tocados.
+    """
+    with _writer() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS partitions (
+                id           INTEGER PRIMARY KEY,
+                name         TEXT NOT NULL UNIQUE,
+                period_start INTEGER NOT NULL,
+                period_end   INTEGER NOT NULL,
+                rows         INTEGER NOT NULL DEFAULT 0,
+                dropped      INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        conn.execute("INSERT OR IGNORE INTO migration_progress VALUES (4, 0)")
+
+    select_sql = (
+        "SELECT rowid, ts, node_id, packet_number, temp, rh, boot FROM readings WHERE rowid > ? "
+        "ORDER BY rowid LIMIT ?"
+    )
+    while True:
+        with _writer() as conn:
+            last = conn.execute(
+                "SELECT last_rowid FROM migration_progress WHERE version = 4"
+            ).fetchone()[0]
+            rows = conn.execute(select_sql, (last, MIGRATION_CHUNK)).fetchall()
+            if not rows:
+                break
+            _inserir_particionado(conn, [dict(r) for r in rows], recriar_view=False,
+                                  reinicios=False)
+            conn.execute(
+                "UPDATE migration_progress SET last_rowid = ? WHERE version = 4",
+                (rows[-1]["rowid"],),
+            )
+
+    with _writer() as conn:
+        last = conn.execute(
+            "SELECT last_rowid FROM migration_progress WHERE version = 4"
+        ).fetchone()[0]
+        rows = conn.execute(select_sql, (last, 2**62)).fetchall()
+        _inserir_particionado(conn, [dict(r) for r in rows], recriar_view=False, reinicios=False)
+        conn.execute("DROP TABLE readings")
+        _recriar_view(conn)
+        conn.execute("DELETE FROM migration_progress WHERE version = 4")
+        conn.execute("PRAGMA user_version = 4")
+
+
+def _migrar_v5():
+    """v4 -> v5: tabela do arquivo comprimido (vazia; preenchida por compact_archive)."""
+    with _writer() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive_blocks (
+                id       INTEGER PRIMARY KEY,
+                node_id  TEXT NOT NULL,
+                ts_start INTEGER NOT NULL,
+                ts_end   INTEGER NOT NULL,
+                n        INTEGER NOT NULL,
+                data     BLOB NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_archive_node_ts ON archive_blocks(node_id, ts_end)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_archive_ts ON archive_blocks(ts_end)")
+        conn.execute("PRAGMA user_version = 5")
+
+
+def _migrar_v6():
+    """v5 -> v6: tabela `nodes` com os nós conhecidos, para consultas indexadas por nó."""
+    with _writer() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY) WITHOUT ROWID")
+        # rollup_1h tem todos os nós já gravados (desde a v3) em poucas linhas
+        conn.execute("INSERT OR IGNORE INTO nodes SELECT DISTINCT node_id FROM rollup_1h")
+        conn.execute("INSERT OR IGNORE INTO nodes SELECT DISTINCT node_id FROM archive_blocks")
+        conn.execute("PRAGMA user_version = 6")
+
+
+def _migrar_v7():
+    """v6 -> v7: histórico de alertas e checkpoint do motor de alertas (alertas.py)."""
+    with _writer() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS alerts (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                node_id    TEXT NOT NULL,
+                rule       TEXT NOT NULL,
+                metric     TEXT NOT NULL,
+                value      REAL,
+                score      REAL,
+                threshold  REAL,
+                started_at INTEGER NOT NULL,
+                ended_at   INTEGER
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_alerts_ativos ON alerts(node_id, rule, metric) "
+            "WHERE ended_at IS NULL"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS alert_state "
+            "(node_id TEXT PRIMARY KEY, state TEXT NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("PRAGMA user_version = 7")
+
+
+def _migrar_v8():
+    """v7 -> v8: estatísticas de enlace por nó e por hora, e o estado de cada nó.
+
+    Sem preenchimento a partir do histórico: a ordem de chegada das leituras
+    antigas não é conhecida, então a contagem começa na migração.
+    """
+    with _writer() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS link_1h (
+                node_id    TEXT NOT NULL,
+                bucket     INTEGER NOT NULL,
+                received   INTEGER NOT NULL,
+                expected   INTEGER NOT NULL,
+                lost       INTEGER NOT NULL,
+                late       INTEGER NOT NULL,
+                gaps       INTEGER NOT NULL,
+                max_gap    INTEGER NOT NULL,
+                duplicates INTEGER NOT NULL,
+                resets     INTEGER NOT NULL,
+                iat_sum    INTEGER NOT NULL,
+                iat_n      INTEGER NOT NULL,
+                iat_min    INTEGER,
+                iat_max    INTEGER,
+                PRIMARY KEY (node_id, bucket)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS link_state (node_id TEXT PRIMARY KEY, "
+            "max_packet INTEGER, last_ts INTEGER, boot INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID"
+        )
+        conn.execute("PRAGMA user_version = 8")
+
+
+MIGRATIONS = {
+    2: _migrar_v2,
+    3: _migrar_v3,
+    4: _migrar_v4,
+    5: _migrar_v5,
+    6: _migrar_v6,
+    7: _migrar_v7,
+    8: _migrar_v8,
+}
+
 
 def migrate_db():
-    pass
+    with _writer() as conn:
+        versao = _user_version(conn)
+    for alvo in range(versao + 1, SCHEMA_VERSION + 1):
+        MIGRATIONS[alvo]()
+
+
+# ---------- Agregados (rollups) ----------
+# min/max/soma/contagem de temp e rh por nó e por intervalo, mantidos na mesma
+# transação que insere as leituras. Nome da tabela -> duração do intervalo (s).
+ROLLUPS = {
+    "rollup_1m": 60,
+    "rollup_1h": 3600,
+}
+
+_ROLLUP_UPSERT = """
+    INSERT INTO {tabela} (node_id, bucket, n, temp_min, temp_max, temp_sum, temp_n,
+                          rh_min, rh_max, rh_sum, rh_n)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (node_id, bucket) DO UPDATE SET
+        n        = n + excluded.n,
+        temp_min = COALESCE(MIN(temp_min, excluded.temp_min), temp_min, excluded.temp_min),
+        temp_max = COALESCE(MAX(temp_max, excluded.temp_max), temp_max, excluded.temp_max),
+        temp_sum = COALESCE(temp_sum, 0) + COALESCE(excluded.temp_sum, 0),
+        temp_n   = temp_n + excluded.temp_n,
+        rh_min   = COALESCE(MIN(rh_min, excluded.rh_min), rh_min, excluded.rh_min),
+        rh_max   = COALESCE(MAX(rh_max, excluded.rh_max), rh_max, excluded.rh_max),
+        rh_sum   = COALESCE(rh_sum, 0) + COALESCE(excluded.rh_sum, 0),
+        rh_n     = rh_n + excluded.rh_n
+"""
+
+
+def _acumular(acc: List[Any], offset: int, valor: Any):
+    """acc[offset:offset+4] = [min, max, soma, n] de uma grandeza."""
+    if valor is None:
+        return
+    valor = float(valor)
+    _acumular_resumo(acc, offset, valor, valor, valor, 1)
+
 
+def _acumular_resumo(acc: List[Any], offset: int, minimo: Any, maximo: Any, soma: Any, n: int):
+    """Como _acumular, para n leituras já resumidas pelo gateway."""
+    if soma is None or n <= 0:
+        return
+    if acc[offset + 3] == 0:
+        acc[offset:offset + 4] = [float(minimo), float(maximo), float(soma), n]
+    else:
+        acc[offset] = min(acc[offset], float(minimo))
+        acc[offset + 1] = max(acc[offset + 1], float(maximo))
+        acc[offset + 2] += float(soma)
+        acc[offset + 3] += n
+
+
+def _partes_rollup(rows: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], int, Any]]:
+    """(linha, ts, resumo ou None) de cada leitura, resumo ou parte de resumo."""
+    for r in rows:
+        resumo = r.get("summary")
+        if resumo is not None and resumo.get("parts"):
+            for parte in resumo["parts"]:
+                yield r, int(parte["ts"]), parte
+        else:
+            yield r, int(r["ts"]), resumo
+
+
+def _atualizar_rollups(conn: sqlite3.Connection, rows: List[Dict[str, Any]]):
+    """Agrega as linhas em memória por (nó, intervalo) e aplica um upsert por grupo.
+
+    Um resumo do gateway que cobre mais de um minuto traz um resumo por minuto
+    em "parts", e cada parte entra no intervalo do próprio ts.
+    """
+    for tabela, passo in ROLLUPS.items():
+        grupos: Dict[Any, List[Any]] = {}
+        for r, ts, resumo in _partes_rollup(rows):
+            chave = (r.get("node_id") or "node_padrao", ts - ts % passo)
+            acc = grupos.get(chave)
+            if acc is None:
+                # n, temp_min, temp_max, temp_sum, temp_n, rh_min, rh_max, rh_sum, rh_n
+                acc = grupos[chave] = [0, None, None, None, 0, None, None, None, 0]
+            if resumo is None:
+                acc[0] += 1
+                _acumular(acc, 1, r.get("temp"))
+                _acumular(acc, 5, r.get("rh"))
+            else:
+                acc[0] += resumo["n"]
+                _acumular_resumo(acc, 1, resumo["temp_min"], resumo["temp_max"],
+                                 resumo["temp_sum"], resumo["n"])
+                _acumular_resumo(acc, 5, resumo["rh_min"], resumo["rh_max"],
+                                 resumo["rh_sum"], resumo["n"])
+        conn.executemany(
+            _ROLLUP_UPSERT.format(tabela=tabela),
+            [chave + tuple(acc) for chave, acc in grupos.items()],
+        )
+
+
+# ---------- Qualidade do enlace ----------
+# O transmissor incrementa o número do pacote a cada envio, então buracos na
+# sequência medem a perda no rádio. Cada lote atualiza, na mesma transação das
+# leituras, o estado de cada nó (maior pacote e ts da última chegada, em
+# link_state) e contadores por nó e por hora em link_1h, sem reler o histórico:
+# - received   : leituras novas gravadas
+# - expected   : quanto a sequência avançou (1 para a primeira leitura e após reinício)
+# - lost       : pacotes pulados quando a sequência avança; `gaps` conta os
+#                buracos e `max_gap` guarda o maior
+# - late       : pacotes que chegam abaixo do maior já visto (preenchem um buraco);
+#                a perda líquida é lost - late
+# - duplicates : retransmissões de pacotes já gravados
+# - resets     : o transmissor reiniciou a contagem (a linha abriu um boot novo
+#                em _inserir_particionado, com a mesma regra da deduplicação);
+#                linhas atrasadas de um boot anterior contam como late
+# - iat_*      : intervalo entre chegadas consecutivas do nó (s)
+# Um resumo do gateway (linha com "summary") conta como as n leituras que
+# representa, cobrindo os pacotes de first_packet a packet_number.
+LINK_BUCKET = 3600
+
+_LINK_UPSERT = """
+    INSERT INTO link_1h (node_id, bucket, received, expected, lost, late, gaps, max_gap,
+                         duplicates, resets, iat_sum, iat_n, iat_min, iat_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (node_id, bucket) DO UPDATE SET
+        received   = received + excluded.received,
+        expected   = expected + excluded.expected,
+        lost       = lost + excluded.lost,
+        late       = late + excluded.late,
+        gaps       = gaps + excluded.gaps,
+        max_gap    = MAX(max_gap, excluded.max_gap),
+        duplicates = duplicates + excluded.duplicates,
+        resets     = resets + excluded.resets,
+        iat_sum    = iat_sum + excluded.iat_sum,
+        iat_n      = iat_n + excluded.iat_n,
+        iat_min    = MIN(COALESCE(iat_min, excluded.iat_min), COALESCE(excluded.iat_min, iat_min)),
+        iat_max    = MAX(COALESCE(iat_max, excluded.iat_max), COALESCE(excluded.iat_max, iat_max))
+"""
+
+# Posições em um acumulador de link_1h (mesma ordem das colunas)
+(_RECEBIDAS, _ESPERADAS, _PERDIDAS, _ATRASADAS, _BURACOS, _MAIOR_BURACO,
+ _DUPLICADAS, _REINICIOS, _IAT_SOMA, _IAT_N, _IAT_MIN, _IAT_MAX) = range(12)
+
+
+def _novo_acumulador_enlace() -> List[Any]:
+    return [0] * 10 + [None, None]
+
+
+def _atualizar_enlace(
+    conn: sqlite3.Connection,
+    inseridas: List[Dict[str, Any]],
+    repetidas: List[Dict[str, Any]],
+    duplicatas: Optional[Dict[Tuple[str, int], int]] = None,
+):
+    """Aplica as leituras de um lote, na ordem de chegada, às estatísticas de enlace.
+
+    `repetidas` são as linhas que o banco ignorou por já existirem; `duplicatas`
+    conta, por (nó, hora), as retransmissões barradas antes da fila.
+    """
+    grupos: Dict[Tuple[str, int], List[Any]] = {}
+
+    def acumulador(node_id: str, ts: int) -> List[Any]:
+        chave = (node_id, ts - ts % LINK_BUCKET)
+        acc = grupos.get(chave)
+        if acc is None:
+            acc = grupos[chave] = _novo_acumulador_enlace()
+        return acc
+
+    for r in repetidas:
+        acumulador(r.get("node_id") or "node_padrao", int(r["ts"]))[_DUPLICADAS] += 1
+    for (node_id, bucket), n in (duplicatas or {}).items():
+        acumulador(node_id, bucket)[_DUPLICADAS] += n
+
+    nos = list({r.get("node_id") or "node_padrao" for r in inseridas})
+    if nos:
+        marcadores = ", ".join("?" * len(nos))
+        estado = {
+            r[0]: [r[1], r[2], r[3]] for r in conn.execute(
+                "SELECT node_id, max_packet, last_ts, boot FROM link_state "
+                f"WHERE node_id IN ({marcadores})",
+                nos,
+            )
+        }
+        for r in inseridas:
+            node_id = r.get("node_id") or "node_padrao"
+            ts = int(r["ts"])
+            pacote = r.get("packet_number")
+            resumo = r.get("summary")
+            n = resumo["n"] if resumo else 1
+            primeiro = resumo["first_packet"] if resumo else pacote
+            acc = acumulador(node_id, ts)
+            maior, ultimo_ts, boot_atual = estado.setdefault(node_id, [None, None, 0])
+            acc[_RECEBIDAS] += n
+
+            if ultimo_ts is not None and ts >= ultimo_ts:
+                intervalo = ts - ultimo_ts
+                acc[_IAT_SOMA] += intervalo
+                acc[_IAT_N] += n
+                if n == 1:  # num resumo só a média dos intervalos é conhecida
+                    minimo, maximo = acc[_IAT_MIN], acc[_IAT_MAX]
+                    acc[_IAT_MIN] = intervalo if minimo is None else min(minimo, intervalo)
+                    acc[_IAT_MAX] = intervalo if maximo is None else max(maximo, intervalo)
+            if ultimo_ts is None or ts > ultimo_ts:
+                estado[node_id][1] = ts
+
+            if pacote is None:
+                continue
+            boot = r.get("boot", 0)
+            if boot < boot_atual:  # chegou depois do reinício, mas é da contagem anterior
+                acc[_ATRASADAS] += n
+                continue
+            if maior is None or boot > boot_atual:
+                if maior is not None:
+                    acc[_REINICIOS] += 1
+                estado[node_id][2] = boot
+                esperadas = pacote - primeiro + 1
+            elif pacote > maior:
+                esperadas = pacote - maior
+            else:
+                acc[_ATRASADAS] += n
+                continue
+            acc[_ESPERADAS] += esperadas
+            buraco = esperadas - n
+            if buraco > 0:
+                acc[_PERDIDAS] += buraco
+                acc[_BURACOS] += 1
+                if n == 1:  # dentro de um resumo o tamanho de cada buraco é desconhecido
+                    acc[_MAIOR_BURACO] = max(acc[_MAIOR_BURACO], buraco)
+            elif buraco < 0:
+                acc[_ATRASADAS] -= buraco  # o resumo inclui pacotes abaixo do maior já visto
+            estado[node_id][0] = pacote
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO link_state (node_id, max_packet, last_ts, boot) "
+            "VALUES (?, ?, ?, ?)",
+            [(n, *estado[n]) for n in nos],
+        )
+    conn.executemany(
+        _LINK_UPSERT, [chave + tuple(acc) for chave, acc in grupos.items()]
+    )
+
+
+# ---------- Partições por período ----------
+# Desde o esquema v4 as leituras ficam em uma tabela por período (dia ou mês,
+# UTC), registradas em `partitions`, e `readings` é uma view UNION ALL sobre as
+# partições ativas. Retenção e /delete-all só marcam partições como descartadas
+# (operação de metadados); as tabelas são apagadas depois, uma por transação,
+# por purge_dropped(). O SQLite limita a view a 500 partições.
+PARTITION_PERIOD = os.environ.get("LORA_PARTITION_PERIOD", "month")  # "day" ou "month"
+RETENTION_DAYS = int(os.environ.get("LORA_RETENTION_DAYS", "0"))  # 0 = sem expiração
+
+TS_MAX = 2**32 - 1  # maior ts aceito (epoch s), o mesmo limite do formato binário
+
+_COLUNAS = "ts, node_id, packet_number, temp, rh"
+# period_start -> nome (só o escritor usa). Partições criadas na transação em
+# andamento ficam em _particoes_novas e só entram no cache depois do COMMIT.
+_particoes: Optional[Dict[int, str]] = None
+_particoes_novas: Dict[int, str] = {}
+
+
+def _periodo(ts: int) -> Tuple[int, int]:
+    """[início, fim) do período UTC que contém ts."""
+    if not 0 <= ts <= TS_MAX:
+        raise ValueError(f"ts fora da faixa aceita (0..{TS_MAX}): {ts}")
+    if PARTITION_PERIOD == "day":
+        inicio = ts - ts % 86400
+        return inicio, inicio + 86400
+    d = datetime.fromtimestamp(ts, timezone.utc)
+    inicio = datetime(d.year, d.month, 1, tzinfo=timezone.utc)
+    fim = datetime(d.year + (d.month == 12), d.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(inicio.timestamp()), int(fim.timestamp())
+
+
+def _recriar_view(conn: sqlite3.Connection):
+    nomes = [
+        r[0] for r in conn.execute(
+            "SELECT name FROM partitions WHERE dropped = 0 ORDER BY period_start"
+        )
+    ]
+    conn.execute("DROP VIEW IF EXISTS readings")
+    if nomes:
+        corpo = " UNION ALL ".join(f"SELECT {_COLUNAS} FROM {n}" for n in nomes)
+    else:
+        corpo = (
+            "SELECT NULL AS ts, NULL AS node_id, NULL AS packet_number, "
+            "NULL AS temp, NULL AS rh WHERE 0"
+        )
+    conn.execute(f"CREATE VIEW readings AS {corpo}")
+
+
+def _criar_tabela_particao(conn: sqlite3.Connection, nome: str):
+    # `boot` separa as épocas de contagem do transmissor: depois de um
+    # reinício os números de pacote se repetem
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {nome} (
+            ts   INTEGER NOT NULL,
+            node_id TEXT NOT NULL DEFAULT 'node_padrao',
+            packet_number INTEGER,
+            temp REAL,
+            rh   REAL,
+            boot INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (node_id, boot, packet_number)
+        )
+        """
+    )
+
+
+def _criar_indices_particao(conn: sqlite3.Connection, nome: str):
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{nome}_ts ON {nome}(ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{nome}_node_ts ON {nome}(node_id, ts)")
+
+
+def _particao(conn: sqlite3.Connection, ts: int, recriar_view: bool = True) -> str:
+    """Nome da partição ativa para ts, criando-a (e atualizando a view) se preciso."""
+    global _particoes
+    if _particoes is None:
+        _particoes = {
+            r[0]: r[1] for r in conn.execute(
+                "SELECT period_start, name FROM partitions WHERE dropped = 0"
+            )
+        }
+    inicio, fim = _periodo(ts)
+    nome = _particoes.get(inicio) or _particoes_novas.get(inicio)
+    if nome is not None:
+        return nome
+
+    novo_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM partitions").fetchone()[0]
+    nome = f"readings_p{novo_id}"
+    _criar_tabela_particao(conn, nome)
+    _criar_indices_particao(conn, nome)
+    conn.execute(
+        "INSERT INTO partitions (id, name, period_start, period_end) VALUES (?, ?, ?, ?)",
+        (novo_id, nome, inicio, fim),
+    )
+    _particoes_novas[inicio] = nome
+    if recriar_view:
+        _recriar_view(conn)
+    return nome
+
+
+def _carregar_boots(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """node_id -> [[boot, ts_start, max_packet, last_ts], ...] em ordem de boot."""
+    nos = list({r.get("node_id") or "node_padrao" for r in rows})
+    boots: Dict[str, List[Any]] = {n: [] for n in nos}
+    for i in range(0, len(nos), 500):  # limite de parâmetros do SQLite
+        parte = nos[i:i + 500]
+        for r in conn.execute(
+            "SELECT node_id, boot, ts_start, max_packet, last_ts FROM boots "
+            f"WHERE node_id IN ({', '.join('?' * len(parte))}) ORDER BY node_id, boot",
+            parte,
+        ):
+            boots[r[0]].append(list(r[1:]))
+    for epocas in boots.values():
+        if not epocas:
+            epocas.append([0, 0, None, None])
+    return boots
+
+
+def _inserir_particionado(
+    conn: sqlite3.Connection, rows: List[Dict[str, Any]], recriar_view: bool = True,
+    reinicios: bool = True,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Insere cada linha na partição do seu período; devolve (inseridas, repetidas).
+
+    As linhas de `rows` não são alteradas: as inseridas voltam como cópias. Com
+    `reinicios`, cada linha vai para o boot (época de contagem) do nó que
+    contém o seu ts (ver _inserir_no_boot), e a cópia leva a chave "boot". Sem
+    `reinicios` (migração v4) cada linha mantém o boot que já tem.
+    """
+    inseridas = []
+    repetidas = []
+    por_particao: Dict[str, int] = {}
+    if not reinicios:
+        for r in rows:
+            nome = _particao(conn, int(r["ts"]), recriar_view)
+            cur = conn.execute(
+                f"INSERT OR IGNORE INTO {nome} ({_COLUNAS}, boot) VALUES (?, ?, ?, ?, ?, ?)",
+                (r["ts"], r.get("node_id") or "node_padrao", r.get("packet_number"),
+                 r.get("temp"), r.get("rh"), r.get("boot", 0)),
+            )
+            if cur.rowcount > 0:
+                inseridas.append(dict(r))
+                por_particao[nome] = por_particao.get(nome, 0) + 1
+            else:
+                repetidas.append(r)
+        _contar_linhas_particoes(conn, por_particao)
+        return inseridas, repetidas
+
+    boots = _carregar_boots(conn, rows)
+    alteradas: Dict[Tuple[str, int], List[Any]] = {}
+    comandos: Dict[str, str] = {}
+    for r in rows:
+        ts = int(r["ts"])
+        node_id = r.get("node_id") or "node_padrao"
+        nome = _particao(conn, ts, recriar_view)
+        sql = comandos.get(nome)
+        if sql is None:
+            sql = comandos[nome] = (
+                f"INSERT OR IGNORE INTO {nome} ({_COLUNAS}, boot) VALUES (?, ?, ?, ?, ?, ?)"
+            )
+        pacote = r.get("packet_number")
+        valores = [r["ts"], node_id, pacote, r.get("temp"), r.get("rh")]
+        epoca = _inserir_no_boot(conn, sql, boots[node_id], valores, pacote, ts)
+        if epoca is None:
+            repetidas.append(r)
+            continue
+        inseridas.append(dict(r, boot=epoca[0]))
+        por_particao[nome] = por_particao.get(nome, 0) + 1
+        alteradas[(node_id, epoca[0])] = epoca
+    _contar_linhas_particoes(conn, por_particao)
+    _gravar_boots(conn, alteradas)
+    return inseridas, repetidas
+
+
+def _inserir_no_boot(
+    conn: sqlite3.Connection, sql: str, epocas: List[List[Any]], valores: List[Any],
+    pacote: Optional[int], ts: int,
+) -> Optional[List[Any]]:
+    """Executa `sql` (INSERT OR IGNORE, com o boot como último valor) no boot do nó
+    que contém ts; devolve a época da linha inserida, ou None se ela já existia.
+
+    Um número de pacote já gravado no boot atual que chega com ts mais novo que
+    todos os dele indica que o transmissor reiniciou a contagem
+    (dedupe.contador_reiniciou): abre um boot novo a partir dessa linha em vez
+    de ser ignorado. Cópias antigas continuam caindo no boot do seu ts e sendo
+    ignoradas. `epocas` (de _carregar_boots) é atualizada no lugar.
+    """
+    epoca = epocas[-1]
+    if epoca[1] > ts:  # linha de uma época anterior
+        epoca = next(e for e in reversed(epocas) if e[1] <= ts)
+    valores = [*valores, epoca[0]]
+    inserida = conn.execute(sql, valores).rowcount > 0
+    if (not inserida and epoca is epocas[-1] and pacote is not None
+            and contador_reiniciou(epoca[2], epoca[3], pacote, ts)):
+        epoca = [epoca[0] + 1, ts, None, None]
+        epocas.append(epoca)
+        valores[-1] = epoca[0]
+        inserida = conn.execute(sql, valores).rowcount > 0
+    if not inserida:
+        return None
+    if pacote is not None:
+        epoca[2] = pacote if epoca[2] is None else max(epoca[2], pacote)
+    epoca[3] = ts if epoca[3] is None else max(epoca[3], ts)
+    return epoca
+
+
+def _gravar_boots(conn: sqlite3.Connection, alteradas: Dict[Tuple[str, int], List[Any]]):
+    conn.executemany(
+        "INSERT OR REPLACE INTO boots (node_id, boot, ts_start, max_packet, last_ts) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [(node_id, *epoca) for (node_id, _), epoca in alteradas.items()],
+    )
+
+
+def _contar_linhas_particoes(conn: sqlite3.Connection, por_particao: Dict[str, int]):
+    conn.executemany(
+        "UPDATE partitions SET rows = rows + ? WHERE name = ?",
+        [(n, nome) for nome, n in por_particao.items()],
+    )
+
+
+def _registrar_nos(conn: sqlite3.Connection, rows: List[Dict[str, Any]]):
+    nos = {r.get("node_id") or "node_padrao" for r in rows}
+    conn.executemany("INSERT OR IGNORE INTO nodes (node_id) VALUES (?)", [(n,) for n in nos])
+
+
+def _particoes_ativas(
+    conn: sqlite3.Connection, ts_from: Optional[int] = None, ts_to: Optional[int] = None,
+    recentes_primeiro: bool = False,
+) -> List[str]:
+    sql = "SELECT name FROM partitions WHERE dropped = 0"
+    params: List[Any] = []
+    if ts_from is not None:
+        sql += " AND period_end > ?"
+        params.append(ts_from)
+    if ts_to is not None:
+        sql += " AND period_start <= ?"
+        params.append(ts_to)
+    sql += " ORDER BY period_start" + (" DESC" if recentes_primeiro else "")
+    return [r[0] for r in conn.execute(sql, params)]
+
+
+@metricas.cronometrar(_DURACAO, "apply_retention")
+def apply_retention(now: Optional[int] = None) -> int:
+    """Descarta partições inteiras, blocos do arquivo e alertas encerrados além de RETENTION_DAYS.
+
+    Retorna quantas linhas deixaram de ser visíveis. As tabelas são apagadas
+    depois, por purge_dropped(). Os rollups e as estatísticas de enlace são
+    mantidos como histórico de longo prazo.
+    """
+    global _particoes
+    if RETENTION_DAYS <= 0:
+        return 0
+    limite = (now if now is not None else int(time.time())) - RETENTION_DAYS * 86400
+    with _writer() as conn:
+        expiradas = conn.execute(
+            "SELECT id, rows FROM partitions WHERE dropped = 0 AND period_end <= ?", (limite,)
+        ).fetchall()
+        arquivadas = conn.execute(
+            "SELECT COALESCE(SUM(n), 0) FROM archive_blocks WHERE ts_end < ?", (limite,)
+        ).fetchone()[0]
+        if arquivadas:
+            conn.execute("DELETE FROM archive_blocks WHERE ts_end < ?", (limite,))
+        conn.execute("DELETE FROM alerts WHERE ended_at < ?", (limite,))
+        if expiradas:
+            conn.executemany("UPDATE partitions SET dropped = 1 WHERE id = ?",
+                             [(r["id"],) for r in expiradas])
+            _particoes = None
+            _recriar_view(conn)
+    return sum(r["rows"] for r in expiradas) + arquivadas
+
+
+@metricas.cronometrar(_DURACAO, "purge_dropped")
+def purge_dropped() -> int:
+    """Apaga as tabelas das partições descartadas e as trocadas por delete_all(),
+    uma por transação."""
+    apagadas = 0
+    while True:
+        with _writer() as conn:
+            linha = conn.execute(
+                "SELECT id, name FROM partitions WHERE dropped = 1 LIMIT 1"
+            ).fetchone()
+            if linha is not None:
+                conn.execute(f"DROP TABLE IF EXISTS {linha['name']}")
+                conn.execute("DELETE FROM partitions WHERE id = ?", (linha["id"],))
+            else:
+                linha = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+                    (_PREFIXO_DESCARTADA + "%",),
+                ).fetchone()
+                if linha is None:
+                    return apagadas
+                conn.execute(f"DROP TABLE {linha['name']}")
+        apagadas += 1
+
+
+# ---------- Arquivo comprimido ----------
+# Partições cujo período terminou há mais de ARCHIVE_AFTER_DAYS são convertidas
+# em blocos colunares comprimidos por nó (ver arquivo.py) e descartadas. As
+# funções de leitura abaixo combinam partições e blocos de forma transparente.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("LORA_ARCHIVE_AFTER_DAYS", "7"))  # 0 = desativado
+# O cursor de paginação guarda a posição da linha no bloco nos 16 bits baixos
+# da chave (ver _linhas_arquivo), então um bloco tem no máximo 2**16 linhas
+_BITS_LINHA_BLOCO = 16
+ARCHIVE_BLOCK_ROWS = max(1, min(int(os.environ.get("LORA_ARCHIVE_BLOCK_ROWS", "1024")),
+                                1 << _BITS_LINHA_BLOCO))
+
+
+def _codificar_particao(conn: sqlite3.Connection, nome: str) -> List[Tuple[Any, ...]]:
+    """Lê a partição nó a nó (sem carregar tudo na memória) e devolve os blocos."""
+    blocos = []
+    nodes = [r[0] for r in conn.execute(f"SELECT DISTINCT node_id FROM {nome}")]
+    for node_id in nodes:
+        cur = conn.execute(
+            f"SELECT ts, packet_number, temp, rh FROM {nome} WHERE node_id = ? ORDER BY ts",
+            (node_id,),
+        )
+        while True:
+            linhas = [dict(r) for r in cur.fetchmany(ARCHIVE_BLOCK_ROWS)]
+            if not linhas:
+                break
+            blocos.append((node_id, linhas[0]["ts"], linhas[-1]["ts"], len(linhas),
+                           arquivo.codificar(linhas)))
+    return blocos
+
+
+@metricas.cronometrar(_DURACAO, "compact_archive")
+def compact_archive(now: Optional[int] = None) -> int:
+    """Move as partições frias para o arquivo comprimido; retorna as linhas arquivadas.
+
+    A codificação roda em uma conexão de leitura; o escritor só é usado para
+    gravar os blocos e descartar a partição. Se a partição recebeu linhas nesse
+    meio tempo, ela fica para a próxima rodada.
+    """
+    global _particoes
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return 0
+    limite = (now if now is not None else int(time.time())) - ARCHIVE_AFTER_DAYS * 86400
+    with _reader() as conn:
+        frias = conn.execute(
+            "SELECT id, name FROM partitions WHERE dropped = 0 AND period_end <= ? "
+            "ORDER BY period_start",
+            (limite,),
+        ).fetchall()
+
+    arquivadas = 0
+    for particao in frias:
+        with _reader_snapshot() as conn:
+            linhas = conn.execute(
+                "SELECT rows FROM partitions WHERE id = ? AND dropped = 0", (particao["id"],)
+            ).fetchone()
+            if linhas is None:
+                continue
+            blocos = _codificar_particao(conn, particao["name"])
+        with _writer() as conn:
+            atual = conn.execute(
+                "SELECT rows FROM partitions WHERE id = ? AND dropped = 0", (particao["id"],)
+            ).fetchone()
+            if atual is None or atual["rows"] != linhas["rows"]:
+                continue
+            conn.executemany(
+                "INSERT INTO archive_blocks (node_id, ts_start, ts_end, n, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                blocos,
+            )
+            conn.execute("UPDATE partitions SET dropped = 1 WHERE id = ?", (particao["id"],))
+            _particoes = None
+            _recriar_view(conn)
+        arquivadas += linhas["rows"]
+    return arquivadas
+
+
+def _decodificar_bloco(bloco: sqlite3.Row) -> List[Dict[str, Any]]:
+    """Linhas de um bloco do arquivo, no mesmo formato das consultas de leituras."""
+    return [
+        {"ts": r["ts"], "node_id": bloco["node_id"], "packet_number": r["packet_number"],
+         "temp": r["temp"], "rh": r["rh"]}
+        for r in arquivo.decodificar(bloco["data"])
+    ]
+
+
+@metricas.cronometrar(_DURACAO, "insert_reading")
 def insert_reading(
     ts: int,
-    packet_number: Optional[str],
+    packet_number: Optional[int],
     node_id: Optional[str] = "node_padrao",
     temp: Any = None,
     rh: Any = None,
-):
+    summary: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """Insere uma leitura. Retorna False se (node_id, packet_number) já existia.
+
+    `summary` vem de um resumo do gateway (n, first_packet, min/max/soma de
+    temp e rh e, se cobrir mais de um minuto, as partes por minuto). A linha
+    guarda só o valor representativo; rollups e estatísticas de enlace contam
+    as n leituras.
+    """
     if node_id is None:
         node_id = "node_padrao"
 
-    with _get_conn() as conn:
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO readings (ts, packet_number, node_id, temp, rh)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (ts, packet_number, node_id, temp, rh),
-        )
+    linha = {"ts": ts, "packet_number": packet_number, "node_id": node_id, "temp": temp, "rh": rh}
+    if summary is not None:
+        linha["summary"] = summary
+    with _writer() as conn:
+        inseridas, repetidas = _inserir_particionado(conn, [linha])
+        _atualizar_enlace(conn, inseridas, repetidas)
+        if not inseridas:
+            return False
+        _registrar_nos(conn, inseridas)
+        _atualizar_rollups(conn, inseridas)
+        return True
+
+
+@metricas.cronometrar(_DURACAO, "insert_many")
+def insert_many(
+    rows: Iterable[Dict[str, Any]], duplicates: Optional[Dict[Tuple[str, int], int]] = None
+) -> List[Dict[str, Any]]:
+    """Insere várias leituras em uma única transação (group commit).
+
+    Cada item deve ter as chaves aceitas por `insert_reading`. Retorna cópias das
+    linhas efetivamente inseridas, com o boot de cada uma (duplicatas de
+    (node_id, boot, packet_number) na mesma partição são ignoradas). Se qualquer
+    linha falhar, a transação inteira é desfeita e a exceção é propagada.
+    `duplicates` ({(nó, hora): n}) são retransmissões descartadas antes de chegar
+    aqui, somadas às estatísticas de enlace.
+    """
+    rows = list(rows)
+    if not rows and not duplicates:
+        return []
+
+    with _writer() as conn:
+        inseridas, repetidas = _inserir_particionado(conn, rows)
+        _registrar_nos(conn, inseridas)
+        _atualizar_rollups(conn, inseridas)
+        _atualizar_enlace(conn, inseridas, repetidas, duplicates)
+    return inseridas
 
+
+# Tabelas que crescem com o histórico: /delete-all troca cada uma por uma cópia
+# vazia e deixa a antiga para purge_dropped(), como as partições. As tabelas
+# com uma linha por nó (nodes, link_state, alert_state, boots) são esvaziadas.
+_TABELAS_HISTORICO = ("archive_blocks", "alerts", "link_1h", *ROLLUPS)
+_PREFIXO_DESCARTADA = "descartada_"
+
+
+def _descartar_tabela(conn: sqlite3.Connection, tabela: str):
+    """Renomeia a tabela e cria outra, vazia, com o mesmo esquema e índices."""
+    (sql,) = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)
+    ).fetchone()
+    indices = conn.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (tabela,),
+    ).fetchall()
+    for nome, _ in indices:  # os nomes ficariam com a tabela renomeada
+        conn.execute(f"DROP INDEX {nome}")
+    conn.execute(f"ALTER TABLE {tabela} RENAME TO {_PREFIXO_DESCARTADA}{time.time_ns()}_{tabela}")
+    conn.execute(sql)
+    for _, sql_indice in indices:
+        conn.execute(sql_indice)
+
+
+@metricas.cronometrar(_DURACAO, "delete_all")
 def delete_all():
-    with _get_conn() as conn:
-        conn.execute("DELETE FROM readings")
+    """Esvazia o banco sem reescrever páginas: descarta todas as partições de uma vez.
+
+    As tabelas de histórico são trocadas por cópias vazias; as antigas, como as
+    partições, continuam no arquivo até purge_dropped() rodar.
+    """
+    global _particoes
+    with _writer() as conn:
+        conn.execute("UPDATE partitions SET dropped = 1 WHERE dropped = 0")
+        _particoes = {}
+        _recriar_view(conn)
+        for tabela in _TABELAS_HISTORICO:
+            _descartar_tabela(conn, tabela)
+        conn.execute("DELETE FROM nodes")
+        conn.execute("DELETE FROM alert_state")
+        conn.execute("DELETE FROM link_state")
+        conn.execute("DELETE FROM boots")
 
-def get_last_readings(limit: int = 50, packet_number: Optional[str] = None) -> List[Dict[str, Any]]:
-    with _get_conn() as conn:
-        cur = conn.cursor()
-        if packet_number:
-            cur.execute(
-                "SELECT * FROM readings WHERE packet_number = ? ORDER BY ts DESC LIMIT ?",
-                (packet_number, limit),
+@metricas.cronometrar(_DURACAO, "get_last_readings")
+def get_last_readings(limit: int = 50, packet_number: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Últimas leituras; percorre as partições da mais nova para a mais antiga."""
+    filtro = "WHERE packet_number = ? " if packet_number is not None else ""
+    linhas: List[Dict[str, Any]] = []
+    with _reader_snapshot() as conn:
+        for nome in _particoes_ativas(conn, recentes_primeiro=True):
+            params: List[Any] = [] if packet_number is None else [packet_number]
+            cur = conn.execute(
+                f"SELECT {_COLUNAS} FROM {nome} {filtro}ORDER BY ts DESC LIMIT ?",
+                params + [limit - len(linhas)],
             )
-        else:
-            cur.execute(
-                "SELECT * FROM readings ORDER BY ts DESC LIMIT ?",
-                (limit,),
+            linhas.extend(dict(r) for r in cur.fetchall())
+            if len(linhas) >= limit:
+                break
+
+        # Blocos do arquivo que ainda podem ter leituras entre as `limit` mais novas
+        cur = conn.execute(
+            "SELECT node_id, ts_end, data FROM archive_blocks WHERE ts_end >= ? "
+            "ORDER BY ts_end DESC",
+            (linhas[limit - 1]["ts"] if len(linhas) >= limit else -2**63,),
+        )
+        for bloco in cur:
+            if len(linhas) >= limit and bloco["ts_end"] < linhas[-1]["ts"]:
+                break
+            linhas.extend(
+                r for r in _decodificar_bloco(bloco)
+                if packet_number is None or r["packet_number"] == packet_number
             )
-        return [dict(r) for r in cur.fetchall()]
+            linhas.sort(key=lambda r: r["ts"], reverse=True)
+            del linhas[limit:]
+    return linhas
 
-def get_latest_by_packet() -> Dict[str, Dict[str, Any]]:
-    with _get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT r.*
-            FROM readings r
-            JOIN (
-                SELECT packet_number, MAX(ts) AS max_ts
-                FROM readings
-                GROUP BY packet_number
-            ) x
-            ON r.packet_number = x.packet_number AND r.ts = x.max_ts
-            """
+@metricas.cronometrar(_DURACAO, "get_latest_by_node")
+def get_latest_by_node() -> Dict[str, Dict[str, Any]]:
+    latest: Dict[str, Dict[str, Any]] = {}
+    with _reader_snapshot() as conn:
+        # Uma busca no índice (node_id, ts) por nó, da partição mais nova para a mais antiga
+        particoes = _particoes_ativas(conn, recentes_primeiro=True)
+        for (node_id,) in conn.execute("SELECT node_id FROM nodes").fetchall():
+            for nome in particoes:
+                row = conn.execute(
+                    f"SELECT {_COLUNAS} FROM {nome} WHERE node_id = ? ORDER BY ts DESC LIMIT 1",
+                    (node_id,),
+                ).fetchone()
+                if row is not None:
+                    latest[node_id] = dict(row)
+                    break
+
+        # Nós cuja leitura mais nova já foi arquivada: decodifica só o último bloco
+        cur = conn.execute(
+            "SELECT node_id, MAX(ts_end) AS ts_end FROM archive_blocks GROUP BY node_id"
         )
-        return {row["packet_number"]: dict(row) for row in cur.fetchall()}
+        for node_id, ts_end in cur.fetchall():
+            atual = latest.get(node_id)
+            if atual is not None and atual["ts"] >= ts_end:
+                continue
+            bloco = conn.execute(
+                "SELECT node_id, data FROM archive_blocks WHERE node_id = ? AND ts_end = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (node_id, ts_end),
+            ).fetchone()
+            latest[node_id] = _decodificar_bloco(bloco)[-1]
+    return latest
 
+@metricas.cronometrar(_DURACAO, "count_rows")
 def count_rows() -> int:
-    with _get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM readings")
-        return int(cur.fetchone()[0])
\ No newline at end of file
+    # Contagem mantida por partição a cada inserção: não varre as leituras
+    with _reader() as conn:
+        cur = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(rows), 0) FROM partitions WHERE dropped = 0) + "
+            "(SELECT COALESCE(SUM(n), 0) FROM archive_blocks)"
+        )
+        return int(cur.fetchone()[0])
+
+# ---------- Séries históricas ----------
+SERIES_RESOLUTIONS = ("raw",) + tuple(t.split("_", 1)[1] for t in ROLLUPS)  # raw, 1m, 1h
+
+
+@metricas.cronometrar(_DURACAO, "choose_resolution")
+def choose_resolution(node_id: str, ts_from: int, ts_to: int, max_points: int) -> str:
+    """Escolhe a resolução mais fina cuja quantidade de pontos cabe em max_points.
+
+    A contagem de linhas brutas vem do rollup por hora (no máximo um registro por
+    hora no intervalo), então a escolha nunca varre a tabela `readings`.
+    """
+    with _reader() as conn:
+        brutas = conn.execute(
+            "SELECT COALESCE(SUM(n), 0) FROM rollup_1h "
+            "WHERE node_id = ? AND bucket BETWEEN ? AND ?",
+            (node_id, ts_from - ts_from % 3600, ts_to),
+        ).fetchone()[0]
+    if brutas <= max_points:
+        return "raw"
+    span = max(ts_to - ts_from, 0)
+    for tabela, passo in ROLLUPS.items():
+        if span // passo + 1 <= max_points:
+            return tabela.split("_", 1)[1]
+    return SERIES_RESOLUTIONS[-1]
+
+
+@metricas.cronometrar(_DURACAO, "get_series")
+def get_series(node_id: str, ts_from: int, ts_to: int, resolution: str,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Série de um nó em [ts_from, ts_to], em leituras brutas ou agregadas.
+
+    Todos os pontos têm o mesmo formato: ts, count, temp/rh (média) e
+    temp_min/temp_max/rh_min/rh_max. Com `limit`, só os primeiros `limit`
+    pontos (nenhuma consulta lê mais que isso do banco).
+    """
+    limite = -1 if limit is None else limit  # LIMIT -1: sem limite no SQLite
+    with _reader_snapshot() as conn:
+        if resolution == "raw":
+            pontos = []
+            blocos = conn.execute(
+                "SELECT node_id, data FROM archive_blocks "
+                "WHERE node_id = ? AND ts_end >= ? AND ts_start <= ?",
+                (node_id, ts_from, ts_to),
+            ).fetchall()
+            for bloco in blocos:
+                pontos.extend(islice((
+                    {"ts": r["ts"], "count": 1,
+                     "temp": r["temp"], "temp_min": r["temp"], "temp_max": r["temp"],
+                     "rh": r["rh"], "rh_min": r["rh"], "rh_max": r["rh"]}
+                    for r in _decodificar_bloco(bloco) if ts_from <= r["ts"] <= ts_to
+                ), limit))
+            for nome in _particoes_ativas(conn, ts_from, ts_to):
+                if not blocos and limit is not None and len(pontos) >= limit:
+                    break  # partições em ordem de período: o resto viria depois do corte
+                cur = conn.execute(
+                    f"SELECT ts, temp, rh FROM {nome} WHERE node_id = ? AND ts BETWEEN ? AND ? "
+                    "ORDER BY ts LIMIT ?",
+                    (node_id, ts_from, ts_to, limite),
+                )
+                pontos.extend(
+                    {"ts": r["ts"], "count": 1,
+                     "temp": r["temp"], "temp_min": r["temp"], "temp_max": r["temp"],
+                     "rh": r["rh"], "rh_min": r["rh"], "rh_max": r["rh"]}
+                    for r in cur
+                )
+            if blocos:
+                pontos.sort(key=lambda p: p["ts"])
+            return pontos[:limit]
+
+        tabela = f"rollup_{resolution}"
+        if tabela not in ROLLUPS:
+            raise ValueError(f"unknown resolution: {resolution}")
+        passo = ROLLUPS[tabela]
+        cur = conn.execute(
+            f"SELECT * FROM {tabela} WHERE node_id = ? AND bucket BETWEEN ? AND ? "
+            "ORDER BY bucket LIMIT ?",
+            (node_id, ts_from - ts_from % passo, ts_to, limite),
+        )
+        return [
+            {"ts": r["bucket"], "count": r["n"],
+             "temp": r["temp_sum"] / r["temp_n"] if r["temp_n"] else None,
+             "temp_min": r["temp_min"], "temp_max": r["temp_max"],
+             "rh": r["rh_sum"] / r["rh_n"] if r["rh_n"] else None,
+             "rh_min": r["rh_min"], "rh_max": r["rh_max"]}
+            for r in cur
+        ]
+
+
+# ---------- Histórico paginado e exportação ----------
+# Leituras em ordem de (ts, chave), onde a chave é o rowid na partição. Um ts
+# pertence a um único período, então (ts, rowid) é único. Linhas do arquivo
+# comprimido não têm rowid: a chave é (id do bloco << 16) | posição no bloco.
+# As consultas param de ler assim que o consumidor para (cursores do SQLite
+# e blocos do arquivo são lidos sob demanda), então a memória não depende do
+# tamanho do intervalo.
+Cursor = Tuple[int, int]  # (ts, chave) da última linha entregue
+
+
+def _linhas_particoes(
+    conn: sqlite3.Connection, ts_from: int, ts_to: int, node_id: Optional[str],
+    depois: Optional[Cursor],
+) -> Iterator[Tuple[Any, ...]]:
+    filtro = "ts BETWEEN ? AND ?"
+    params: List[Any] = [max(ts_from, depois[0]) if depois else ts_from, ts_to]
+    if depois:
+        filtro += " AND (ts > ? OR rowid > ?)"
+        params += list(depois)
+    if node_id is not None:
+        filtro += " AND node_id = ?"
+        params.append(node_id)
+    for nome in _particoes_ativas(conn, params[0], ts_to):
+        cur = conn.execute(
+            f"SELECT ts, rowid, node_id, packet_number, temp, rh FROM {nome} "
+            f"WHERE {filtro} ORDER BY ts, rowid",
+            params,
+        )
+        for linha in cur:
+            yield tuple(linha)
+
+
+def _linhas_arquivo(conn: sqlite3.Connection, ts_from: int, ts_to: int,
+                    node_id: Optional[str], depois: Optional[Cursor]) -> Iterator[Tuple[Any, ...]]:
+    """Intercala os blocos do arquivo por ts, abrindo cada bloco só quando necessário."""
+    inicio = max(ts_from, depois[0]) if depois else ts_from
+    sql = "SELECT id, ts_start FROM archive_blocks WHERE ts_end >= ? AND ts_start <= ?"
+    params: List[Any] = [inicio, ts_to]
+    if node_id is not None:
+        sql += " AND node_id = ?"
+        params.append(node_id)
+    blocos = conn.execute(sql + " ORDER BY ts_start, id", params).fetchall()
+
+    def abrir(bloco_id: int) -> Iterator[Tuple[Any, ...]]:
+        bloco = conn.execute(
+            "SELECT node_id, data FROM archive_blocks WHERE id = ?", (bloco_id,)
+        ).fetchone()
+        for i, r in enumerate(_decodificar_bloco(bloco)):
+            linha = (r["ts"], bloco_id << _BITS_LINHA_BLOCO | i, r["node_id"], r["packet_number"],
+                     r["temp"], r["rh"])
+            if inicio <= r["ts"] <= ts_to and (depois is None or linha[:2] > depois):
+                yield linha
+
+    heap: List[Tuple[Any, ...]] = []
+    proximo = 0
+    while True:
+        # Um bloco só entra no heap quando pode conter a menor linha pendente
+        while proximo < len(blocos) and (not heap or blocos[proximo]["ts_start"] <= heap[0][0]):
+            linhas = abrir(blocos[proximo]["id"])
+            primeira = next(linhas, None)
+            if primeira is not None:
+                heapq.heappush(heap, (primeira[0], primeira[1], primeira, linhas))
+            proximo += 1
+        if not heap:
+            return
+        _, _, linha, linhas = heapq.heappop(heap)
+        yield linha
+        seguinte = next(linhas, None)
+        if seguinte is not None:
+            heapq.heappush(heap, (seguinte[0], seguinte[1], seguinte, linhas))
+
+
+def _iterar_leituras(conn: sqlite3.Connection, ts_from: int, ts_to: int,
+                     node_id: Optional[str], depois: Optional[Cursor]) -> Iterator[Tuple[Any, ...]]:
+    """(ts, chave, node_id, packet_number, temp, rh) em ordem de (ts, chave)."""
+    return heapq.merge(
+        _linhas_particoes(conn, ts_from, ts_to, node_id, depois),
+        _linhas_arquivo(conn, ts_from, ts_to, node_id, depois),
+        key=lambda linha: linha[:2],
+    )
+
+
+def _leitura(linha: Tuple[Any, ...]) -> Dict[str, Any]:
+    return {"ts": linha[0], "node_id": linha[2], "packet_number": linha[3],
+            "temp": linha[4], "rh": linha[5]}
+
+
+@metricas.cronometrar(_DURACAO, "get_readings")
+def get_readings(ts_from: int, ts_to: int, node_id: Optional[str] = None,
+                 after: Optional[Cursor] = None, limit: int = 500
+                 ) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """Uma página de leituras em ordem crescente de ts e o cursor da próxima (ou None)."""
+    with _reader_snapshot() as conn:
+        linhas = _iterar_leituras(conn, ts_from, ts_to, node_id, after)
+        pagina = list(islice(linhas, limit + 1))
+        linhas.close()
+    proximo = pagina[limit - 1][:2] if len(pagina) > limit else None
+    return [_leitura(linha) for linha in pagina[:limit]], proximo
+
+
+def stream_readings(ts_from: int, ts_to: int, node_id: Optional[str] = None,
+                    batch: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """Todas as leituras do intervalo em listas de até `batch`, para exportação.
+
+    Usa uma conexão própria (fora do pool) com um snapshot fixo, aberta
+    enquanto o gerador estiver vivo; fechar o gerador libera a conexão.
+    """
+    conn = _open_reader()
+    try:
+        conn.execute("BEGIN")
+        linhas = _iterar_leituras(conn, ts_from, ts_to, node_id, None)
+        while True:
+            lote = [_leitura(linha) for linha in islice(linhas, batch)]
+            if not lote:
+                return
+            yield lote
+    finally:
+        conn.close()
+
+
+# ---------- Alertas ----------
+@metricas.cronometrar(_DURACAO, "save_alerts")
+def save_alerts(transitions: List[Dict[str, Any]], states: List[Tuple[str, str]]):
+    """Grava as transições do motor de alertas e o checkpoint dos nós na mesma transação."""
+    if not transitions and not states:
+        return
+    with _writer() as conn:
+        for t in transitions:
+            if t["state"] == "fired":
+                conn.execute(
+                    "INSERT INTO alerts "
+                    "(node_id, rule, metric, value, score, threshold, started_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (t["node_id"], t["rule"], t["metric"], t["value"], t["score"],
+                     t["threshold"], t["ts"]),
+                )
+            else:
+                conn.execute(
+                    "UPDATE alerts SET ended_at = ? "
+                    "WHERE node_id = ? AND rule = ? AND metric = ? AND ended_at IS NULL",
+                    (t["ts"], t["node_id"], t["rule"], t["metric"]),
+                )
+        conn.executemany(
+            "INSERT OR REPLACE INTO alert_state (node_id, state) VALUES (?, ?)", states
+        )
+
+
+@metricas.cronometrar(_DURACAO, "get_alerts")
+def get_alerts(active_only: bool = False, node_id: Optional[str] = None,
+               limit: int = 100) -> List[Dict[str, Any]]:
+    """Alertas do mais novo para o mais antigo; ended_at é None enquanto ativo."""
+    sql = "SELECT * FROM alerts WHERE 1"
+    params: List[Any] = []
+    if active_only:
+        sql += " AND ended_at IS NULL"
+    if node_id is not None:
+        sql += " AND node_id = ?"
+        params.append(node_id)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    with _reader() as conn:
+        return [dict(r) for r in conn.execute(sql, params)]
+
+
+def load_alert_state() -> Dict[str, str]:
+    with _reader() as conn:
+        return {r["node_id"]: r["state"] for r in conn.execute("SELECT * FROM alert_state")}
+
+
+# ---------- Enlace ----------
+_LINK_SOMAS = (
+    "SUM(received) AS received, SUM(expected) AS expected, SUM(lost) AS lost, "
+    "SUM(late) AS late, SUM(gaps) AS gaps, MAX(max_gap) AS max_gap, "
+    "SUM(duplicates) AS duplicates, SUM(resets) AS resets, SUM(iat_sum) AS iat_sum, "
+    "SUM(iat_n) AS iat_n, MIN(iat_min) AS iat_min, MAX(iat_max) AS iat_max"
+)
+
+
+def _indicadores_enlace(r: Dict[str, Any]) -> Dict[str, Any]:
+    """Acrescenta as taxas derivadas dos contadores somados de link_1h."""
+    esperadas = r["expected"]
+    perdidas = max(r["lost"] - r["late"], 0)
+    r["loss_rate"] = round(perdidas / esperadas, 4) if esperadas else None
+    r["pdr"] = round(1 - perdidas / esperadas, 4) if esperadas else None
+    r["iat_mean"] = round(r["iat_sum"] / r["iat_n"], 2) if r["iat_n"] else None
+    return r
+
+
+@metricas.cronometrar(_DURACAO, "get_link_stats")
+def get_link_stats(ts_from: int, ts_to: int, node_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Totais de enlace por nó nas horas que tocam [ts_from, ts_to], com o estado atual."""
+    sql = (
+        f"SELECT l.node_id, {_LINK_SOMAS}, MAX(s.max_packet) AS max_packet, "
+        "MAX(s.last_ts) AS last_ts "
+        "FROM link_1h l LEFT JOIN link_state s ON s.node_id = l.node_id "
+        "WHERE l.bucket BETWEEN ? AND ?"
+    )
+    params: List[Any] = [ts_from - ts_from % LINK_BUCKET, ts_to]
+    if node_id is not None:
+        sql += " AND l.node_id = ?"
+        params.append(node_id)
+    sql += " GROUP BY l.node_id ORDER BY l.node_id"
+    with _reader() as conn:
+        return [_indicadores_enlace(dict(r)) for r in conn.execute(sql, params)]
+
+
+@metricas.cronometrar(_DURACAO, "get_link_buckets")
+def get_link_buckets(node_id: str, ts_from: int, ts_to: int) -> List[Dict[str, Any]]:
+    """Contadores hora a hora de um nó (para gráficos de perda ao longo do tempo)."""
+    with _reader() as conn:
+        return [
+            _indicadores_enlace(dict(r)) for r in conn.execute(
+                "SELECT * FROM link_1h WHERE node_id = ? AND bucket BETWEEN ? AND ? "
+                "ORDER BY bucket",
+                (node_id, ts_from - ts_from % LINK_BUCKET, ts_to),
+            )
+        ]
@@ -0,0 +1,35 @@
+"""
+Configuração dos testes.
+
+Os módulos de src/ usam imports planos (import storage), como quando rodam
+a partir do próprio diretório; aqui os diretórios entram no sys.path.
+"""
+
+import os
+import sys
+
+import pytest
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+for _sub in ("compartilhado", "gateway", "servidor"):  # servidor fica na frente
+    _caminho = os.path.join(SRC, _sub)
+    if _caminho not in sys.path:
+        sys.path.insert(0, _caminho)
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """storage apontando para um banco novo, já migrado para a versão atual."""
+    import storage
+
+    storage.close_connections()
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "dados.db"))
+    storage.init_db()
+    storage.migrate_db()
+    yield storage
+    storage.close_connections()
+
+
+def leitura(node_id, pacote, ts, temp=20.0, rh=50.0, **extra):
+    return {"ts": ts, "node_id": node_id, "packet_number": pacote, "temp": temp, "rh": rh,
+            **extra}
@@ -0,0 +1,88 @@
+import agregacao
+import pytest
+
+HORA = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+@pytest.fixture
+def servidor(banco):
+    import servidor
+
+    return servidor
+
+
+def _leituras(inicio, fim, passo=10):
+    """Uma leitura a cada `passo` s, com a temperatura oscilando dentro da banda morta."""
+    return [
+        {"ts": ts, "node_id": "A", "packet_number": i, "t": 20.0 + (i % 3) / 10, "rh": 50.0}
+        for i, ts in enumerate(range(inicio, fim, passo), start=1)
+    ]
+
+
+def _agregar(leituras, **opcoes):
+    registros = []
+    agregador = agregacao.Agregador(registros.append, deadband=(0.5, 2.0), por_no={}, **opcoes)
+    for leitura in leituras:
+        agregador.adicionar(leitura)
+    agregador.esvaziar()
+    return registros
+
+
+def _gravar(servidor, registros):
+    for registro in registros:
+        assert servidor.validar_leitura(registro) is None
+    servidor.storage.insert_many([servidor._item_para_linha(r) for r in registros])
+
+
+@pytest.mark.parametrize("janela_s", [0, 20, 120])
+def test_rollups_com_resumos_iguais_aos_das_leituras(servidor, banco, janela_s):
+    leituras = _leituras(HORA + 600, HORA + 1200)
+    registros = _agregar(leituras, janela_s=janela_s, heartbeat_s=300)
+    assert len(registros) < len(leituras) / 5
+    assert any("parts" in r["summary"] for r in registros)  # resumos de vários minutos
+    _gravar(servidor, registros)
+
+    serie = banco.get_series("A", HORA, HORA + 3599, "1m")
+    esperado = {}
+    for leitura in leituras:
+        ponto = esperado.setdefault(leitura["ts"] - leitura["ts"] % 60, [0, 0.0])
+        ponto[0] += 1
+        ponto[1] += leitura["t"]
+    assert [p["ts"] for p in serie] == sorted(esperado)
+    for p in serie:
+        n, soma = esperado[p["ts"]]
+        assert p["count"] == n
+        assert p["temp"] == pytest.approx(soma / n)
+    (hora,) = banco.get_series("A", HORA, HORA + 3599, "1h")
+    assert hora["count"] == len(leituras)
+
+
+def test_resumo_nao_cobre_duas_horas(servidor, banco):
+    leituras = _leituras(HORA - 1800, HORA + 1800)
+    registros = _agregar(leituras, janela_s=0, heartbeat_s=10_000)
+    for registro in registros:
+        partes = registro["summary"].get("parts", [registro])
+        assert len({p["ts"] // 3600 for p in partes}) == 1
+    _gravar(servidor, registros)
+    contagens = [p["count"] for p in banco.get_series("A", HORA - 3600, HORA + 3599, "1h")]
+    assert contagens == [180, 180]
+
+
+def test_leituras_seguradas_saem_na_virada_da_hora():
+    registros = []
+    agregador = agregacao.Agregador(registros.append, janela_s=0, deadband=(0.5, 2.0),
+                                    por_no={}, heartbeat_s=10_000)
+    for leitura in _leituras(HORA - 600, HORA - 60):
+        agregador.adicionar(leitura)
+        agregador.vencer(leitura["ts"])
+    assert len(registros) == 1  # só a primeira; o resto está segurado
+    agregador.vencer(HORA)
+    assert sum(r["summary"]["n"] for r in registros) == 54
+    agregador.esvaziar()
+    assert len(registros) == 2
+
+
+def test_partes_precisam_somar_o_total(servidor):
+    registro = _agregar(_leituras(HORA, HORA + 300), janela_s=0, heartbeat_s=300)[-1]
+    registro["summary"]["parts"][0]["n"] += 1
+    assert servidor.validar_leitura(registro) == "summary.parts must add up to summary.n"
@@ -0,0 +1,114 @@
+import json
+
+import alertas
+import pytest
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def motor():
+    alertas.limpar()
+    yield
+    alertas.limpar()
+
+
+def _linhas(temps, node_id="A", passo=60, inicio=T0, rh=50.0):
+    return [{"ts": inicio + passo * i, "node_id": node_id, "temp": t, "rh": rh}
+            for i, t in enumerate(temps)]
+
+
+def _regras(transicoes, estado="fired"):
+    return [(t["rule"], t["metric"]) for t in transicoes if t["state"] == estado]
+
+
+def _ruido(n):
+    """Temperatura estável com a oscilação de 1 °C típica do DHT11."""
+    return [20.0 + (i % 3 == 0) for i in range(n)]
+
+
+def test_limites_disparam_e_resolvem():
+    transicoes = alertas.avaliar(_linhas([20.0, 55.0, 56.0, 20.0], passo=3600))
+    assert [(t["state"], t["rule"], t["ts"]) for t in transicoes] == [
+        ("fired", "threshold_high", T0 + 3600), ("resolved", "threshold_high", T0 + 10_800),
+    ]
+    assert alertas.ativos() == 0
+
+
+def test_limite_vazio_desliga_a_regra(monkeypatch):
+    monkeypatch.setitem(alertas.LIMITES, "rh", (None, None))
+    assert alertas.avaliar(_linhas([20.0], rh=99.0)) == []
+
+
+def test_taxa_usa_no_minimo_um_minuto():
+    # 1 °C em 5 s seria 12 °C/min; com o piso de 60 s fica em 1 °C/min
+    assert alertas.avaliar(_linhas([20.0, 21.0, 20.0], passo=5)) == []
+    transicoes = alertas.avaliar(_linhas([27.0], inicio=T0 + 70))
+    (disparo,) = transicoes
+    assert (disparo["rule"], disparo["score"], disparo["threshold"]) == ("rate", 7.0, 5.0)
+
+
+def test_zscore_depois_das_amostras_minimas():
+    base = _ruido(alertas.MIN_AMOSTRAS)
+    assert alertas.avaliar(_linhas(base)) == []
+    fim = T0 + 60 * len(base)
+    # Subida lenta (abaixo da taxa) até bem longe da média
+    transicoes = alertas.avaliar(_linhas([24.0, 28.0, 32.0], inicio=fim + 3600, passo=3600))
+    assert ("zscore", "temp") in _regras(transicoes)
+    assert ("rate", "temp") not in _regras(transicoes)
+
+
+def test_zscore_respeita_o_desvio_minimo():
+    # Série constante: variância 0, mas 1 °C a mais não é anomalia
+    alertas.avaliar(_linhas([20.0] * alertas.MIN_AMOSTRAS))
+    transicoes = alertas.avaliar(_linhas([21.0], inicio=T0 + 3600))
+    assert ("zscore", "temp") not in _regras(transicoes)
+
+
+def test_valor_preso(monkeypatch):
+    monkeypatch.setattr(alertas, "REPETICOES", 5)
+    transicoes = alertas.avaliar(_linhas([20.0] * 5 + [21.0]))
+    assert _regras(transicoes) == [("stuck", "temp"), ("stuck", "rh")]
+    assert _regras(transicoes, "resolved") == [("stuck", "temp")]
+
+
+def test_fora_de_ordem_so_passa_pelos_limites(monkeypatch):
+    monkeypatch.setattr(alertas, "REPETICOES", 2)
+    alertas.avaliar(_linhas([20.0], inicio=T0 + 600))
+    transicoes = alertas.avaliar(_linhas([20.0, 60.0], inicio=T0))
+    assert _regras(transicoes) == [("threshold_high", "temp")]
+
+
+def test_checkpoint_continua_de_onde_parou():
+    leituras = _linhas(_ruido(60) + [40.0, 20.0] + _ruido(20), node_id="B")
+    continuo = alertas.avaliar(leituras)
+
+    alertas.limpar()
+    antes = alertas.avaliar(leituras[:45])
+    salvo = dict(alertas.estados(["B", "inexistente"]))
+    assert list(salvo) == ["B"]
+    alertas.limpar()
+    alertas.carregar(json.loads(json.dumps(salvo)))  # ida e volta pelo banco
+    assert antes + alertas.avaliar(leituras[45:]) == continuo
+
+
+def test_transicoes_gravadas_e_checkpoint_no_banco(banco):
+    import servidor
+
+    linhas = [servidor._item_para_linha({"ts": T0 + 3600 * i, "node_id": "A",
+                                         "packet_number": i + 1, "t": t, "rh": 50.0})
+              for i, t in enumerate([20.0, 60.0])]
+    servidor._avaliar_alertas(banco.insert_many(linhas))
+    (ativo,) = banco.get_alerts(active_only=True)
+    assert (ativo["rule"], ativo["started_at"], ativo["ended_at"]) == (
+        "threshold_high", T0 + 3600, None)
+
+    # Reinício: o motor volta do checkpoint e resolve o alerta aberto
+    alertas.limpar()
+    alertas.carregar(banco.load_alert_state())
+    servidor._avaliar_alertas(banco.insert_many(
+        [servidor._item_para_linha({"ts": T0 + 7200, "node_id": "A", "packet_number": 3,
+                                    "t": 20.0, "rh": 50.0})]))
+    assert banco.get_alerts(active_only=True) == []
+    (encerrado,) = banco.get_alerts()
+    assert encerrado["ended_at"] == T0 + 7200
@@ -0,0 +1,96 @@
+import math
+import zlib
+
+import arquivo
+import pytest
+
+T0 = 1_700_000_000
+
+
+def _linhas(temps, rhs=None, ts=None, pacotes=None):
+    n = len(temps)
+    ts = ts or [T0 + 60 * i for i in range(n)]
+    pacotes = pacotes or list(range(1, n + 1))
+    rhs = rhs or [50.0] * n
+    return [{"ts": t, "packet_number": p, "temp": temp, "rh": rh}
+            for t, p, temp, rh in zip(ts, pacotes, temps, rhs, strict=True)]
+
+
+def _ida_e_volta(linhas):
+    decodificadas = arquivo.decodificar(arquivo.codificar(linhas))
+    assert decodificadas == linhas
+    return decodificadas
+
+
+@pytest.mark.parametrize("v", [0, 1, -1, 63, -64, 2**31, -(2**31), 2**62, -(2**63)])
+def test_zigzag(v):
+    u = arquivo._zigzag(v)
+    assert u >= 0
+    assert arquivo._unzigzag(u) == v
+
+
+@pytest.mark.parametrize("u", [0, 1, 127, 128, 16_383, 16_384, 2**64 - 1])
+def test_varint(u):
+    buf = bytearray()
+    arquivo._put_varint(buf, u)
+    assert len(buf) == max(1, math.ceil(u.bit_length() / 7))
+    assert arquivo._get_varint(bytes(buf) + b"\xff", 0) == (u, len(buf))
+
+
+def test_bloco_vazio():
+    assert arquivo.decodificar(arquivo.codificar([])) == []
+
+
+def test_uma_leitura():
+    _ida_e_volta(_linhas([21.5]))
+
+
+@pytest.mark.parametrize("temps, escala", [
+    ([20.0, 21.0, -5.0], 0),
+    ([20.1, 20.2, -40.3], 1),
+    ([20.12, 19.99, 0.01], 2),
+    ([20.125, -0.001, 85.999], 3),
+])
+def test_ponto_fixo(temps, escala):
+    assert arquivo._escala(temps) == escala
+    _ida_e_volta(_linhas(temps))
+
+
+def test_xor_quando_nenhuma_escala_serve():
+    temps = [20.1234, math.pi, -1e-9, 1e300, -0.0, 5e-324]
+    assert arquivo._escala(temps) is None
+    decodificadas = _ida_e_volta(_linhas(temps))
+    # Bit a bit: -0.0 continua negativo e o subnormal não vira zero
+    assert math.copysign(1, decodificadas[4]["temp"]) == -1
+    assert decodificadas[5]["temp"] == 5e-324
+
+
+def test_nulos_nas_colunas():
+    linhas = _linhas([None, 20.5, None, None, 21.0, None, 20.0, None, 19.5],
+                     rhs=[None] * 9)
+    linhas[3]["packet_number"] = None
+    _ida_e_volta(linhas)
+
+
+def test_coluna_so_de_nulos_com_escala_e_xor_misturadas():
+    _ida_e_volta(_linhas([None, None], rhs=[math.e, None]))
+
+
+def test_ts_irregular_e_pacotes_que_voltam():
+    ts = [T0, T0 + 60, T0 + 60, T0 + 3600, T0 + 10, 0, 2**40]
+    pacotes = [5, 6, 1, 2**32 - 1, 0, 7, 3]
+    _ida_e_volta(_linhas([20.0] * len(ts), ts=ts, pacotes=pacotes))
+
+
+def test_intervalo_regular_comprime():
+    linhas = _linhas([20.0 + (i % 5) / 10 for i in range(1000)])
+    blob = arquivo.codificar(linhas)
+    assert len(blob) < 1000 * 2
+    assert arquivo.decodificar(blob) == linhas
+
+
+def test_versao_desconhecida_e_recusada():
+    dados = bytearray(zlib.decompress(arquivo.codificar(_linhas([20.0]))))
+    dados[0] = arquivo.VERSAO + 1
+    with pytest.raises(ValueError, match="versão"):
+        arquivo.decodificar(zlib.compress(bytes(dados)))
@@ -0,0 +1,58 @@
+import struct
+
+import binario
+import pytest
+
+T0 = 1_700_000_000
+
+LEITURAS = [
+    ("A", 1, T0, 21.37, 55.0),
+    ("B", 2**32 - 1, T0 + 1, -40.0, None),
+    ("A", 3, 2**32 - 1, None, 100.0),
+    ("nó-ç", 0, 0, 327.67, -327.67),
+]
+
+
+def test_ida_e_volta():
+    corpo = binario.codificar(LEITURAS)
+    esperado = [(ts, no, pacote, temp, rh) for no, pacote, ts, temp, rh in LEITURAS]
+    assert binario.decodificar(corpo) == esperado
+    # Cada nó aparece uma vez na tabela de nós; cada registro tem tamanho fixo
+    assert len(corpo) == 10 + (1 + 1) * 2 + 1 + len("nó-ç".encode()) + 14 * len(LEITURAS)
+
+
+def test_lote_vazio():
+    assert binario.decodificar(binario.codificar([])) == []
+
+
+@pytest.mark.parametrize("corte", [3, 11, 20, -1])
+def test_corpo_truncado(corte):
+    corpo = binario.codificar(LEITURAS)
+    with pytest.raises(ValueError):
+        binario.decodificar(corpo[:corte])
+
+
+def test_versao_diferente_e_recusada():
+    corpo = bytearray(binario.codificar(LEITURAS))
+    corpo[2] = binario.VERSAO + 1
+    with pytest.raises(ValueError, match="cabeçalho"):
+        binario.decodificar(bytes(corpo))
+
+
+def test_registro_com_no_inexistente():
+    corpo = binario.codificar([("A", 1, T0, 20.0, 50.0)])
+    corpo = corpo[:-14] + struct.pack("<HIIhh", 5, T0, 1, 2000, 5000)
+    with pytest.raises(ValueError, match="nó inexistente"):
+        binario.decodificar(corpo)
+
+
+@pytest.mark.parametrize("leitura", [
+    ("A", 1, T0, 327.68, None),        # temperatura fora da faixa de centésimos
+    ("A", 2**32, T0, 20.0, 50.0),      # packet_number não cabe em 32 bits
+    ("A", 1, -1, 20.0, 50.0),          # ts negativo
+    ("", 1, T0, 20.0, 50.0),           # node_id vazio
+    ("x" * 65, 1, T0, 20.0, 50.0),     # node_id longo demais
+])
+def test_campos_fora_do_formato(leitura):
+    with pytest.raises(ValueError):
+        binario.codificar([leitura])
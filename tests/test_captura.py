@@ -0,0 +1,39 @@
+import captura
+from dedupe import JanelaDedupe
+
+T0 = 1_700_000_000
+
+
+def test_ts_segue_o_instante_gravado():
+    relogio = captura.Relogio(inicio=T0)
+    assert [relogio.ts(100.0 + d, "A", p) for p, d in enumerate([0, 0.4, 5.2, 60.9], 1)] == [
+        T0, T0, T0 + 5, T0 + 60]
+
+
+def test_ts_nao_volta_por_no():
+    relogio = captura.Relogio(inicio=T0)
+    assert relogio.ts(100.0, "A", 1) == T0
+    assert relogio.ts(110.0, "A", 2) == T0 + 10
+    assert relogio.ts(105.0, "A", 3) == T0 + 10  # relógio da captura ajustado para trás
+    assert relogio.ts(106.0, "B", 1) == T0 + 6
+
+
+def test_reinicio_na_captura_passa_pela_deduplicacao():
+    # Um segundo de captura: 1..5, o transmissor reinicia, 1..3 e uma retransmissão do 3
+    eventos = [(100.0 + i / 10, "A", p) for i, p in enumerate([1, 2, 3, 4, 5, 1, 2, 3, 3])]
+    relogio = captura.Relogio(inicio=T0)
+    janela = JanelaDedupe()
+    aceitos = []
+    for instante, no, pacote in eventos:
+        ts = relogio.ts(instante, no, pacote)
+        if janela.registrar(no, pacote, ts):
+            aceitos.append((pacote, ts))
+    assert aceitos == [(1, T0), (2, T0), (3, T0), (4, T0), (5, T0),
+                       (1, T0 + 1), (2, T0 + 1), (3, T0 + 1)]
+
+
+def test_reproduzir_entrega_o_instante():
+    recebidos = []
+    eventos = [(100.0, "p", "A,1,20.0,50.0"), (101.5, "p", "A,2,20.0,50.0")]
+    assert captura.reproduzir(eventos, 0, lambda *args: recebidos.append(args)) == 2
+    assert recebidos == [("A,1,20.0,50.0", "p", 100.0), ("A,2,20.0,50.0", "p", 101.5)]
@@ -0,0 +1,143 @@
+import email.message
+import gzip
+import re
+import time
+
+import dashboard
+import pytest
+from conftest import leitura
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture
+def servidor(banco, monkeypatch):
+    import servidor
+
+    servidor.cache.carregar()
+    servidor._PAGINAS.clear()
+    yield servidor
+    servidor._PAGINAS.clear()
+    servidor.cache.limpar()
+
+
+def _get(servidor, path="/", **headers):
+    h = email.message.Message()
+    for nome, valor in headers.items():
+        h[nome.replace("_", "-")] = valor
+    return servidor.rota_dashboard(servidor.Requisicao("GET", path, {}, h))
+
+
+def test_resumo_do_enlace_vem_do_cache(servidor, banco, monkeypatch):
+    agora = int(time.time())
+    monkeypatch.setattr(servidor.cache, "LINK_REFRESH_S", 0)
+    servidor._aplicar_gravadas(banco.insert_many(
+        [leitura("sensor-7", p, agora - 100 + p) for p in (1, 2, 4)]
+    ))
+
+    def consulta(*args, **kwargs):
+        raise AssertionError("o dashboard não deve consultar o SQLite")
+
+    monkeypatch.setattr(banco, "get_link_stats", consulta)
+    corpo = _get(servidor).content.decode()
+    assert "<td>sensor-7</td><td>3 / 4</td><td>75.0 %</td>" in corpo
+
+
+def test_resumo_do_enlace_e_relido_no_maximo_a_cada_intervalo(servidor, banco, monkeypatch):
+    agora = int(time.time())
+    monkeypatch.setattr(servidor.cache, "LINK_REFRESH_S", 3600)
+    servidor.cache.atualizar_enlace(forcar=True)
+    servidor._aplicar_gravadas(banco.insert_many([leitura("A", 1, agora)]))
+    assert servidor.cache.snapshot()["link"] == []
+    servidor.cache.atualizar_enlace(forcar=True)
+    assert [n["node_id"] for n in servidor.cache.snapshot()["link"]] == ["A"]
+
+
+def _pontos(n):
+    return [(T0 + 60 * i, 20.0 + (i % 7) / 10) for i in range(n)]
+
+
+@pytest.mark.parametrize("n, limite", [(0, 10), (2, 10), (10, 10), (10, 2), (500, 3)])
+def test_lttb_devolve_a_serie_quando_nao_ha_o_que_reduzir(n, limite):
+    pontos = _pontos(n)
+    if n <= limite or limite < 3:
+        assert dashboard._lttb(pontos, limite) is pontos
+    else:
+        assert len(dashboard._lttb(pontos, limite)) == limite
+
+
+@pytest.mark.parametrize("limite", [3, 50, 199, 200])
+def test_lttb_reduz_ao_limite_mantendo_as_pontas(limite):
+    pontos = _pontos(1000)
+    reduzidos = dashboard._lttb(pontos, limite)
+    assert len(reduzidos) == limite
+    assert (reduzidos[0], reduzidos[-1]) == (pontos[0], pontos[-1])
+    assert all(p in pontos for p in reduzidos)
+    assert [p[0] for p in reduzidos] == sorted({p[0] for p in reduzidos})  # sem repetir
+
+
+def test_lttb_preserva_um_pico_isolado():
+    pontos = [(T0 + i, 20.0) for i in range(1000)]
+    pontos[617] = (T0 + 617, 35.0)
+    assert (T0 + 617, 35.0) in dashboard._lttb(pontos, 20)
+
+
+def test_grafico_tem_no_maximo_o_orcamento_de_pontos():
+    recent = [{"ts": ts, "temp": v} for ts, v in _pontos(5000)]
+    svg = dashboard._build_timeseries_svg(recent, "temp", max_pontos=100)
+    area, linha = re.findall(r'points="([^"]*)"', svg)
+    assert len(linha.split()) == 100
+    assert len(area.split()) == 102  # a área fecha nos dois cantos de baixo
+
+
+def test_etag_e_304(servidor):
+    primeira = _get(servidor)
+    assert primeira.code == 200
+    etag = primeira.headers["ETag"]
+    assert primeira.headers["Vary"] == "Accept-Encoding"
+
+    resposta = _get(servidor, If_None_Match=etag)
+    assert (resposta.code, resposta.content) == (304, b"")
+    assert resposta.headers["ETag"] == etag
+    assert _get(servidor, If_None_Match=f'"outro", W/{etag}').code == 304
+    assert _get(servidor, If_None_Match="*").code == 304
+    assert _get(servidor, If_None_Match='"outro"').code == 200
+
+
+def test_pagina_reaproveitada_ate_os_dados_mudarem(servidor, banco):
+    etag = _get(servidor).headers["ETag"]
+    assert _get(servidor).headers["ETag"] == etag
+    servidor._aplicar_gravadas(banco.insert_many([leitura("A", 1, int(time.time()))]))
+    resposta = _get(servidor, If_None_Match=etag)
+    assert resposta.code == 200
+    assert resposta.headers["ETag"] != etag
+
+
+def test_gzip_quando_o_cliente_aceita(servidor):
+    normal = _get(servidor)
+    comprimida = _get(servidor, Accept_Encoding="br, gzip")
+    assert "Content-Encoding" not in normal.headers
+    assert comprimida.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(comprimida.content) == normal.content
+    assert len(comprimida.content) < len(normal.content)
+    # O ETag da versão comprimida é outro: um não valida o outro
+    assert comprimida.headers["ETag"] != normal.headers["ETag"]
+    assert _get(servidor, If_None_Match=normal.headers["ETag"],
+                Accept_Encoding="gzip").code == 200
+
+
+def test_corpo_pequeno_nao_e_comprimido(servidor):
+    corpo = servidor.preparar_corpo("x", b"{}")
+    assert corpo.gz is None
+    req = servidor.Requisicao("GET", "/", {}, {"Accept-Encoding": "gzip"})
+    resposta = servidor.resposta_cacheavel(req, corpo, "application/json")
+    assert (resposta.content, resposta.headers["ETag"]) == (b"{}", '"x"')
+
+
+def test_estaticos_com_cache_longo(servidor):
+    for path in servidor.dashboard.STATIC_FILES:
+        req = servidor.Requisicao("GET", path, {}, email.message.Message())
+        resposta = servidor.rota_static(req)
+        assert resposta.code == 200
+        assert "immutable" in resposta.headers["Cache-Control"]
+        assert resposta.headers["ETag"] == f'"{servidor.dashboard.ASSETS_VERSION}"'
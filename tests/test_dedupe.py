@@ -0,0 +1,55 @@
+from dedupe import JanelaDedupe
+
+T0 = 1_700_000_000
+
+
+def _aceitos(janela, pacotes, ts0, no="A"):
+    return [p for i, p in enumerate(pacotes) if janela.registrar(no, p, ts0 + 5 * i)]
+
+
+def test_repeticoes_e_fora_de_ordem():
+    janela = JanelaDedupe(tamanho=64)
+    # (pacote, ts): as cópias trazem o ts da recepção original
+    chegadas = [(1, T0), (2, T0 + 5), (4, T0 + 15), (3, T0 + 16), (3, T0 + 16), (2, T0 + 5),
+                (5, T0 + 20)]
+    assert [p for p, ts in chegadas if janela.registrar("A", p, ts)] == [1, 2, 4, 3, 5]
+
+
+def test_reinicio_do_contador_dentro_da_janela():
+    janela = JanelaDedupe()
+    assert len(_aceitos(janela, range(1, 301), T0)) == 300
+    # Transmissor perdeu a memória RTC: volta a contar de 1 depois do pacote 300
+    depois = T0 + 5 * 300 + 60
+    assert _aceitos(janela, range(1, 8), depois) == list(range(1, 8))
+    assert not janela.registrar("A", 3, depois + 10)  # cópia do pacote 3 novo
+    # Uma cópia de antes do reinício acima do novo maior passa; o banco a barra
+    assert janela.registrar("A", 250, T0 + 5 * 249)
+
+
+def test_consulta_e_marcacao_separadas_veem_o_reinicio():
+    janela = JanelaDedupe()
+    for p in range(1, 11):
+        janela.marcar("A", p, T0 + p)
+    assert janela.duplicado("A", 2, T0 + 2)
+    assert not janela.duplicado("A", 2, T0 + 100)
+    janela.marcar("A", 1, T0 + 100)
+    assert janela.estado() == {"A": 1}
+
+
+def test_sem_ts_o_reinicio_exige_pacotes_atras_da_janela():
+    janela = JanelaDedupe(tamanho=16)
+    for p in range(1, 101):
+        janela.marcar("A", p)
+    assert janela.duplicado("A", 95)
+    assert [janela.registrar("A", p) for p in (1, 2, 3, 4)] == [True, True, True, True]
+    assert janela.estado() == {"A": 4}
+    assert janela.duplicado("A", 3)
+
+
+def test_desmarcar():
+    janela = JanelaDedupe()
+    janela.marcar("A", 5, T0)
+    janela.marcar("A", 6, T0 + 5)
+    janela.desmarcar("A", 5)
+    assert not janela.duplicado("A", 5, T0)
+    assert janela.duplicado("A", 6, T0 + 5)
@@ -0,0 +1,103 @@
+import sqlite3
+
+import diario
+import pytest
+
+T0 = 1_700_000_000
+
+
+def _item(pacote, ts=T0):
+    return {"ts": ts + pacote, "node_id": "A", "packet_number": pacote, "t": 20.0, "rh": 50.0}
+
+
+def test_diario_recupera_so_o_que_nao_foi_confirmado(tmp_path):
+    d = diario.Diario(str(tmp_path), segment_bytes=200)  # vários segmentos
+    seqs = [d.anexar(_item(i)) for i in range(1, 11)]
+    d.confirmar(seqs[5])
+    d.close()
+
+    d = diario.Diario(str(tmp_path), segment_bytes=200)
+    assert [item["packet_number"] for _, item in d.recuperar()] == [7, 8, 9, 10]
+    assert d.anexar(_item(11)) == seqs[-1] + 1  # a numeração continua depois da reabertura
+    d.close()
+
+
+def test_diario_ignora_registro_truncado(tmp_path):
+    d = diario.Diario(str(tmp_path))
+    d.anexar(_item(1))
+    d.anexar(_item(2))
+    d.close()
+    (segmento,) = tmp_path.glob("*.log")
+    segmento.write_bytes(segmento.read_bytes()[:-5])  # queda no meio da escrita
+
+    d = diario.Diario(str(tmp_path))
+    assert [item["packet_number"] for _, item in d.recuperar()] == [1]
+    d.close()
+
+
+@pytest.fixture
+def servidor(banco, monkeypatch):
+    import servidor
+
+    servidor.DEDUPE.limpar()
+    monkeypatch.setattr(servidor, "PERSIST_RETRY_MIN_S", 0.001)
+    monkeypatch.setattr(servidor.time, "sleep", lambda s: None)
+    yield servidor
+    servidor.DEDUPE.limpar()
+
+
+def _banco_travado(monkeypatch, storage, falhas):
+    """insert_many/insert_reading falham com "database is locked" `falhas` vezes."""
+    restantes = [falhas]
+    for nome in ("insert_many", "insert_reading"):
+        original = getattr(storage, nome)
+
+        def falhar(*args, _original=original, **kwargs):
+            if restantes[0] > 0:
+                restantes[0] -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(storage, nome, falhar)
+
+
+def test_falha_do_banco_nao_descarta_o_lote(servidor, monkeypatch):
+    _banco_travado(monkeypatch, servidor.storage, falhas=1)
+    with pytest.raises(sqlite3.OperationalError):
+        servidor._gravar_lote([_item(1), _item(2)])
+    assert servidor.storage.count_rows() == 0
+
+
+def test_lote_e_regravado_depois_da_falha_e_a_dedupe_desfeita(servidor, monkeypatch):
+    itens = [_item(1), _item(2)]
+    for item in itens:
+        servidor.DEDUPE.marcar("A", item["packet_number"])
+
+    estados = []
+    original = servidor.persistir_lote
+
+    def persistir(*args):
+        # Durante a falha a retransmissão precisa ser aceita de novo
+        estados.append(servidor.DEDUPE.duplicado("A", 1))
+        return original(*args)
+
+    monkeypatch.setattr(servidor, "persistir_lote", persistir)
+    _banco_travado(monkeypatch, servidor.storage, falhas=3)
+    gravadas, descartadas = servidor._persistir_com_retentativa(itens, {}, parar=False)
+
+    assert (len(gravadas), descartadas) == (2, 0)
+    assert servidor.storage.count_rows() == 2
+    assert estados == [True, False, False, False]
+    assert servidor.DEDUPE.duplicado("A", 1) and servidor.DEDUPE.duplicado("A", 2)
+
+
+def test_parada_com_o_banco_fora_do_ar_mantem_o_lote(servidor, monkeypatch):
+    _banco_travado(monkeypatch, servidor.storage, falhas=10)
+    assert servidor._persistir_com_retentativa([_item(1)], {}, parar=True) is None
+    assert servidor.storage.count_rows() == 0
+
+
+def test_leitura_invalida_no_lote_nao_derruba_as_validas(servidor):
+    gravadas, descartadas = servidor._gravar_lote([dict(_item(1), t="abc"), _item(2)])
+    assert ([r["packet_number"] for r in gravadas], descartadas) == ([2], 1)
+    assert [r["packet_number"] for r in servidor.storage.get_last_readings()] == [2]
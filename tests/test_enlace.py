@@ -0,0 +1,45 @@
+from conftest import leitura
+
+T0 = 1_700_000_000
+
+
+def _no(banco, node_id="A"):
+    (stats,) = banco.get_link_stats(T0, T0 + 86_400, node_id)
+    return stats
+
+
+def test_reinicio_do_contador_conta_como_reset_e_nao_como_perda(banco):
+    banco.insert_many([leitura("A", p, T0 + 5 * p) for p in range(1, 2001)])
+    reinicio = T0 + 5 * 2001 + 60
+    banco.insert_many([leitura("A", p, reinicio + 5 * p) for p in range(1, 8)])
+
+    stats = _no(banco)
+    assert (stats["received"], stats["expected"], stats["lost"]) == (2007, 2007, 0)
+    assert (stats["resets"], stats["duplicates"], stats["late"]) == (1, 0, 0)
+    assert stats["pdr"] == 1.0
+    assert stats["max_packet"] == 7
+
+
+def test_perda_e_atraso_depois_do_reset(banco):
+    banco.insert_many([leitura("A", p, T0 + 5 * p) for p in range(1, 11)])
+    reinicio = T0 + 600
+    # Depois do reinício: 1, 2, 5 (perdeu 3 e 4), o 3 chega atrasado e o 2 repete
+    banco.insert_many([leitura("A", p, reinicio + 5 * p) for p in (1, 2, 5)])
+    banco.insert_many([leitura("A", 3, reinicio + 15)])
+    banco.insert_many([leitura("A", 2, reinicio + 10)])
+    # Cópia atrasada de antes do reinício: já gravada
+    banco.insert_many([leitura("A", 9, T0 + 45)])
+
+    stats = _no(banco)
+    assert stats["resets"] == 1
+    assert stats["received"] == 14
+    assert (stats["expected"], stats["lost"], stats["late"]) == (15, 2, 1)
+    assert stats["duplicates"] == 2
+
+
+def test_reset_no_mesmo_lote(banco):
+    lote = [leitura("A", p, T0 + 5 * p) for p in range(1, 6)]
+    lote += [leitura("A", p, T0 + 100 + 5 * p) for p in range(1, 4)]
+    assert len(banco.insert_many(lote)) == 8
+    stats = _no(banco)
+    assert (stats["received"], stats["expected"], stats["resets"]) == (8, 8, 1)
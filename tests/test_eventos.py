@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import eventos
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def sem_assinantes():
+    yield
+    assert eventos.assinantes() == 0  # todo fluxo encerrado cancela a assinatura
+
+
+def _evento(msg):
+    evento, dados = msg.decode().removesuffix("\n\n").split("\n")
+    return evento.removeprefix("event: "), json.loads(dados.removeprefix("data: "))
+
+
+def test_formatar():
+    msg = eventos.formatar("readings", {"node": "nó", "t": 20.5})
+    assert msg == 'event: readings\ndata: {"node":"nó","t":20.5}\n\n'.encode()
+
+
+def test_publicar_sem_assinantes_nao_serializa(monkeypatch):
+    def formatar(*args):
+        raise AssertionError("nada a serializar")
+
+    monkeypatch.setattr(eventos, "formatar", formatar)
+    assert not eventos.tem_assinantes()
+    eventos.publicar("readings", {})
+
+
+def test_fluxo_com_threads():
+    fluxo = iter(eventos.Fluxo(heartbeat=0.05))
+    assert next(fluxo) == f"retry: {eventos.RETRY_MS}\n\n".encode()
+    outro = iter(eventos.Fluxo(heartbeat=0.05))
+    next(outro)
+    assert eventos.assinantes() == 2
+
+    eventos.publicar("readings", {"n": 1})
+    assert _evento(next(fluxo)) == _evento(next(outro)) == ("readings", {"n": 1})
+    assert next(fluxo) == b": ping\n\n"  # nada novo dentro do heartbeat
+    fluxo.close()
+    outro.close()
+
+
+def test_assinante_lento_e_desconectado(monkeypatch):
+    monkeypatch.setattr(eventos, "MAX_PENDENTES", 2)
+    fluxo = iter(eventos.Fluxo())
+    next(fluxo)
+    for n in range(3):
+        eventos.publicar("readings", {"n": n})
+    assert eventos.assinantes() == 0
+    # O fluxo termina (o EventSource reconecta e relê o estado pelo dashboard)
+    assert list(fluxo) == []
+
+
+def test_fluxo_asyncio():
+    async def consumir():
+        fluxo = eventos.Fluxo(heartbeat=0.05).__aiter__()
+        recebido = [await fluxo.__anext__()]
+        # Publicado de outra thread, como faz o worker de persistência
+        await asyncio.to_thread(eventos.publicar, "reset", {"nodes": 0})
+        recebido.append(await fluxo.__anext__())
+        recebido.append(await fluxo.__anext__())
+        await fluxo.aclose()
+        return recebido
+
+    inicio, evento, ping = asyncio.run(consumir())
+    assert inicio.startswith(b"retry:")
+    assert _evento(evento) == ("reset", {"nodes": 0})
+    assert ping == b": ping\n\n"
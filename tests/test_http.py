@@ -0,0 +1,195 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import eventos
+import pytest
+from conftest import leitura
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture
+def servidor(banco):
+    import servidor
+
+    banco.insert_many([leitura("A", p, T0 + 60 * p) for p in range(1, 6)])
+    servidor.cache.carregar()
+    servidor._PAGINAS.clear()
+    yield servidor
+    servidor._PAGINAS.clear()
+    servidor.cache.limpar()
+
+
+def _servir_threads(servidor):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), servidor.Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _servir_async(servidor):
+    import servidor_async
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(
+        servidor_async._Conexao(servidor.atender, executor), "127.0.0.1", 0,
+        limit=servidor_async.MAX_HEADER_BYTES,
+    ))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.sockets[0].getsockname()[1]
+
+    async def encerrar():
+        server.close()
+        conexoes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in conexoes:
+            t.cancel()
+        await asyncio.gather(*conexoes, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(encerrar(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    executor.shutdown(wait=False)
+
+
+@pytest.fixture(params=["threads", "async"])
+def porta(request, servidor):
+    """Porta de um servidor de teste em cada modo (LORA_SERVER_MODE)."""
+    servir = _servir_threads if request.param == "threads" else _servir_async
+    yield from servir(servidor)
+
+
+def _get(conn, path, **headers):
+    conn.request("GET", path, headers=headers)
+    resposta = conn.getresponse()
+    return resposta, resposta.read()
+
+
+def test_mantem_a_conexao_entre_requisicoes(porta):
+    conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=5)
+    resposta, _ = _get(conn, "/health")
+    assert (resposta.status, resposta.version) == (200, 11)
+    sock = conn.sock
+
+    # Streaming em chunked, 304 sem corpo e um POST: tudo no mesmo socket
+    resposta, corpo = _get(conn, f"/export.ndjson?from=0&to={T0 + 3600}")
+    assert resposta.getheader("Transfer-Encoding") == "chunked"
+    assert len(corpo.splitlines()) == 5
+    resposta, _ = _get(conn, "/dashboard")
+    etag = resposta.getheader("ETag")
+    resposta, corpo = _get(conn, "/dashboard", **{"If-None-Match": etag})
+    assert (resposta.status, corpo) == (304, b"")
+    conn.request("POST", "/ingest", body=b"{}", headers={"Content-Type": "application/json"})
+    resposta = conn.getresponse()
+    resposta.read()
+    assert resposta.status == 422
+    _get(conn, "/health")
+    assert conn.sock is sock
+    conn.close()
+
+
+def test_http_1_0_fecha_a_conexao(porta):
+    with socket.create_connection(("127.0.0.1", porta), timeout=5) as s:
+        s.sendall(b"GET /health HTTP/1.0\r\n\r\n")
+        resposta = b""
+        while parte := s.recv(65536):  # o servidor fecha ao terminar
+            resposta += parte
+    assert resposta.startswith(b"HTTP/1.1 200")
+    assert b"Content-Length:" in resposta
+
+
+def test_corpo_chunked_e_recusado(porta):
+    with socket.create_connection(("127.0.0.1", porta), timeout=5) as s:
+        s.sendall(b"POST /ingest HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n"
+                  b"2\r\n{}\r\n0\r\n\r\n")
+        resposta = b""
+        while parte := s.recv(65536):
+            resposta += parte
+    assert resposta.startswith(b"HTTP/1.1 411")
+    assert b"Connection: close" in resposta
+
+
+def _trocar(porta, dados):
+    """Envia `dados` crus e lê tudo até o servidor fechar a conexão."""
+    with socket.create_connection(("127.0.0.1", porta), timeout=5) as s:
+        s.sendall(dados)
+        resposta = b""
+        while parte := s.recv(65536):
+            resposta += parte
+    return resposta
+
+
+def test_requisicoes_em_pipeline(porta):
+    resposta = _trocar(porta, b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n"
+                              b"GET /api/last HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+    assert resposta.count(b"HTTP/1.1 200") == 2
+    assert resposta.rstrip().endswith(b"}")
+
+
+@pytest.fixture
+def porta_async(servidor):
+    yield from _servir_async(servidor)
+
+
+def test_async_corpo_grande_demais(porta_async, monkeypatch):
+    import servidor_async
+
+    monkeypatch.setattr(servidor_async, "MAX_BODY_BYTES", 10)
+    resposta = _trocar(porta_async, b"POST /ingest HTTP/1.1\r\nContent-Length: 11\r\n\r\n")
+    assert resposta.startswith(b"HTTP/1.1 413")
+
+
+def test_async_metodo_desconhecido_mantem_a_conexao(porta_async):
+    conn = http.client.HTTPConnection("127.0.0.1", porta_async, timeout=5)
+    conn.request("PUT", "/ingest", body=b"{}")
+    resposta = conn.getresponse()
+    resposta.read()
+    assert resposta.status == 501
+    sock = conn.sock
+    assert _get(conn, "/health")[0].status == 200
+    assert conn.sock is sock
+    conn.close()
+
+
+def test_async_linha_de_requisicao_invalida(porta_async):
+    assert _trocar(porta_async, b"LIXO\r\n\r\n").startswith(b"HTTP/1.1 400")
+
+
+def test_async_conexao_ociosa_e_fechada(porta_async, monkeypatch):
+    import servidor_async
+
+    monkeypatch.setattr(servidor_async, "KEEPALIVE_TIMEOUT", 0.2)
+    with socket.create_connection(("127.0.0.1", porta_async), timeout=5) as s:
+        assert s.recv(1) == b""  # fechada pelo servidor antes do timeout do cliente
+
+
+def test_stream_recebe_as_leituras_gravadas(porta, servidor, banco):
+    conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=5)
+    conn.request("GET", "/stream")
+    resposta = conn.getresponse()
+    assert resposta.getheader("Content-Type").startswith("text/event-stream")
+    assert resposta.readline().startswith(b"retry:")  # já assinado a partir daqui
+    resposta.readline()
+
+    servidor._aplicar_gravadas(banco.insert_many([leitura("B", 1, T0 + 10_000)]))
+    assert resposta.readline() == b"event: readings\n"
+    dados = json.loads(resposta.readline().removeprefix(b"data: "))
+    assert [r["node_id"] for r in dados["readings"]] == ["B"]
+    assert dados["stats"]["nodes"] == 2
+    conn.close()
+
+    # O servidor só percebe a desconexão ao escrever: a assinatura cai no próximo envio
+    limite = time.monotonic() + 5
+    while eventos.assinantes() and time.monotonic() < limite:
+        eventos.publicar("reset", {})
+        time.sleep(0.05)
+    assert eventos.assinantes() == 0
@@ -0,0 +1,83 @@
+import email.message
+import json
+import queue
+
+import binario
+import pytest
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture
+def servidor(banco):
+    import servidor
+
+    servidor.DEDUPE.limpar()
+    yield servidor
+    servidor.DEDUPE.limpar()
+
+
+def _lote(servidor, monkeypatch, leituras, binario_=False, cheia=False):
+    """POST /ingest/batch; devolve os itens que entrariam na fila."""
+    fila = []
+
+    def enfileirar(itens):
+        if cheia:
+            raise queue.Full
+        fila.extend(itens)
+
+    monkeypatch.setattr(servidor, "enfileirar", enfileirar)
+    headers = email.message.Message()
+    if binario_:
+        headers["Content-Type"] = binario.TIPO
+        corpo = binario.codificar([(r["node_id"], r["packet_number"], r["ts"], r["t"], r["rh"])
+                                   for r in leituras])
+    else:
+        headers["Content-Type"] = "application/x-ndjson"
+        corpo = "\n".join(json.dumps(r) for r in leituras).encode()
+    servidor.rota_ingest_batch(servidor.Requisicao("POST", "/ingest/batch", {}, headers, corpo))
+    return fila
+
+
+def _leituras(pacotes, ts):
+    return [{"ts": ts, "node_id": "A", "packet_number": p, "t": 20.0, "rh": 50.0}
+            for p in pacotes]
+
+
+@pytest.mark.parametrize("valor", ["abc", "20.5", True, [20], 10**400])
+def test_temperatura_nao_numerica_e_recusada(servidor, valor):
+    leitura = {"ts": T0, "node_id": "A", "packet_number": 1, "t": valor, "rh": 50.0}
+    assert servidor.validar_leitura(leitura) == "t must be a finite number or null"
+
+
+def test_valores_nao_finitos_sao_recusados_por_item(servidor):
+    corpo = "\n".join(
+        f'{{"ts": {T0}, "packet_number": {p}, "t": {t}, "rh": {rh}}}'
+        for p, t, rh in [(1, "1e999", "50"), (2, "20.5", "NaN"), (3, "20.5", "null"),
+                         (4, "20", "50.5")]
+    ).encode()
+    erros = [erro for _, erro in servidor.parse_lote(corpo, "application/x-ndjson")]
+    assert erros == ["t must be a finite number or null", "rh must be a finite number or null",
+                     None, None]
+
+
+def test_resumo_com_campo_infinito_e_recusado(servidor):
+    leitura = json.loads(
+        f'{{"ts": {T0}, "packet_number": 5, "t": 20, "rh": 50, '
+        '"summary": {"n": 5, "first_packet": 1, "t_max": Infinity}}'
+    )
+    assert servidor.validar_leitura(leitura) == "summary.t_max must be a finite number or null"
+
+
+@pytest.mark.parametrize("binario_", [False, True])
+def test_reinicio_no_meio_do_lote_nao_vira_duplicata(servidor, monkeypatch, binario_):
+    assert len(_lote(servidor, monkeypatch, _leituras([1], T0), binario_)) == 1
+    # 2..5, o contador reinicia (1..3 um segundo depois) e o 3 se repete
+    lote = _leituras(range(2, 6), T0) + _leituras([1, 2, 3, 3], T0 + 1)
+    fila = _lote(servidor, monkeypatch, lote, binario_)
+    assert len(fila) == 7
+
+
+def test_lote_recusado_pela_fila_cheia_sai_da_janela(servidor, monkeypatch):
+    assert _lote(servidor, monkeypatch, _leituras([1, 2], T0), cheia=True) == []
+    assert len(_lote(servidor, monkeypatch, _leituras([1, 2], T0))) == 2
@@ -0,0 +1,93 @@
+import re
+
+import metricas
+import pytest
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    """Registro vazio: as métricas criadas no teste não vazam para as outras."""
+    monkeypatch.setattr(metricas, "_registro", [])
+    return metricas._registro
+
+
+def _amostras(texto):
+    """{nome{rótulos}: valor} das linhas que não são comentário."""
+    amostras = {}
+    for linha in texto.splitlines():
+        if linha and not linha.startswith("#"):
+            nome, valor = linha.rsplit(" ", 1)
+            amostras[nome] = valor
+    return amostras
+
+
+def test_contador_por_rotulos(registro):
+    c = metricas.Contador("x_total", "Ajuda.", ("route", "code"))
+    c.inc("/ingest", "200")
+    c.inc("/ingest", "200", n=2)
+    c.inc("/", "304")
+    texto = metricas.exportar()
+    assert texto.startswith("# HELP x_total Ajuda.\n# TYPE x_total counter\n")
+    assert _amostras(texto) == {
+        'x_total{route="/",code="304"}': "1",
+        'x_total{route="/ingest",code="200"}': "3",
+    }
+
+
+def test_rotulos_escapados(registro):
+    c = metricas.Contador("x_total", "Ajuda.", ("node",))
+    c.inc('a"b\\c\nd')
+    assert 'x_total{node="a\\"b\\\\c\\nd"} 1' in metricas.exportar()
+
+
+def test_medidor_lido_na_coleta(registro):
+    fila = [1, 2]
+    metricas.Medidor("fila", "Tamanho.", lambda: len(fila))
+    assert _amostras(metricas.exportar()) == {"fila": "2"}
+    fila.append(3)
+    assert _amostras(metricas.exportar()) == {"fila": "3"}
+
+
+def test_histograma_cumulativo(registro):
+    h = metricas.Histograma("lat_seconds", "Latência.", ("route",), buckets=(0.1, 1.0))
+    for valor in (0.05, 0.1, 0.5, 7.0):
+        h.observar(valor, "/")
+    amostras = _amostras(metricas.exportar())
+    assert amostras == {
+        'lat_seconds_bucket{route="/",le="0.1"}': "2",  # le: limite incluído
+        'lat_seconds_bucket{route="/",le="1.0"}': "3",
+        'lat_seconds_bucket{route="/",le="+Inf"}': "4",
+        'lat_seconds_sum{route="/"}': repr(0.05 + 0.1 + 0.5 + 7.0),
+        'lat_seconds_count{route="/"}': "4",
+    }
+
+
+def test_cronometrar_conta_tambem_as_excecoes(registro):
+    h = metricas.Histograma("op_seconds", "Duração.", ("op",))
+
+    @metricas.cronometrar(h, "falha")
+    def falha():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        falha()
+    assert _amostras(metricas.exportar())['op_seconds_count{op="falha"}'] == "1"
+
+
+def test_rota_metrics_no_formato_texto(banco):
+    import servidor
+
+    servidor.cache.carregar()
+    assert servidor.atender("GET", "/health", {}).code == 200
+    resposta = servidor.atender("GET", "/metrics", {})
+    assert resposta.content_type.startswith("text/plain; version=0.0.4")
+    texto = resposta.content.decode()
+    tipos = dict(re.findall(r"^# TYPE (\S+) (\S+)$", texto, re.M))
+    assert tipos["lora_http_request_duration_seconds"] == "histogram"
+    assert tipos["lora_db_query_seconds"] == "histogram"
+    assert tipos["lora_ingest_queue_depth"] == "gauge"
+    assert int(_amostras(texto)['lora_http_responses_total{route="/health",code="200"}']) >= 1
+    # Toda amostra pertence a uma métrica declarada
+    for nome in _amostras(texto):
+        base = re.sub(r"(_bucket|_sum|_count)?(\{.*)?$", "", nome)
+        assert base in tipos, nome
@@ -0,0 +1,107 @@
+import logging
+import os
+import shutil
+import sqlite3
+
+import pytest
+import storage
+from conftest import leitura
+
+BANCO_ORIGINAL = os.path.join(os.path.dirname(__file__), "..", "database", "dados.db")
+T0 = 1_700_000_000
+
+
+@pytest.fixture
+def caminho(tmp_path, monkeypatch):
+    storage.close_connections()
+    path = str(tmp_path / "dados.db")
+    monkeypatch.setattr(storage, "DB_PATH", path)
+    yield path
+    storage.close_connections()
+
+
+def _consultar(path, sql, *params):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def test_migracao_do_banco_original(caminho):
+    shutil.copy(BANCO_ORIGINAL, caminho)  # a cópia: o banco do repositório não é tocado
+    (antes,) = _consultar(caminho, "SELECT COUNT(*), MIN(ts), MAX(ts) FROM readings")
+
+    storage.init_db()
+    storage.migrate_db()
+
+    assert _consultar(caminho, "PRAGMA user_version") == [(storage.SCHEMA_VERSION,)]
+    assert storage.count_rows() == antes[0]
+    assert _consultar(caminho, "SELECT SUM(n) FROM rollup_1h") == [(antes[0],)]
+    leituras, _ = storage.get_readings(antes[1], antes[2], limit=10_000)
+    assert len(leituras) == antes[0]
+    assert all(isinstance(r["packet_number"], int) for r in leituras)
+
+
+def _leituras_v1(path, linhas):
+    storage.init_db()  # esquema v1: packet_number TEXT e sem chave única
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO readings (ts, packet_number, node_id, temp, rh) VALUES (?, ?, ?, 20, 50)",
+            linhas,
+        )
+    storage.close_connections()
+
+
+def test_migracao_v2_registra_as_chaves_repetidas(caminho, caplog):
+    # A retransmissão do pacote 2 tem o mesmo ts; não é um reinício do contador
+    _leituras_v1(caminho, [(T0, "1", "A"), (T0 + 5, "2", "A"), (T0 + 5, "2", "A"),
+                           (T0 + 15, "1", "B")])
+    with caplog.at_level(logging.WARNING, logger="lora-server"):
+        storage.migrate_db()
+    assert storage.count_rows() == 3
+    assert "1 leituras repetidas (mesmo nó, boot e pacote) descartadas" in caplog.text
+
+
+def test_migracao_v2_mantem_as_leituras_depois_de_um_reinicio(caminho, monkeypatch):
+    monkeypatch.setattr(storage, "MIGRATION_CHUNK", 30)  # o reinício cai no meio de um bloco
+    antes = [(T0 + 5 * p, str(p), "node_padrao") for p in range(1, 101)]
+    depois = [(T0 + 1000 + 5 * p, str(p), "node_padrao") for p in range(1, 51)]
+    _leituras_v1(caminho, antes + depois)
+    storage.migrate_db()
+
+    assert storage.count_rows() == 150
+    ultimas = storage.get_last_readings(limit=1)
+    assert (ultimas[0]["ts"], ultimas[0]["packet_number"]) == (T0 + 1250, 50)
+    # A contagem continua no boot aberto pela migração
+    assert [r["boot"] for r in storage.insert_many([leitura("node_padrao", 51, T0 + 1255)])] == [1]
+    assert storage.insert_many([leitura("node_padrao", 40, T0 + 1200)]) == []
+
+
+def test_reinicio_do_contador_nao_perde_leituras(banco):
+    assert len(banco.insert_many([leitura("A", p, T0 + 5 * p) for p in range(1, 2001)])) == 2000
+    reinicio = T0 + 5 * 2001 + 60
+    depois = [leitura("A", p, reinicio + 5 * p) for p in range(1, 8)]
+    assert [r["boot"] for r in banco.insert_many(depois)] == [1] * 7
+    assert banco.count_rows() == 2007
+
+    # Retransmissões, de antes e de depois do reinício, continuam ignoradas
+    assert banco.insert_many([leitura("A", 1500, T0 + 5 * 1500)]) == []
+    assert banco.insert_many([leitura("A", 3, reinicio + 15)]) == []
+    # Cópia de antes do reinício acima do novo maior número: vai para o boot 0, já gravada
+    assert banco.insert_many([leitura("A", 1999, T0 + 5 * 1999)]) == []
+    assert banco.count_rows() == 2007
+
+    # O estado sobrevive a uma nova conexão
+    banco.close_connections()
+    assert banco.insert_many([leitura("A", 8, reinicio + 40)])[0]["boot"] == 1
+
+
+def test_migracao_v4_que_falha_nao_deixa_particoes(caminho):
+    _leituras_v1(caminho, [(T0, "1", "A"), (T0 + 40 * 86400, "2", "A"), (10**13, "3", "A")])
+    with pytest.raises(ValueError):
+        storage.migrate_db()
+    assert _consultar(caminho, "PRAGMA user_version") == [(3,)]
+    assert _consultar(caminho, "SELECT name FROM sqlite_master WHERE name GLOB 'readings_p*'") == []
+
+    _consultar(caminho, "DELETE FROM readings WHERE ts = ?", 10**13)
+    storage.close_connections()
+    storage.migrate_db()
+    assert storage.count_rows() == 2
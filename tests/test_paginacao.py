@@ -0,0 +1,52 @@
+import pytest
+from conftest import leitura
+
+T0 = 1_698_796_800  # 01/11/2023 00:00 UTC: uma partição por mês
+DEZEMBRO = 1_701_388_800
+
+
+@pytest.fixture
+def banco_misto(banco, monkeypatch):
+    """Novembro no arquivo (em blocos de 7 linhas), dezembro em uma partição.
+
+    Dois nós com leituras no mesmo ts, e uma leitura atrasada de novembro que
+    chega depois da compactação e abre outra partição para o mesmo período.
+    """
+    monkeypatch.setattr(banco, "ARCHIVE_BLOCK_ROWS", 7)
+    banco.insert_many([leitura(no, p, T0 + 60 * p) for p in range(1, 41) for no in "AB"])
+    assert banco.compact_archive(now=DEZEMBRO + 8 * 86400) == 80
+    banco.insert_many([leitura(no, p, DEZEMBRO + 60 * p) for p in range(1, 41) for no in "AB"])
+    banco.insert_many([leitura("C", 1, T0 + 60 * 20)])
+    return banco
+
+
+def _todas(banco, limite, node_id=None):
+    paginas, cursor = [], None
+    while True:
+        pagina, cursor = banco.get_readings(T0, DEZEMBRO + 86400, node_id, after=cursor,
+                                            limit=limite)
+        paginas.append(pagina)
+        if cursor is None:
+            return paginas
+
+
+@pytest.mark.parametrize("limite", [1, 6, 7, 13, 500])
+def test_paginas_sem_repeticao_nem_buraco(banco_misto, limite):
+    paginas = _todas(banco_misto, limite)
+    linhas = [r for pagina in paginas for r in pagina]
+    assert all(len(pagina) == limite for pagina in paginas[:-1])
+    assert len(linhas) == 161
+    assert len({(r["node_id"], r["ts"]) for r in linhas}) == 161
+    assert [r["ts"] for r in linhas] == sorted(r["ts"] for r in linhas)
+
+
+def test_paginas_de_um_no(banco_misto):
+    linhas = [r for pagina in _todas(banco_misto, 9, "B") for r in pagina]
+    assert [r["packet_number"] for r in linhas] == list(range(1, 41)) * 2
+
+
+def test_exportacao_igual_a_paginacao(banco_misto):
+    exportadas = [r for lote in banco_misto.stream_readings(T0, DEZEMBRO + 86400, batch=17)
+                  for r in lote]
+    assert exportadas == [r for pagina in _todas(banco_misto, 500) for r in pagina]
+
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+from conftest import leitura
+
+T0 = 1_700_000_000  # nov/2023
+
+
+def _tabelas_particao(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(
+            r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'readings_p*'"
+            )
+        )
+
+
+def test_lote_que_falha_desfaz_a_criacao_da_particao(banco):
+    with pytest.raises(ValueError):
+        banco.insert_many([leitura("A", 1, T0), leitura("A", 2, 10**13)])
+    assert _tabelas_particao(banco.DB_PATH) == []
+    assert banco.count_rows() == 0
+
+    banco.insert_many([leitura("A", 1, T0)])
+    assert banco.count_rows() == 1
+
+    # Com o cache de partições zerado, o próximo lote encontra a mesma partição
+    banco.close_connections()
+    banco.insert_many([leitura("A", 2, T0 + 60)])
+    assert banco.count_rows() == 2
+    assert len(_tabelas_particao(banco.DB_PATH)) == 1
+
+
+def test_rollback_no_meio_do_lote_mantem_particoes_existentes(banco):
+    banco.insert_many([leitura("A", 1, T0)])
+    with pytest.raises(ValueError):
+        banco.insert_many([leitura("A", 2, T0 + 40 * 86400), leitura("A", 3, -1)])
+    assert len(_tabelas_particao(banco.DB_PATH)) == 1
+    banco.insert_many([leitura("A", 2, T0 + 40 * 86400)])
+    assert banco.count_rows() == 2
+
+
+def _esquema(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(
+            (tipo, nome, sql) for tipo, nome, sql in conn.execute(
+                "SELECT type, name, sql FROM sqlite_master WHERE type != 'view' "
+                "AND name NOT GLOB '*readings_p*' AND name NOT GLOB 'descartada_*'"
+            )
+        )
+
+
+def test_delete_all_troca_as_tabelas_de_historico(banco):
+    banco.insert_many([leitura("A", p, T0 + 60 * p) for p in range(1, 11)])
+    esquema = _esquema(banco.DB_PATH)
+
+    banco.delete_all()
+    assert banco.count_rows() == 0
+    assert banco.get_series("A", T0, T0 + 3600, "1m") == []
+    assert _esquema(banco.DB_PATH) == esquema
+
+    # As tabelas novas funcionam e as antigas somem na manutenção
+    banco.insert_many([leitura("A", 1, T0)])
+    assert [p["count"] for p in banco.get_series("A", T0, T0 + 3600, "1h")] == [1]
+    assert banco.purge_dropped() == 1 + len(banco._TABELAS_HISTORICO)  # partição + histórico
+    with sqlite3.connect(banco.DB_PATH) as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name GLOB 'descartada_*'"
+        ).fetchone() == (0,)
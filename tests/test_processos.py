@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+from conftest import SRC
+
+T0 = 1_700_000_000
+
+
+def _item(pacote, node_id="A"):
+    return {"ts": T0 + 60 * pacote, "node_id": node_id, "packet_number": pacote,
+            "t": 20.0, "rh": 50.0}
+
+
+@pytest.fixture
+def escritor(banco, monkeypatch):
+    """Escritor numa thread deste processo, ligado por pipes como nos processos HTTP.
+
+    O módulo é o mesmo dos dois lados, então `servidor._escritor` fica None (lado
+    do escritor) e o teste chama pelo _Escritor devolvido (lado do processo HTTP).
+    """
+    import servidor
+
+    servidor.cache.carregar()
+    chamadas, chamadas_escritor = multiprocessing.Pipe()
+    difusao, difusao_escritor = multiprocessing.Pipe(duplex=False)
+    monkeypatch.setattr(servidor, "_difusoes", {1: (difusao_escritor, threading.Lock())})
+    threading.Thread(target=servidor._atender_processo, args=(0, chamadas_escritor),
+                     daemon=True).start()
+    yield servidor, servidor._Escritor(chamadas), difusao
+    chamadas.close()  # a thread do escritor sai com EOF
+    servidor.cache.limpar()
+
+
+def test_lote_gravado_pelo_escritor_e_difundido(escritor, banco):
+    _, http, difusao = escritor
+    gravadas, descartadas = http.chamar("persistir", [_item(1), _item(2), {"ts": "x"}], None)
+    assert ([g["packet_number"] for g in gravadas], descartadas) == ([1, 2], 1)
+    assert banco.count_rows() == 2
+    # O processo que chamou já tem as linhas; os outros recebem pela difusão
+    assert difusao.poll(5)
+    tipo, linhas = difusao.recv()
+    assert (tipo, [linha["packet_number"] for linha in linhas]) == ("linhas", [1, 2])
+
+    gravadas, _ = http.chamar("persistir", [_item(2)], None)  # já gravada
+    assert gravadas == []
+
+
+def test_erro_no_escritor_volta_para_quem_chamou(escritor):
+    _, http, _ = escritor
+    with pytest.raises(RuntimeError, match="chamada desconhecida"):
+        http.chamar("outra")
+    assert http.chamar("persistir", [_item(1)], None)[0]  # pipe segue em uso
+
+
+def test_delete_all_difunde_limpar(escritor, banco):
+    _, http, difusao = escritor
+    http.chamar("persistir", [_item(1)], None)
+    difusao.recv()
+    http.chamar("delete_all")
+    assert banco.count_rows() == 0
+    assert difusao.poll(5)
+    assert difusao.recv() == ("limpar",)
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pedir(url, corpo=None):
+    dados = json.dumps(corpo).encode() if corpo is not None else None
+    req = urllib.request.Request(url, dados, {"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as resposta:
+        return resposta.status, resposta.read()
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="exige SO_REUSEPORT")
+def test_processos_http_com_um_escritor(tmp_path):
+    porta = _porta_livre()
+    banco = str(tmp_path / "dados.db")
+    codigo = (
+        "import sys; sys.path[:0] = {caminhos!r}\n"
+        "import storage; storage.DB_PATH = {banco!r}\n"
+        "import servidor\n"
+        "servidor.HOST, servidor.PORT, servidor.HTTP_PROCESSES = '127.0.0.1', {porta}, 2\n"
+        "servidor.main()\n"
+    ).format(caminhos=[os.path.join(SRC, d) for d in ("servidor", "compartilhado")],
+             banco=banco, porta=porta)
+    proc = subprocess.Popen([sys.executable, "-c", codigo], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{porta}"
+    try:
+        limite = time.monotonic() + 30
+        while True:
+            try:
+                _pedir(base + "/health")
+                break
+            except OSError:
+                if time.monotonic() > limite or proc.poll() is not None:
+                    raise
+                time.sleep(0.2)
+
+        # Conexões novas caem em qualquer um dos processos HTTP
+        for pacote in range(1, 21):
+            assert _pedir(base + "/ingest", _item(pacote, f"n{pacote % 4}"))[0] in (200, 202)
+        # A gravação é assíncrona (fila de cada processo HTTP -> escritor)
+        conn = sqlite3.connect(banco)
+        try:
+            limite = time.monotonic() + 10
+            while True:
+                total = conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+                ultimas = json.loads(_pedir(base + "/api/last")[1])
+                if (total, len(ultimas)) == (20, 4) or time.monotonic() > limite:
+                    break
+                time.sleep(0.2)
+        finally:
+            conn.close()
+        assert total == 20
+        assert sorted(ultimas) == ["n0", "n1", "n2", "n3"]
+    finally:
+        proc.terminate()
+        proc.wait(10)
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+from conftest import leitura
+
+T0 = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+@pytest.fixture
+def servidor(banco, monkeypatch):
+    import servidor
+
+    monkeypatch.setattr(servidor, "SERIES_MAX_LIMIT", 100)
+    return servidor
+
+
+def _series(servidor, **params):
+    query = {"node": ["A"], "from": [str(T0)], "to": [str(T0 + 7200)]}
+    query.update({k: [str(v)] for k, v in params.items()})
+    resposta = servidor.rota_api_series(servidor.Requisicao("GET", "/api/series", query, {}))
+    assert resposta.code == 200
+    return json.loads(resposta.content)
+
+
+def test_raw_dentro_do_limite(servidor, banco):
+    banco.insert_many([leitura("A", p, T0 + 30 * p) for p in range(1, 81)])
+    corpo = _series(servidor, resolution="raw")
+    assert (corpo["resolution"], len(corpo["points"]), corpo["truncated"]) == ("raw", 80, False)
+
+
+def test_raw_acima_do_limite_cai_para_um_rollup(servidor, banco):
+    banco.insert_many([leitura("A", p, T0 + 10 * p) for p in range(1, 301)])
+    corpo = _series(servidor, resolution="raw", to=T0 + 3600)
+    assert corpo["resolution"] == "1m"
+    assert sum(p["count"] for p in corpo["points"]) == 300
+    assert not corpo["truncated"]
+
+
+def test_nenhuma_resolucao_passa_do_limite(servidor, banco):
+    banco.insert_many([leitura("A", p, T0 + 60 * p) for p in range(1, 200)])
+    corpo = _series(servidor, resolution="1m", **{"from": T0, "to": T0 + 12_000})
+    assert corpo["resolution"] == "1h"
+    assert len(banco.get_series("A", T0, T0 + 12_000, "raw", limit=50)) == 50
+
+    servidor.SERIES_MAX_LIMIT = 2
+    corpo = _series(servidor, resolution="1h", **{"from": T0, "to": T0 + 12_000})
+    assert (len(corpo["points"]), corpo["truncated"]) == (2, True)